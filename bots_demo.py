@@ -1,38 +1,53 @@
-import argparse
+import argparse, logging
 from lib.bots.framework import *
+from lib.bots.recorder import TradeRecorder, write_table
 
-def get_strategy_class(name: str):
-    import importlib
-    strategy_module = None
-    for subset in ".", ".custom.":
-        try:
-            strategy_module = importlib.import_module(f"lib.bots.strategies{subset}{name}")
-        except ModuleNotFoundError:
-            continue
-    if strategy_module is None:
-        raise ValueError(f"strategy not found: {name}")
-    strategy_class = getattr(strategy_module, f"StrategyImpl")
-    return strategy_class
-
-
-def create_conductor_backtesting(strategy: str, strategy_args: dict(), sym: str, tf: str, dt_start: str, dt_end: str, initial_account: float, with_pnl: bool):
+def create_conductor_backtesting(strategy: str, strategy_args: dict(), sym: str, tf: str, dt_start: str, dt_end: str, initial_account: float, with_pnl: bool, recorder: TradeRecorder = None, verbose: bool = False):
     ticker = TickerHistorical(sym, tf, dt_start, dt_end)
-    broker = DummyBroker(ticker=ticker, initial_account=initial_account)
+    broker = DummyBroker(ticker=ticker, initial_account=initial_account, verbose=verbose, recorder=recorder)
     if with_pnl:
-        broker = BrokerAdapterPnL(ticker=ticker, broker=broker)
+        broker = BrokerAdapterPnL(ticker=ticker, broker=broker, report_each_trade=verbose)
     strategy = get_strategy_class(strategy)(strategy_args)
+    if isinstance(strategy, VectorizedStrategy):
+        return VectorizedBacktestingConductor(strategy=strategy, ticker=ticker, broker=broker)
     return BacktestingConductor(strategy=strategy, ticker=ticker, broker=broker)
 
 
 def create_conductor_live(strategy: str, strategy_args: dict(), sym: str, tf: str, with_pnl: bool):
     ticker = TickerLive(sym, tf)
-    broker = DummyBroker(ticker=ticker)
+    broker = DummyBroker(ticker=ticker, verbose=True)
     if with_pnl:
-        broker = BrokerAdapterPnL(ticker=ticker, broker=broker)
+        broker = BrokerAdapterPnL(ticker=ticker, broker=broker, report_each_trade=True)
     strategy = get_strategy_class(strategy)(strategy_args)
     return LiveConductor(strategy=strategy, ticker=ticker, broker=broker)
 
 
+def create_conductor_streaming(strategy: str, strategy_args: dict(), sym: str, tf: str, with_pnl: bool):
+    from lib.bots.streaming import TickerStreaming, BinanceKlineFeed, StreamingConductor
+    ticker = TickerStreaming(sym, tf)
+    broker = DummyBroker(ticker=ticker, verbose=True)
+    if with_pnl:
+        broker = BrokerAdapterPnL(ticker=ticker, broker=broker, report_each_trade=True)
+    strategy = get_strategy_class(strategy)(strategy_args)
+    return StreamingConductor(strategy=strategy, ticker=ticker, broker=broker, feed=BinanceKlineFeed(sym, tf))
+
+
+def run_dca_portfolio_backtest(cfg_path: str, dt_start: str, dt_end: str, equity_path: str):
+    import yaml
+    from lib.bots import portfolio_backtest
+    with open(cfg_path, "r") as file:
+        cfg = yaml.safe_load(file)
+    assets = [asset for asset,_ in portfolio_backtest.auto_accumulate_assets(cfg)]
+    bars = portfolio_backtest.load_daily_bars(assets, dt_start, dt_end)
+    result = portfolio_backtest.PortfolioDcaConductor(cfg, bars, start=dt_start).run()
+    print(portfolio_backtest.positions(result).to_string(index=False))
+    equity = portfolio_backtest.equity_curve(result)
+    if len(equity):
+        last = equity.iloc[-1]
+        print(f"\ninvested {last['invested']:.2f} USD, value {last['value']:.2f} USD, pnl {last['pnl %']:.1f}%")
+    if equity_path:
+        write_table(equity, equity_path)
+
 
 # def create_conductor_realtime(sym, low, high, account, split, stop, risk):
 #     ticker = TickerRealtime(sym)
@@ -44,6 +59,7 @@ def create_conductor_live(strategy: str, strategy_args: dict(), sym: str, tf: st
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--backtest', action='store_const', const='True', help='Run in backtesting mode. Without this parameter run in live mode (default)')
+    parser.add_argument('--stream',   action='store_true', help='live mode only: tick on bar close pushed by the Binance websocket instead of polling REST')
     parser.add_argument('--pnl',      nargs='?', type=bool, const=True, default=False, help='Calculate and report PnL of each trade')
     parser.add_argument('--strategy', type=str, help='Name of the strategy to use')
     parser.add_argument('--sym',      type=str, help='symbol to trade')
@@ -51,7 +67,14 @@ def main():
     parser.add_argument('--tf',       type=str, help='timeframe for strategy to operate on')
     parser.add_argument('--start',    type=str, help='timestamp of the start of backtesting region')
     parser.add_argument('--end',      type=str, help='timestamp of the end of backtesting region')
+    parser.add_argument('--verbose',  action='store_true', help='print every trade and strategy decision, backtests are quiet by default')
+    parser.add_argument('--trades',   type=str, help='backtest only: write the trade log to given .csv or .parquet file')
+    parser.add_argument('--equity',   type=str, help='backtest and --dca-portfolio: write the per bar equity curve to given .csv or .parquet file')
+    parser.add_argument('--dca-portfolio', type=str, help='backtest dca.py auto accumulation of given config, e.g. config/dca.yml, over daily bars from --start to --end')
     parser.add_argument('--strategy-args', type=str, help='extra strategy arguments: list of k=v items separated by commas')
+    parser.add_argument('--sweep',    type=str, help='backtest every strategy-args combination of given grid file in parallel, see config/example.sweep.yml')
+    parser.add_argument('--workers',  type=int, help='number of processes used by --sweep, default: all cores')
+    parser.add_argument('--csv',      type=str, help='write --sweep results table to given csv file')
     # parser.add_argument('--low',   type=float, help='range low')
     # parser.add_argument('--high',  type=float, help='range high')
     # parser.add_argument('--split', type=int, default=5, help='number of splits of lot per half-period')
@@ -59,6 +82,19 @@ def main():
     # parser.add_argument('--risk',  type=float, default=1, help='max risk in percent of account size')
     args = parser.parse_args()
 
+    if args.sweep:
+        from lib.bots import sweep
+        results = sweep.run_sweep(sweep.load_sweep_config(args.sweep), workers=args.workers)
+        df = sweep.results_to_df(results)
+        print(df.to_string(index=False))
+        if args.csv:
+            df.to_csv(args.csv, index=False)
+        return
+
+    if args.dca_portfolio:
+        run_dca_portfolio_backtest(args.dca_portfolio, args.start, args.end, args.equity)
+        return
+
     strategy_args = {}
     if args.strategy_args:
         kv_tokens: List[str]= str(args.strategy_args).split(",")
@@ -66,8 +102,27 @@ def main():
             k,v = kv.split("=")
             strategy_args[k] = v
 
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+
     if args.backtest:
-        conductor = create_conductor_backtesting(strategy=args.strategy, strategy_args=strategy_args, sym=args.sym, tf=args.tf, dt_start=args.start, dt_end=args.end, initial_account=args.account, with_pnl=args.pnl)
+        recorder = TradeRecorder(args.account)
+        conductor = create_conductor_backtesting(strategy=args.strategy, strategy_args=strategy_args, sym=args.sym, tf=args.tf, dt_start=args.start, dt_end=args.end, initial_account=args.account, with_pnl=args.pnl, recorder=recorder, verbose=args.verbose)
+        conductor.run()
+        bars = conductor.ticker.arrays
+        for k, v in recorder.summary(bars)._asdict().items():
+            print(f"{k:<22} {v}")
+        if args.pnl and len(bars.close):
+            # at the last close, the ticker has ended
+            conductor.broker.print_pnl(float(bars.close[-1]))
+        if args.trades:
+            write_table(recorder.trades(), args.trades)
+        if args.equity:
+            write_table(recorder.equity_curve(bars), args.equity)
+        return
+
+    if args.stream:
+        conductor = create_conductor_streaming(strategy=args.strategy,strategy_args=strategy_args, sym=args.sym, tf=args.tf, with_pnl=args.pnl)
     else:
         conductor = create_conductor_live(strategy=args.strategy,strategy_args=strategy_args, sym=args.sym, tf=args.tf, with_pnl=args.pnl)
 
@@ -1,18 +1,22 @@
+from __future__ import annotations
+import sys
+if "--profile-startup" in sys.argv:
+    from lib.common import startup_profile
+    startup_profile.enable()
+
 import datetime, argparse, re, yaml, time, traceback, logging, jmespath, os.path
 from collections.abc import Callable, Iterable
 from abc import abstractmethod
-from pandas.core.frame import DataFrame
-from pandas import concat
 from math import nan, isclose
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, TYPE_CHECKING
 
 from rich import print as rprint, reconfigure
 reconfigure(highlight=False)
 
-from lib.trader.trader_factory import TraderFactory
+# pandas, market data and exchange SDKs are imported by the commands using them,
+# so that commands like --last or --close start without loading them
 from lib.trader.trader import Trader
-from lib.common.market_data import MarketData
-from lib.common import accounts_balance
+from lib.common import rate_limiter
 from lib.common import pnl
 from lib.common.msg import *
 from lib.common.misc import calc_raise_percent, is_crypto
@@ -21,7 +25,9 @@ from lib.common.metrics import calc_discount_score
 from lib.common.id_ticker_map import get_id_sym, get_id_name
 from lib.portfolio.db import Db
 from lib.portfolio.historical_order import HistoricalOrder
-from lib.portfolio.visualize import visualize_portfolio_tree_structure
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
 
 ds = dict()
 
@@ -79,6 +85,7 @@ class TraderDecorator(Trader):
     
 
 def create_trader(asset: str, dcadb: Db, is_dummy: bool) -> Trader:
+    from lib.trader.trader_factory import TraderFactory
     if asset in ds['asset_exchg']:
         exch = ds['asset_exchg'][asset]
         if is_dummy:
@@ -91,11 +98,17 @@ def create_trader(asset: str, dcadb: Db, is_dummy: bool) -> Trader:
 
 class TradeHelper:
     def __init__(self):
-        self.market_data = MarketData()
+        from lib.common.market_data import get_market_data
+        self.market_data = get_market_data()
 
     def get_market_price(self, coin: str) -> float:
         return 1 if coin == "USD" else self.market_data.get_market_price(coin)
 
+    def get_market_prices(self, coins: Iterable[str]) -> Dict[str, float]:
+        coins = list(coins)
+        prices = self.market_data.get_market_prices([c for c in coins if c != "USD"])
+        return {c: 1 if c == "USD" else prices[c] for c in coins}
+
     def is_tradeable(self, asset: str) -> bool:
         return self.market_data.is_tradeable(asset)
 
@@ -149,6 +162,7 @@ class UnmanagedAssetsHierarchy:
 
 class CexFiatDepositHierarchy:
     def __init__(self):
+        from lib.common import accounts_balance
         self._df_cex_balances = accounts_balance.get_available_usd_balances_dca()
 
     def get_list(self):
@@ -279,6 +293,7 @@ class UnmanagedAssetsValueSource(ValueSource):
 """
 class CexFiatValueSource(ValueSource):
     def __init__(self):
+        from lib.common import accounts_balance
         df_cex_balances = accounts_balance.get_available_usd_balances_dca()
         self._map = {}
         for _,s in df_cex_balances.iterrows():
@@ -309,6 +324,7 @@ class CompositeValueSource(ValueSource):
 
 
 def print_account_balances():
+    from lib.common import accounts_balance
     title("Account balances")
     df_balances = accounts_balance.get_available_usd_balances_dca()
     rprint(df_balances.to_string(index=False, na_rep=0))
@@ -322,6 +338,7 @@ def calc_daily_qty(category: str, asset: str, th: TradeHelper, quota_asset: floa
 
 
 def accumulate_one(asset: str, quota: float, dry: bool):
+    from pandas import DataFrame
     db = Db()
     th = TradeHelper()
 
@@ -388,8 +405,11 @@ def accumulate_pre_pass() -> Tuple[float, Dict[str,float]]:
             else:
                 yield asset_or_base_category,get_asset_category(asset_or_base_category)
 
-    
-    for asset,category in matching_asset_iterator():
+    matching_assets = list(matching_asset_iterator())
+    # one bulk request per provider, the per asset lookups below are served from the market price cache
+    th.get_market_prices(asset for asset,_ in matching_assets)
+
+    for asset,category in matching_assets:
         filter_result, filter_reason = passes_acc_filter(asset, th)
         if not filter_result:
             rprint(f"[bold]{get_asset_desc(asset)}[/] {filter_reason}, skipping")
@@ -408,6 +428,7 @@ def accumulate_pre_pass() -> Tuple[float, Dict[str,float]]:
 
 
 def accumulate_main_pass(assets_quota_factors: Dict[str,float], dry: bool, quota_asset: float):
+    from pandas import DataFrame
     db = Db()
     th = TradeHelper()
     a = list()
@@ -432,8 +453,8 @@ def accumulate_main_pass(assets_quota_factors: Dict[str,float], dry: bool, quota
                     except Exception as e:
                         if retries > 0:
                             warn(f"{get_asset_desc(asset)} buy failed ({e}), {retries} retries remaining")
+                            time.sleep(rate_limiter.backoff_delay(3 - retries))
                             retries -= 1
-                            time.sleep(5)
                         else:
                             err(f"{get_asset_desc(asset)} buy failed ({e})")
                             traceback.print_exc()
@@ -498,6 +519,7 @@ def accumulate_interval(interval_minutes: int, max_repetitions: int, acc_fun: Ca
 
 
 def remove(asset: str, qty: str, dry: bool):
+    from pandas import DataFrame
     msg_selling(asset, qty)
 
     db = Db()
@@ -547,6 +569,8 @@ def add_ext_order(asset: str, qty: float, price: float, timestamp: str):
 
 
 def list_positions(hide_private_data: bool, hide_totals: bool, sort_by: str):
+    from pandas import DataFrame, concat
+    from lib.portfolio.visualize import visualize_portfolio_tree_structure
 
     def create_left_align_str_formatters(df: DataFrame) -> dict:
         formatters = {}
@@ -559,16 +583,18 @@ def list_positions(hide_private_data: bool, hide_totals: bool, sort_by: str):
     title("Positions")
     db = Db()
     th = TradeHelper()
-    assets = db.get_syms()
+    pnl_by_sym = db.get_pnl_by_sym()
+    assets = list(pnl_by_sym)
     category_traverser = AssetsCompositeHierarchy(managed_only=False)
 
     d_pnl = []
     pnl_sort_key = lambda x: [-101 if a == "~" else a for a in x]
+    market_prices = th.get_market_prices(assets)
     for asset in assets:
 
-        market_price = th.get_market_price(asset)
-        qty = db.get_sym_available_qty(asset)
-        pnl_data = pnl.calculate_inc_pnl(db.get_sym_orders(asset), market_price)
+        market_price = market_prices[asset]
+        qty = pnl_by_sym[asset].position_qty
+        pnl_data = pnl_by_sym[asset].pnl(market_price)
 
         d={
             'id': asset,
@@ -689,31 +715,32 @@ def _coalesce_orders(orders: List[HistoricalOrder]):
 
 
 def order_replay(asset: str, coalesce: bool):
+    import numpy as np
+    from pandas import DataFrame
     db = Db()
     orders = db.get_sym_orders(asset)
     if coalesce:
         orders = _coalesce_orders(orders)
-    stats_data = []
-    for i in range(1,len(orders)+1):
-        orders_slice = orders[:i]
-        last_order = orders_slice[-1]
-        last_order_price = abs(last_order.value / last_order.qty)
-        pnl_data = pnl.calculate_inc_pnl(orders_slice, last_order_price)
-
-        stats_data.append({
-            'date':  last_order.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            'side': last_order.side,
-            'price': last_order_price,
-            'qty': last_order.qty,
-            'value': round(last_order.value,2),
-            'break_even_price': pnl_data.break_even_price,
-            'unrealized_sell_value': round(pnl_data.unrealized_sell_value, 2),
-            'r pnl': round(pnl_data.realized_pnl,2),
-            'r pnl %': round(pnl_data.realized_pnl_percent,1) if pnl_data.realized_pnl_percent != pnl.INVALID_PERCENT else nan,
-            'u pnl': round(pnl_data.unrealized_pnl,2),
-            'u pnl %': round(pnl_data.unrealized_pnl_percent,1) if pnl_data.unrealized_pnl_percent != pnl.INVALID_PERCENT else nan,
-        })
-    df = DataFrame.from_dict(stats_data)
+    side, value, qty = pnl.orders_to_arrays(orders)
+    price = np.abs(value / qty)
+    pnl_data = pnl.calculate_inc_pnl_series(side, value, qty, price)
+
+    def percent(a: np.ndarray) -> np.ndarray:
+        return np.where(a != pnl.INVALID_PERCENT, np.round(a, 1), nan)
+
+    df = DataFrame({
+        'date':  [o.timestamp.strftime("%Y-%m-%d %H:%M:%S") for o in orders],
+        'side': [o.side for o in orders],
+        'price': price,
+        'qty': qty,
+        'value': np.round(value, 2),
+        'break_even_price': pnl_data.break_even_price,
+        'unrealized_sell_value': np.round(pnl_data.unrealized_sell_value, 2),
+        'r pnl': np.round(pnl_data.realized_pnl, 2),
+        'r pnl %': percent(pnl_data.realized_pnl_percent),
+        'u pnl': np.round(pnl_data.unrealized_pnl, 2),
+        'u pnl %': percent(pnl_data.unrealized_pnl_percent),
+    })
     rprint(df.to_string(index=False, na_rep="~"))
     print()
 
@@ -763,6 +790,7 @@ def main():
     parser.add_argument('--coalesce', action='store_const', const='True', help='For --order-replay, merge sequential orders of same side')
     parser.add_argument('--balances', action='store_const', const='True', help='Print USD or USDT balance on each exchange account')
     parser.add_argument('--last', action='store_const', const='True', help='Print date of last DCA bulk purchase')
+    parser.add_argument('--profile-startup', action='store_const', const='True', help='Print import time breakdown on exit')
     args = parser.parse_args()
 
     if args.add:
@@ -8,6 +8,7 @@ from lib.trader import api_keys_config
 from lib.trader import ftx_api
 from lib.common.sound_notification import SoundNotification
 from lib.common.misc import get_decimal_count
+from lib.common.snapshot import IndexedSnapshot
 from lib.common.msg import *
 
 
@@ -61,7 +62,7 @@ class Client:
         cfg = api_keys_config.ApiKeysConfig()
         self._api = ftx_api.Ftx(cfg.get_ftx_ks()[0], cfg.get_ftx_ks()[1], cfg.get_ftx_subaccount_fundingratefarm())
         self._restrict_non_usd_collateral = restrict_non_usd_collateral
-        self._markets = None
+        self._markets = IndexedSnapshot(self._api.get_markets, "name")
         self._funding_rates = None
         self._account = None
         self._balances = None
@@ -91,15 +92,10 @@ class Client:
         return self._balances
 
     def get_market(self, market: str):
-        if self._markets is None:
-            self._markets = self._api.get_markets()
-        market = [m for m in self._markets if m['name'] ==  market][0]
-        return market
+        return self._markets.get(market)
 
     def has_market(self, market: str) -> bool:
-        if self._markets is None:
-            self._markets = self._api.get_markets()
-        return len( [m for m in self._markets if m['name'] ==  market] ) != 0
+        return market in self._markets
 
     def get_future_data(self, market: str):
         return self._api.get_future_stats(market)
@@ -1,46 +1,107 @@
-import os, json, time, datetime
+import os, json, time, datetime, importlib, glob, shutil
 from typing import List, Tuple
 
 from lib.common import pnl
 from lib.common import convert
+from lib.common import candle_store
+from lib.common.streaming_ta import Bar, IndicatorBank
 from lib.common.id_map_binance import id_to_binance
 from lib.common.id_map_ftx import id_to_ftx
 from lib.trader import api_keys_config
 from lib.trader import ftx_api
 from lib.trader import binance_api
-from lib.bots.interfaces import Broker, Ticker, Strategy, Conductor
+from lib.bots.interfaces import Broker, Ticker, TickerArrays, Strategy, VectorizedStrategy, Conductor
+from lib.bots.recorder import TradeRecorder
 import pandas as pd
 import numpy as np
 
 
 
 
+def get_strategy_class(name: str):
+    strategy_module = None
+    for subset in ".", ".custom.":
+        try:
+            strategy_module = importlib.import_module(f"lib.bots.strategies{subset}{name}")
+        except ModuleNotFoundError:
+            continue
+    if strategy_module is None:
+        raise ValueError(f"strategy not found: {name}")
+    strategy_class = getattr(strategy_module, f"StrategyImpl")
+    return strategy_class
+
+
+def candles_to_arrays(candles: List[dict]) -> TickerArrays:
+    '''
+    converts candles to contiguous read-only arrays, one per column
+    '''
+    def column(name: str, dtype) -> np.ndarray:
+        a = np.ascontiguousarray(np.array([x[name] for x in candles], dtype=dtype))
+        a.flags.writeable = False
+        return a
+
+    return TickerArrays(
+        timestamp=column('timestamp', 'datetime64[ms]'),
+        open=column('open', np.double),
+        high=column('high', np.double),
+        low=column('low', np.double),
+        close=column('close', np.double),
+        volume=column('volume', np.double),
+    )
+
+
+def array_bar(arrays: TickerArrays, i: int) -> Bar:
+    return Bar(
+        open=float(arrays.open[i]),
+        high=float(arrays.high[i]),
+        low=float(arrays.low[i]),
+        close=float(arrays.close[i]),
+        volume=float(arrays.volume[i]),
+    )
+
+
 class DummyBroker(Broker):
-    def __init__(self, ticker: Ticker, initial_account: float = 1000, commission: float=0.0007):
+    '''
+     Fills orders at the market price of the ticker. Fills are recorded, printing them is opt-in with verbose
+    '''
+    def __init__(self, ticker: Ticker, initial_account: float = 1000, commission: float=0.0007, verbose: bool = False, recorder: TradeRecorder = None):
         self._ticker = ticker
         self._account_usd = initial_account
         self._account_token = 0
         self._commission = commission
+        self._verbose = verbose
+        self._recorder = recorder if recorder is not None else TradeRecorder(initial_account)
 
     def _print_balance(self):
         print(f"**balance** usd={self._account_usd} token={self._account_token}")
 
+    def _record(self, side: int, price: float, value: float, qty: float):
+        self._recorder.record(np.datetime64(self._ticker.timestamp, 'ms'), side, price, qty, value, self._account_usd, self._account_token)
+        if self._verbose:
+            self._print_balance()
+
     def buy(self, qty: float)->Tuple[float,float]:
         price = self._ticker.market_price
-        print(f"buying {qty} at {price}")
+        if self._verbose:
+            print(f"buying {qty} at {price}")
         self._account_token += qty*(1-self._commission)
         self._account_usd -= qty*price
-        self._print_balance()
+        self._record(pnl.SIDE_BUY, price, qty*price, qty*(1-self._commission))
         return [qty*price, qty*(1-self._commission)]
 
     def sell(self, qty: float)->Tuple[float,float]:
         price = self._ticker.market_price
-        print(f"selling {qty} at {price}")
+        if self._verbose:
+            print(f"selling {qty} at {price}")
         self._account_token -= qty
         self._account_usd +=  qty*(1-self._commission)*price
-        self._print_balance()
+        self._record(pnl.SIDE_SELL, price, qty*(1-self._commission)*price, qty)
         return [qty*(1-self._commission)*price, qty]
 
+    @property
+    def recorder(self) -> TradeRecorder:
+        return self._recorder
+
     @property
     def account_size_usd(self) -> float:
         return self._account_usd
@@ -50,39 +111,54 @@ class DummyBroker(Broker):
 
 
 class BrokerAdapterPnL(Broker):
-    def __init__(self, ticker: Ticker, broker: Broker):
+    def __init__(self, ticker: Ticker, broker: Broker, report_each_trade: bool = False):
         self._broker = broker
         self._ticker = ticker
+        self._report_each_trade = report_each_trade
         self._orders:List[pnl.Order] = list()
+        self._accumulator = pnl.PnLAccumulator()
         self._pnl = None
+        self._pnl_price = None
 
-    def _print_pnl(self):
-        pnl_data = pnl.calculate_inc_pnl(self._orders, self._ticker.market_price)
-        stats_data = []
-        stats_data.append({
-            'break_even_price': pnl_data.break_even_price,
-            'r pnl': round(pnl_data.realized_pnl,1),
-            'r pnl %': round(pnl_data.realized_pnl_percent,1) if pnl_data.realized_pnl_percent != pnl.INVALID_PERCENT else pnl.INVALID_PERCENT,
-            'u pnl': round(pnl_data.unrealized_pnl,1),
-            'u pnl %': round(pnl_data.unrealized_pnl_percent,1) if pnl_data.unrealized_pnl_percent != pnl.INVALID_PERCENT else pnl.INVALID_PERCENT,
-        })
-        df_pnl = pd.DataFrame.from_dict(stats_data)
-        print(df_pnl.to_string(index=False))
+    def pnl_at(self, market_price: float) -> pnl.PnL:
+        '''
+        PnL of all trades at given market price, from the running totals of the trades
+        '''
+        return self._accumulator.pnl(market_price)
+
+    def print_pnl(self, market_price: float = None):
+        '''
+        prints PnL of all trades at given market price, the ticker's current one by default
+        '''
+        pnl_data = self.pnl_at(self._ticker.market_price if market_price is None else market_price)
+        def percent(p: float) -> str:
+            return f"{p:.1f}" if p != pnl.INVALID_PERCENT else "~"
+        print(f"break_even_price={pnl_data.break_even_price} r pnl={pnl_data.realized_pnl:.1f} ({percent(pnl_data.realized_pnl_percent)}%) u pnl={pnl_data.unrealized_pnl:.1f} ({percent(pnl_data.unrealized_pnl_percent)}%)")
         self._pnl = pnl_data
 
 
+    def _add_order(self, order: pnl.Order):
+        self._orders.append(order)
+        self._accumulator.add(order)
+
     def buy(self, qty: float)->Tuple[float,float]:
         [value,qty] = self._broker.buy(qty)
         #print(f"buying {fill_qty} at {price}")
-        self._orders.append(pnl.Order("BUY", value, qty))
-        self._print_pnl()
+        self._add_order(pnl.Order("BUY", value, qty))
+        if self._report_each_trade:
+            self.print_pnl()
+        else:
+            self._pnl, self._pnl_price = None, self._ticker.market_price
         return [value,qty]
 
     def sell(self, qty: float)->Tuple[float,float]:
         [value,qty] = self._broker.sell(qty)
         #print(f"selling {fill_qty} at {price}")
-        self._orders.append(pnl.Order("SELL", value, qty))
-        self._print_pnl()
+        self._add_order(pnl.Order("SELL", value, qty))
+        if self._report_each_trade:
+            self.print_pnl()
+        else:
+            self._pnl, self._pnl_price = None, self._ticker.market_price
         return [value,qty]
 
     @property
@@ -93,8 +169,17 @@ class BrokerAdapterPnL(Broker):
     def account_size_token(self) -> float:
         return self._broker.account_size_token
 
+    @property
+    def orders(self) -> List[pnl.Order]:
+        return self._orders
+
     @property
     def pnl(self) -> pnl.PnL:
+        '''
+        PnL as of the last trade
+        '''
+        if self._pnl is None and self._pnl_price is not None:
+            self._pnl = self._accumulator.pnl(self._pnl_price)
         return self._pnl
 
 
@@ -131,6 +216,8 @@ class TickerLive(Ticker):
     def __init__(self, market: str, timeframe: str):      
         self._market = market
         self._timeframe = timeframe
+        self._indicators = IndicatorBank()
+        self._indicators_timestamp = None
 
     @property
     def timeframe(self) -> str:
@@ -142,20 +229,36 @@ class TickerLive(Ticker):
         '''
         api = binance_api.Binance()
         candles = api.get_candles_by_limit(id_to_binance[self._market], self._timeframe, limit=500)
-        self._df = pd.DataFrame.from_dict(candles)
-        self._df = self._df[:-1] # remove last item as it corresponds to just opened candle (partial)
-        self._df['timestamp'] = pd.DatetimeIndex(pd.to_datetime(self._df['timestamp'], unit="ms"))
+        candles = candles[:-1] # remove last item as it corresponds to just opened candle (partial)
+        self._arrays = candles_to_arrays(candles)
+        self._update_indicators()
+
+    def _update_indicators(self):
+        ts = self._arrays.timestamp
+        if self._indicators_timestamp is None or self._indicators_timestamp < ts[0]:
+            # no overlap with bars already fed, e.g. after a long sleep: start over
+            self._indicators.reset()
+            first_new = 0
+        else:
+            first_new = int(np.searchsorted(ts, self._indicators_timestamp, side="right"))
+        for i in range(first_new, len(ts)):
+            self._indicators.feed(array_bar(self._arrays, i))
+        self._indicators_timestamp = ts[-1]
+
+    @property
+    def indicators(self) -> IndicatorBank:
+        return self._indicators
 
     @property
     def market_price(self) -> float:
-        return self.close[-1]
+        return float(self._arrays.close[-1])
 
     @property
     def timestamp(self) -> pd.DatetimeIndex:
-        return self._df['timestamp'][len(self._df['timestamp'])-1]
+        return pd.Timestamp(self._arrays.timestamp[-1])
 
     def _get_array(self, elem: str):
-        return self._df[elem].to_numpy(dtype=np.double)
+        return getattr(self._arrays, elem)
 
     @property
     def open(self):
@@ -183,54 +286,79 @@ class TickerHistorical(Ticker):
      Ticker using historical candlestick chart data 
     '''
 
-    def _load_candles_live(self, market: str, timeframe: str, dt_start: str, dt_end: str ):
+    def _load_candles_live(self, market: str, timeframe: str, ts_first: int, ts_last: int ) -> dict:
         api = binance_api.Binance()
-        return api.get_candles_by_range(id_to_binance[market], timeframe, dt_start, dt_end)
+        candles = api.get_candles_by_range_ms(id_to_binance[market], timeframe, ts_first, ts_last)
+        return candles_to_arrays(candles)._asdict()
 
-    def _load_candles(self, market: str, timeframe: str, dt_start: str, dt_end: str ) -> str:
+    @staticmethod
+    def _import_legacy_caches(store: candle_store.CandleStore, cache_dir: str, market: str, timeframe: str):
+        '''
+        moves bars of caches keyed on exact date range into the store
+        '''
+        legacy = [(path, candle_store.load_columns) for path in glob.glob(f"{cache_dir}/candles/{market}-{timeframe}-*") if not path.endswith(".tmp")]
+        legacy += [(path, lambda p: candles_to_arrays(json.load(open(p)))._asdict()) for path in glob.glob(f"{cache_dir}/cache_candles-{market}-{timeframe}-*.json")]
+        for path, load in legacy:
+            columns = load(path)
+            if columns is not None and len(columns['timestamp']) > 0:
+                ts = columns['timestamp'].astype('datetime64[ms]').view(np.int64)
+                store.add(columns, int(ts[0]), int(ts[-1]) + 1)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def _load_candles(self, market: str, timeframe: str, dt_start: str, dt_end: str ) -> TickerArrays:
         cache_dir:str ="cache"
-        cache_file:str = f"{cache_dir}/cache_candles-{market}-{timeframe}-{dt_start}-{dt_end}.json"
-        if os.path.exists(cache_file):
-            data = json.load(open(cache_file))
-            print("loading cached candle data")
-        else:
-            data = self._load_candles_live(market, timeframe, dt_start, dt_end)
-            if not os.path.exists(cache_dir):
-                os.mkdir(cache_dir)
-            with open(cache_file, "w") as f:
-                json.dump(data, f)
-        return data
+        store = candle_store.CandleStore(f"{cache_dir}/candles/{market}-{timeframe}", convert.timeframe_to_interval_ms[timeframe],
+                                         lambda ts_first, ts_last: self._load_candles_live(market, timeframe, ts_first, ts_last))
+        self._import_legacy_caches(store, cache_dir, market, timeframe)
+        columns = store.get(binance_api.datetime_iso_to_binance(dt_start), binance_api.datetime_iso_to_binance(dt_end))
+        return TickerArrays(**{name: columns[name] for name in TickerArrays._fields})
 
 
     def __init__(self, market: str, timeframe: str, dt_start: str, dt_end: str ):
         #api = binance_api.Binance()
         #candles = api.get_candles_by_range(convert.coingecko_id_to_binance[market], timeframe, dt_start, dt_end)
-        candles = self._load_candles(market, timeframe, dt_start, dt_end)
-        self._df = pd.DataFrame.from_dict(candles)
-        self._df['timestamp'] = pd.DatetimeIndex(pd.to_datetime(self._df['timestamp'], unit="ms"))
-        #self._df.set_index('timestamp', inplace=True)
-        #print(self._df.to_string())
+        self._set_arrays(self._load_candles(market, timeframe, dt_start, dt_end))
+
+    @classmethod
+    def from_arrays(cls, arrays: TickerArrays):
+        '''
+        create ticker over already loaded bar data
+        '''
+        ticker = cls.__new__(cls)
+        ticker._set_arrays(arrays)
+        return ticker
+
+    def _set_arrays(self, arrays: TickerArrays):
+        self._arrays = arrays
+        self._len = len(self._arrays.close)
         self._p = 0
+        self._indicators = IndicatorBank()
 
     def advance(self):
         self._p += 1
 
+    def seek(self, p: int):
+        self._p = p
+
     def ended(self)->bool:
-        return self._p >= len(self._df)
+        return self._p >= self._len
 
     @property
     def timestamp(self) -> pd.DatetimeIndex:
-        return self._df['timestamp'][self._p]
+        return pd.Timestamp(self._arrays.timestamp[self._p])
 
     @property
     def market_price(self) -> float:
         assert not self.ended()
-        return float(self._df['close'][self._p])
+        return float(self._arrays.close[self._p])
 
     def _get_array(self, elem: str):
         assert not self.ended()
-        #return np.flip(self._df[elem][:self._p+1].to_numpy(dtype=np.double))
-        return self._df[elem][:self._p+1].to_numpy(dtype=np.double)
+        # prefix view of the preconverted column, no copy is made
+        return getattr(self._arrays, elem)[:self._p+1]
 
     @property
     def open(self):
@@ -252,6 +380,23 @@ class TickerHistorical(Ticker):
     def volume(self):
         return self._get_array('volume')
 
+    @property
+    def indicators(self) -> IndicatorBank:
+        assert not self.ended()
+        if len(self._indicators) > self._p + 1:
+            self._indicators.reset()
+        # bring indicators up to the current bar, one bar at a time
+        for i in range(len(self._indicators), self._p + 1):
+            self._indicators.feed(array_bar(self._arrays, i))
+        return self._indicators
+
+    @property
+    def arrays(self) -> TickerArrays:
+        '''
+        bar data of the whole backtesting region, regardless of the current position
+        '''
+        return self._arrays
+
 
 
 
@@ -293,8 +438,45 @@ class BacktestingConductor(Conductor):
         self._broker = broker
         self._strategy = strategy
 
+    @property
+    def ticker(self) -> TickerHistorical:
+        return self._ticker
+
+    @property
+    def broker(self) -> Broker:
+        return self._broker
+
     def run(self):
         while not self._ticker.ended():
             #print(f"tick : {self._ticker.timestamp}")
             self._strategy.tick(self._ticker, self._broker)
             self._ticker.advance()
+
+
+class VectorizedBacktestingConductor(Conductor):
+    '''
+     Backtesting of strategies which evaluate all bars at once.
+     Orders are filled in a single pass over bars with nonzero signals.
+    '''
+    def __init__(self, strategy: VectorizedStrategy, ticker: TickerHistorical, broker: Broker):
+        self._ticker = ticker
+        self._broker = broker
+        self._strategy = strategy
+
+    @property
+    def ticker(self) -> TickerHistorical:
+        return self._ticker
+
+    @property
+    def broker(self) -> Broker:
+        return self._broker
+
+    def run(self):
+        signals = self._strategy.signals(self._ticker.arrays)
+        for p in np.flatnonzero((signals.buy > 0) | (signals.sell > 0)):
+            self._ticker.seek(p)
+            if signals.sell[p] > 0:
+                self._broker.sell(signals.sell[p])
+            if signals.buy[p] > 0:
+                self._broker.buy(signals.buy[p])
+        self._ticker.seek(len(signals.buy))
@@ -1,8 +1,9 @@
 from abc import abstractmethod, abstractproperty
-from typing import Tuple
+from typing import Tuple, NamedTuple
 import numpy as np
 import pandas as pd
 from lib.common import pnl
+from lib.common.streaming_ta import IndicatorBank
 
 class Broker:
     @abstractmethod
@@ -55,6 +56,26 @@ class Ticker:
     def volume(self) -> np.ndarray:
         """returns volume values of bars"""
 
+    @abstractproperty
+    def indicators(self) -> IndicatorBank:
+        """returns streaming indicators updated up to the current bar"""
+
+
+class TickerArrays(NamedTuple):
+    """whole-series bar data"""
+    timestamp:  np.ndarray
+    open:       np.ndarray
+    high:       np.ndarray
+    low:        np.ndarray
+    close:      np.ndarray
+    volume:     np.ndarray
+
+
+class Signals(NamedTuple):
+    """per-bar order quantities, 0 where no order is placed"""
+    buy:    np.ndarray
+    sell:   np.ndarray
+
 
 class Strategy:
     @abstractmethod
@@ -62,6 +83,12 @@ class Strategy:
         """strategy update"""
 
 
+class VectorizedStrategy(Strategy):
+    @abstractmethod
+    def signals(self, bars: TickerArrays) -> Signals:
+        """evaluate strategy over all bars at once"""
+
+
 class Conductor:
     @abstractmethod
     def run(self):
@@ -0,0 +1,281 @@
+'''
+Backtesting of the dca.py auto accumulation over a whole portfolio.
+Every day, each asset of auto_accumulate that passes the accumulation filters is bought with its quota: quota_usd times
+its quota_fixed_factor, lowered for all assets at once when their sum exceeds total_quota_usd. Bars of all assets are
+aligned on one daily time axis and the filters are evaluated for all days at once, from the same indicators
+MarketData provides live
+'''
+import re
+from math import isclose
+from typing import Dict, List, NamedTuple, Tuple
+import numpy as np
+import pandas as pd
+import talib
+from numpy.lib.stride_tricks import sliding_window_view
+from lib.bots.interfaces import TickerArrays, Conductor
+from lib.common.metrics import calc_discount_score
+from lib.common.msg import warn
+
+# bars the filters look back, loaded before the start of the backtest: 200 day low/high of check_discount
+WARMUP_DAYS = 200
+# trailing closes and period of the RSI of MarketData.get_rsi
+RSI_DAYS = 50
+RSI_PERIOD = 14
+
+
+def flat_categories(categories: dict, parent: str = "/all") -> List[Tuple[str, str]]:
+    '''
+    (asset, category path) of every asset of the categories tree of config/dca.yml
+    '''
+    assets = []
+    for k, v in categories.items():
+        if type(v) is dict:
+            assets += flat_categories(v, f"{parent}/{k}")
+        else:
+            assets += [(asset, f"{parent}/{k}") for asset in v]
+    return assets
+
+
+def auto_accumulate_assets(cfg: dict) -> List[Tuple[str, str]]:
+    '''
+    (asset, category) of the auto_accumulate entries, in the order of dca.py --add
+    '''
+    flat = flat_categories(cfg['categories'])
+    category_of = {asset: category for asset, category in flat}
+    assets = []
+    for asset_or_base_category in cfg['auto_accumulate']:
+        if "/all" in asset_or_base_category:
+            assets += [x for x in flat if re.match(f"^{asset_or_base_category}.*", x[1])]
+        else:
+            assets.append((asset_or_base_category, category_of.get(asset_or_base_category, "/all/uncategorized")))
+    # bought once per day, however many entries match
+    unique = {}
+    for asset, category in assets:
+        unique.setdefault(asset, category)
+    return list(unique.items())
+
+
+def quota_fixed_factor(cfg: dict, category: str, asset: str) -> float:
+    factors = cfg.get('quota_fixed_factor') or {}
+    if asset in factors:
+        return factors[asset]
+    if category in factors:
+        return factors[category]
+    return 1
+
+
+class AlignedBars(NamedTuple):
+    '''
+    daily bars of several assets on one time axis, days × assets. NaN where an asset has no bar
+    '''
+    timestamp:  np.ndarray
+    open:       np.ndarray
+    high:       np.ndarray
+    low:        np.ndarray
+    close:      np.ndarray
+
+
+def align_bars(bars: List[TickerArrays]) -> Tuple[AlignedBars, List[np.ndarray]]:
+    '''
+    aligned bars and, per asset, the rows of its bars
+    '''
+    timestamp = np.unique(np.concatenate([b.timestamp for b in bars])) if bars else np.zeros(0, dtype='datetime64[ms]')
+    rows = [np.searchsorted(timestamp, b.timestamp) for b in bars]
+    def column(name: str) -> np.ndarray:
+        a = np.full((len(timestamp), len(bars)), np.nan)
+        for j, b in enumerate(bars):
+            a[rows[j], j] = getattr(b, name)
+        return a
+    return AlignedBars(timestamp, column('open'), column('high'), column('low'), column('close')), rows
+
+
+def windowed_rsi(close: np.ndarray, days_before: int = RSI_DAYS, period: int = RSI_PERIOD) -> np.ndarray:
+    '''
+    talib.RSI(close[t-days_before:t+1], period)[-1] for every t, as MarketData.get_rsi evaluates it on each day.
+    The smoothing restarts with every window, so windows are evaluated side by side
+    '''
+    rsi = talib.RSI(close, period)
+    window = days_before + 1
+    if len(close) <= window:
+        return rsi
+    # windows starting after the first bar, those up to it are covered by the RSI over all bars
+    diff = np.diff(sliding_window_view(close, window)[1:], axis=1)
+    gain, loss = np.maximum(diff, 0.), np.maximum(-diff, 0.)
+    avg_gain = gain[:, :period].sum(axis=1) / period
+    avg_loss = loss[:, :period].sum(axis=1) / period
+    for i in range(period, diff.shape[1]):
+        avg_gain = (avg_gain * (period - 1) + gain[:, i]) / period
+        avg_loss = (avg_loss * (period - 1) + loss[:, i]) / period
+    total = avg_gain + avg_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi[window:] = np.where(total != 0, 100 * avg_gain / total, 0.)
+    return rsi
+
+
+def lo_hi(low: np.ndarray, high: np.ndarray, days_before: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    MarketData.get_lo_hi_n_days for every day: extremes of the last min(t, days_before) bars up to t.
+    NaN on the first two days, talib needs a window of at least two bars
+    '''
+    n = len(low)
+    lo, hi = np.full(n, np.nan), np.full(n, np.nan)
+    # before days_before bars are available, the window grows from the second bar
+    growing = slice(2, min(n, days_before))
+    lo[growing] = np.minimum.accumulate(low[1:])[1:max(1, min(n, days_before) - 1)]
+    hi[growing] = np.maximum.accumulate(high[1:])[1:max(1, min(n, days_before) - 1)]
+    if n > days_before:
+        lo[days_before:] = sliding_window_view(low, days_before)[1:].min(axis=1)
+        hi[days_before:] = sliding_window_view(high, days_before)[1:].max(axis=1)
+    return lo, hi
+
+
+def passes_acc_filter(cfg: dict, bars: TickerArrays) -> np.ndarray:
+    '''
+    dca.passes_acc_filter of one asset on each of its bars, evaluated at the close of the bar
+    '''
+    o, h, l, c = (np.asarray(getattr(bars, name), dtype=np.float64) for name in ('open', 'high', 'low', 'close'))
+    n = len(c)
+    passes = np.ones(n, dtype=bool)
+    # check_market_open: an asset with a bar on the day was tradeable
+
+    if cfg.get('check_correction'):
+        length = cfg['check_correction_min_sequential_days']
+        down = np.cumsum(np.r_[0, o > c])
+        is_down = np.zeros(n, dtype=bool)
+        if n >= length:
+            is_down[length-1:] = down[length:] - down[:n-length+1] == length
+        passes &= is_down
+
+    if cfg.get('check_pump'):
+        change = np.zeros(n)
+        change[1:] = (c[1:] - c[:-1]) / c[:-1] * 100
+        passes &= ~(change > cfg['check_pump_threshold'])
+
+    if cfg.get('check_rsi'):
+        # no RSI yet passes, as it does live
+        passes &= ~(windowed_rsi(c) > cfg['check_rsi_threshold'])
+
+    if cfg.get('check_discount'):
+        low, high = lo_hi(l, h, WARMUP_DAYS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            discount = calc_discount_score(market_price=c, low=low, high=high)
+        passes &= ~(discount < cfg['check_discount_threshold'])
+
+    return passes
+
+
+class PortfolioBacktestResult(NamedTuple):
+    timestamp:  np.ndarray      # days
+    assets:     List[str]
+    close:      np.ndarray      # days × assets, last close carried over days without a bar, NaN before the first
+    buy_value:  np.ndarray      # days × assets, USD spent
+    buy_qty:    np.ndarray      # days × assets, coins/shares bought
+
+
+class PortfolioDcaConductor(Conductor):
+    '''
+     Replays dca.py auto accumulation on daily bars of many assets, see config/example.dca.yml.
+     bars: daily bars per asset, including the WARMUP_DAYS before start the filters need. Assets of auto_accumulate
+     without bars are left out
+    '''
+    def __init__(self, cfg: dict, bars: Dict[str, TickerArrays], start: str = None, commission: float = 0.):
+        self._cfg = cfg
+        self._bars = bars
+        self._start = start
+        self._commission = commission
+        self.result: PortfolioBacktestResult = None
+
+    def run(self):
+        cfg = self._cfg
+        assets, categories = [], []
+        for asset, category in auto_accumulate_assets(cfg):
+            if asset not in self._bars or len(self._bars[asset].close) == 0:
+                warn(f"{asset}: no bars, left out")
+                continue
+            assets.append(asset)
+            categories.append(category)
+        bars = [self._bars[asset] for asset in assets]
+        aligned, rows = align_bars(bars)
+        n_days = len(aligned.timestamp)
+
+        no_filter = [asset in cfg.get('no_filter_list', []) or category in cfg.get('no_filter_categories', []) for asset, category in zip(assets, categories)]
+        passes = np.zeros((n_days, len(assets)), dtype=bool)
+        for j, b in enumerate(bars):
+            passes[rows[j], j] = True if no_filter[j] else passes_acc_filter(cfg, b)
+        if self._start is not None:
+            passes[aligned.timestamp < np.datetime64(self._start, 'ms')] = False
+
+        factors = np.array([quota_fixed_factor(cfg, category, asset) for asset, category in zip(assets, categories)], dtype=np.float64)
+        passes &= ~np.array([isclose(f, 0) for f in factors], dtype=bool)
+
+        # pre pass: estimated value of the day, then quota lowered to total_quota_usd
+        quota_usd = cfg['quota_usd']
+        daily_qty = np.round(quota_usd * factors)
+        total_value = passes @ daily_qty
+        with np.errstate(divide='ignore', invalid='ignore'):
+            limited = np.round(quota_usd * cfg['total_quota_usd'] / total_value, 2)
+        quota_asset = np.where(total_value > cfg['total_quota_usd'], limited, quota_usd)
+
+        # main pass: bought at the close
+        buy_value = np.where(passes, quota_asset[:, None] * factors[None, :], 0.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            buy_qty = np.where(passes, buy_value * (1 - self._commission) / aligned.close, 0.)
+
+        close = pd.DataFrame(aligned.close).ffill().to_numpy()
+        self.result = PortfolioBacktestResult(aligned.timestamp, assets, close, buy_value, buy_qty)
+        return self.result
+
+
+def equity_curve(result: PortfolioBacktestResult) -> pd.DataFrame:
+    '''
+    USD invested and value of the accumulated positions at the close of each day
+    '''
+    qty = np.cumsum(result.buy_qty, axis=0)
+    value = np.nansum(qty * result.close, axis=1)
+    invested = np.cumsum(result.buy_value.sum(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_percent = np.where(invested > 0, (value / invested - 1) * 100, np.nan)
+    return pd.DataFrame({
+        'timestamp':    result.timestamp,
+        'bought':       result.buy_value.sum(axis=1),
+        'invested':     invested,
+        'value':        value,
+        'pnl %':        pnl_percent,
+    })
+
+
+def positions(result: PortfolioBacktestResult) -> pd.DataFrame:
+    '''
+    per asset totals at the end of the backtest
+    '''
+    invested = result.buy_value.sum(axis=0)
+    qty = result.buy_qty.sum(axis=0)
+    last_close = result.close[-1] if len(result.close) else np.full(len(result.assets), np.nan)
+    value = qty * np.nan_to_num(last_close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'asset':            result.assets,
+            'buys':             np.count_nonzero(result.buy_value, axis=0),
+            'invested':         invested,
+            'qty':              qty,
+            'break even price': np.where(qty > 0, invested / qty, np.nan),
+            'last price':       last_close,
+            'value':            value,
+            'u pnl %':          np.where(invested > 0, (value / invested - 1) * 100, np.nan),
+        })
+
+
+def load_daily_bars(assets: List[str], dt_start: str, dt_end: str) -> Dict[str, TickerArrays]:
+    '''
+    daily Binance bars from WARMUP_DAYS before dt_start, through the candle store. Assets Binance doesn't list are left out
+    '''
+    from lib.common.id_map_binance import id_to_binance
+    from lib.bots.framework import TickerHistorical
+    warmup_start = (pd.Timestamp(dt_start) - pd.Timedelta(days=WARMUP_DAYS)).strftime("%Y-%m-%d")
+    bars = {}
+    for asset in assets:
+        if asset not in id_to_binance:
+            warn(f"{asset}: no Binance market, left out")
+            continue
+        bars[asset] = TickerHistorical(asset, "1d", warmup_start, dt_end).arrays
+    return bars
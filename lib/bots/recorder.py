@@ -0,0 +1,122 @@
+'''
+Trade log and equity curve of a backtest, kept in preallocated arrays instead of being printed trade by trade
+'''
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from lib.common.pnl import SIDE_BUY, SIDE_SELL
+from lib.bots.interfaces import TickerArrays
+
+
+class Summary(NamedTuple):
+    trades:             int
+    buys:               int
+    sells:              int
+    bought_qty:         float
+    bought_value:       float
+    sold_qty:           float
+    sold_value:         float
+    initial_equity:     float
+    final_equity:       float
+    return_percent:     float
+    max_drawdown_percent: float
+
+
+class TradeRecorder:
+    '''
+    fills of a broker with the account balances after each of them. record() is O(1), buffers double when full
+    '''
+    _columns = {
+        'timestamp':        'datetime64[ms]',
+        'side':             np.int8,
+        'price':            np.float64,
+        'qty':              np.float64,
+        'value':            np.float64,
+        'account_usd':      np.float64,
+        'account_token':    np.float64,
+    }
+
+    def __init__(self, initial_usd: float, initial_token: float = 0., capacity: int = 1024):
+        self.initial_usd = initial_usd
+        self.initial_token = initial_token
+        self._buffers = {name: np.empty(capacity, dtype=dtype) for name, dtype in self._columns.items()}
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def record(self, timestamp: np.datetime64, side: int, price: float, qty: float, value: float, account_usd: float, account_token: float):
+        if self._len == len(self._buffers['side']):
+            for name, buffer in self._buffers.items():
+                self._buffers[name] = np.resize(buffer, 2 * len(buffer))
+        i = self._len
+        b = self._buffers
+        b['timestamp'][i] = timestamp
+        b['side'][i] = side
+        b['price'][i] = price
+        b['qty'][i] = qty
+        b['value'][i] = value
+        b['account_usd'][i] = account_usd
+        b['account_token'][i] = account_token
+        self._len += 1
+
+    def column(self, name: str) -> np.ndarray:
+        '''
+        recorded values of given column, a view valid until the next record()
+        '''
+        return self._buffers[name][:self._len]
+
+    def trades(self) -> pd.DataFrame:
+        df = pd.DataFrame({name: self.column(name) for name in self._columns})
+        df['side'] = np.where(df['side'] == SIDE_BUY, "BUY", "SELL")
+        return df
+
+    def equity_curve(self, bars: TickerArrays) -> pd.DataFrame:
+        '''
+        account balances and equity in USD at the close of every bar, trades are filled at the close of their bar
+        '''
+        # 0 before the first trade, else 1 + index of the last trade up to the bar
+        after = np.searchsorted(self.column('timestamp'), bars.timestamp, side='right')
+        usd = np.r_[self.initial_usd, self.column('account_usd')][after]
+        token = np.r_[self.initial_token, self.column('account_token')][after]
+        return pd.DataFrame({
+            'timestamp':        bars.timestamp,
+            'close':            bars.close,
+            'account_usd':      usd,
+            'account_token':    token,
+            'equity':           usd + token * bars.close,
+        })
+
+    def summary(self, bars: TickerArrays) -> Summary:
+        side = self.column('side')
+        buy, sell = side == SIDE_BUY, side == SIDE_SELL
+        qty, value = self.column('qty'), self.column('value')
+        equity = self.equity_curve(bars)['equity'].to_numpy()
+        initial_equity = self.initial_usd + self.initial_token * (float(bars.close[0]) if len(bars.close) else 0.)
+        final_equity = float(equity[-1]) if len(equity) else initial_equity
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peak > 0, (peak - equity) / peak * 100, 0.)
+        return Summary(
+            trades=self._len,
+            buys=int(buy.sum()),
+            sells=int(sell.sum()),
+            bought_qty=float(qty[buy].sum()),
+            bought_value=float(value[buy].sum()),
+            sold_qty=float(qty[sell].sum()),
+            sold_value=float(value[sell].sum()),
+            initial_equity=initial_equity,
+            final_equity=final_equity,
+            return_percent=(final_equity / initial_equity - 1) * 100 if initial_equity else 0.,
+            max_drawdown_percent=float(drawdown.max()) if len(drawdown) else 0.,
+        )
+
+
+def write_table(df: pd.DataFrame, path: str):
+    '''
+    .parquet files need pyarrow or fastparquet, anything else is written as CSV
+    '''
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
@@ -1,6 +1,10 @@
-from lib.bots.interfaces import Strategy, Ticker, Broker
+import logging
+from lib.bots.interfaces import VectorizedStrategy, Ticker, TickerArrays, Signals, Broker
+import numpy as np
 
-class StrategyImpl(Strategy):
+log = logging.getLogger(__name__)
+
+class StrategyImpl(VectorizedStrategy):
     '''
       A strategy to backtest the average buy price when using constant DCA quota
     '''
@@ -10,5 +14,10 @@ class StrategyImpl(Strategy):
     def tick(self, ticker: Ticker, broker: Broker):
         c = ticker.close
         buy_qty = self._dca_base_quota / c[-1]
-        print(f"{ticker.timestamp} buy {buy_qty}")
+        log.debug("%s buy %s", ticker.timestamp, buy_qty)
         broker.buy(buy_qty)
+
+    def signals(self, bars: TickerArrays) -> Signals:
+        c = bars.close
+        buy_qty = self._dca_base_quota / c
+        return Signals(buy=buy_qty, sell=np.zeros_like(c))
@@ -1,6 +1,10 @@
-from lib.bots.interfaces import Strategy, Ticker, Broker
+import logging
+from lib.bots.interfaces import VectorizedStrategy, Ticker, TickerArrays, Signals, Broker
+import numpy as np
 
-class StrategyImpl(Strategy):
+log = logging.getLogger(__name__)
+
+class StrategyImpl(VectorizedStrategy):
     '''
       A strategy to backtest the average buy price when using quota factor for DCA
       based on level ratio
@@ -13,5 +17,11 @@ class StrategyImpl(Strategy):
         c = ticker.close
         quota_mult = min(1, self._base_price / c[-1])
         buy_qty = self._dca_base_quota * quota_mult /  c[-1]
-        print(f"{ticker.timestamp} buy {buy_qty}  mult={quota_mult:.2f}")
+        log.debug("%s buy %s  mult=%.2f", ticker.timestamp, buy_qty, quota_mult)
         broker.buy(buy_qty)
+
+    def signals(self, bars: TickerArrays) -> Signals:
+        c = bars.close
+        quota_mult = np.minimum(1, self._base_price / c)
+        buy_qty = self._dca_base_quota * quota_mult / c
+        return Signals(buy=buy_qty, sell=np.zeros_like(c))
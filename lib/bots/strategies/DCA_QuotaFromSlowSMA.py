@@ -1,7 +1,12 @@
-from lib.bots.interfaces import Strategy, Ticker, Broker
+import logging
+from lib.bots.interfaces import VectorizedStrategy, Ticker, TickerArrays, Signals, Broker
+from math import isnan
+import numpy as np
 import talib
 
-class StrategyImpl(Strategy):
+log = logging.getLogger(__name__)
+
+class StrategyImpl(VectorizedStrategy):
     '''
       A strategy to backtest the period of MA from which the quota factor for DCA is derived
       quota_factor = MA(close, period) / close 
@@ -12,16 +17,26 @@ class StrategyImpl(Strategy):
         print(f"Strategy: using DCA base quota : {self._dca_base_quota}  and MA period : {self._ma_period}")
 
     def tick(self, ticker: Ticker, broker: Broker):
-        c = ticker.close
+        c = ticker.market_price
         
         quota_mult = 1
 
         # quota calculation
-        if len(c) >= self._ma_period:
-            ma = talib.SMA(c, self._ma_period)
-            quota_mult = ma[-1] / c[-1]
+        ma = ticker.indicators.sma(self._ma_period).value
+        if not isnan(ma):
+            quota_mult = ma / c
 
-        buy_qty = self._dca_base_quota * quota_mult /  c[-1]
+        buy_qty = self._dca_base_quota * quota_mult /  c
 
-        print(f"{ticker.timestamp} buy {buy_qty}  mult={round(quota_mult,2)}")
+        log.debug("%s buy %s  mult=%s", ticker.timestamp, buy_qty, round(quota_mult,2))
         broker.buy(buy_qty)
+
+    def signals(self, bars: TickerArrays) -> Signals:
+        c = bars.close
+        has_ma = np.arange(len(c)) >= self._ma_period - 1
+        quota_mult = np.ones_like(c)
+        if has_ma.any():
+            ma = talib.SMA(c, self._ma_period)
+            quota_mult[has_ma] = ma[has_ma] / c[has_ma]
+        buy_qty = self._dca_base_quota * quota_mult / c
+        return Signals(buy=buy_qty, sell=np.zeros_like(c))
@@ -1,7 +1,12 @@
-from lib.bots.interfaces import Strategy, Ticker, Broker
+import logging
+from lib.bots.interfaces import VectorizedStrategy, Ticker, TickerArrays, Signals, Broker
+from math import isnan
+import numpy as np
 import talib
 
-class StrategyImpl(Strategy):
+log = logging.getLogger(__name__)
+
+class StrategyImpl(VectorizedStrategy):
     '''
       A strategy to backtest the period of MA from which the quota factor for DCA is derived
 
@@ -16,26 +21,47 @@ class StrategyImpl(Strategy):
         print(f"Strategy: using DCA base quota : {self._dca_base_quota},  quota factor MA len : {self._quota_factor_ma_length}, overprice_filter MA len : {self._overprice_filter_ma_length}")
 
     def tick(self, ticker: Ticker, broker: Broker):
-        c = ticker.close
+        c = ticker.market_price
 
         quota_mult = 1
 
 
         # quota calculation
-        if len(c) >= self._quota_factor_ma_length:
-            ma = talib.SMA(c, self._quota_factor_ma_length)
-            quota_mult = ma[-1] / c[-1]
+        ma = ticker.indicators.sma(self._quota_factor_ma_length).value
+        if not isnan(ma):
+            quota_mult = ma / c
 
         # filtering
-        if len(c) >= self._overprice_filter_ma_length:
-            ma = talib.SMA(c, self._overprice_filter_ma_length)
-            if c[-1] > ma[-1]:
+        ma = ticker.indicators.sma(self._overprice_filter_ma_length).value
+        if not isnan(ma):
+            if c > ma:
                 return
         else:
             return
 
 
-        buy_qty = self._dca_base_quota * quota_mult /  c[-1]
+        buy_qty = self._dca_base_quota * quota_mult /  c
 
-        print(f"{ticker.timestamp} buy {buy_qty}  mult={round(quota_mult,2)}")
+        log.debug("%s buy %s  mult=%s", ticker.timestamp, buy_qty, round(quota_mult,2))
         broker.buy(buy_qty)
+
+    def signals(self, bars: TickerArrays) -> Signals:
+        c = bars.close
+        i = np.arange(len(c))
+
+        # quota calculation
+        has_quota_ma = i >= self._quota_factor_ma_length - 1
+        quota_mult = np.ones_like(c)
+        if has_quota_ma.any():
+            ma = talib.SMA(c, self._quota_factor_ma_length)
+            quota_mult[has_quota_ma] = ma[has_quota_ma] / c[has_quota_ma]
+
+        # filtering
+        has_filter_ma = i >= self._overprice_filter_ma_length - 1
+        passes_filter = np.zeros(len(c), dtype=bool)
+        if has_filter_ma.any():
+            ma = talib.SMA(c, self._overprice_filter_ma_length)
+            passes_filter[has_filter_ma] = c[has_filter_ma] <= ma[has_filter_ma]
+
+        buy_qty = np.where(passes_filter, self._dca_base_quota * quota_mult / c, 0)
+        return Signals(buy=buy_qty, sell=np.zeros_like(c))
@@ -1,6 +1,7 @@
+import logging
 from lib.bots.interfaces import Strategy, Ticker, Broker
-from lib.common import ta
-import talib
+
+log = logging.getLogger(__name__)
 
 class StrategyImpl(Strategy):
     '''
@@ -12,18 +13,18 @@ class StrategyImpl(Strategy):
         print(f"Strategy: using DCA quota {self._quota} remove percent: {self._remove_percent}")
 
     def tick(self, ticker: Ticker, broker: Broker):
-        c = ticker.close
-        macd, macdsignal, macdhist = talib.MACD(c, fastperiod=12, slowperiod=26, signalperiod=9)
+        c = ticker.market_price
+        macd = ticker.indicators.macd(fastperiod=12, slowperiod=26, signalperiod=9)
 
         pnl = broker.pnl
 
-        sell = macd[-1] > 0 and ta.crossunder(macd, macdsignal) and pnl and pnl.unrealized_pnl_percent > 5
+        sell = macd.value > 0 and ticker.indicators.cross(macd.macd, macd.signal).under and pnl and pnl.unrealized_pnl_percent > 5
 
         if sell:
             sell_qty = broker.account_size_token * self._remove_percent/100
-            print(f"{ticker.timestamp} sell {sell_qty}")
+            log.debug("%s sell %s", ticker.timestamp, sell_qty)
             broker.sell(sell_qty)
         else:
-            buy_qty = self._quota / c[-1]
-            print(f"{ticker.timestamp} buy {buy_qty}")
+            buy_qty = self._quota / c
+            log.debug("%s buy %s", ticker.timestamp, buy_qty)
             broker.buy(buy_qty)
@@ -1,7 +1,8 @@
+import logging
 from lib.bots.interfaces import Strategy, Ticker, Broker
-from lib.common import ta
 from lib.common import position_size
-import talib
+
+log = logging.getLogger(__name__)
 
 class StrategyImpl(Strategy):
     def __init__(self, args: dict={}):
@@ -11,63 +12,52 @@ class StrategyImpl(Strategy):
         self._short_enabled = True
 
     def tick(self, ticker: Ticker, broker: Broker):
-        c = ticker.close
-        o = ticker.open
-        h = ticker.high
-        l = ticker.low
-        v = ticker.volume
+        ind = ticker.indicators
+        c = ticker.market_price
         
-        ma1 = talib.SMA(c, 5)
-        ma2 = talib.SMA(c, 20)
+        ma1 = ind.sma(5)
+        ma2 = ind.sma(20)
 
-        mid = ta.hlc3(h, l, c)
+        mid = ind.hlc3().value
 
-        buy = ta.crossover(ma1,ma2)
-        sell = ta.crossunder(ma1,ma2)
+        buy = ind.cross(ma1,ma2).over
+        sell = ind.cross(ma1,ma2).under
 
         atrmult = 1.5
-        atr = talib.ATR(h, l, c, timeperiod=14)*atrmult
+        atr = ind.atr(14).value*atrmult
         atr_l = mid - atr
         atr_h = mid + atr
 
        
         if self._position > 0:
-            if c[-1] < self._stop or sell:
-                print(ticker.timestamp)
-                print(">> long TP")
+            if c < self._stop or sell:
+                log.debug("%s >> long TP", ticker.timestamp)
                 broker.sell(self._position)
                 self._position = 0
-                print("")
             else:
-                self._stop = max(self._stop, atr_l[-1])
+                self._stop = max(self._stop, atr_l)
 
         if self._position < 0:
-            if c[-1] > self._stop or buy:
-                print(ticker.timestamp)
-                print(">> short TP")
+            if c > self._stop or buy:
+                log.debug("%s >> short TP", ticker.timestamp)
                 broker.buy(-self._position)
                 self._position = 0
-                print("")
             else:
-                self._stop = min(self._stop, atr_h[-1])
+                self._stop = min(self._stop, atr_h)
 
         if self._position == 0:
             if buy and self._long_enabled:
-                print(ticker.timestamp)
-                pos_size =  position_size.calculate_position_size(broker.account_size_usd, c[-1], atr_l[-1], self._risk)
-                pos_size = min( broker.account_size_usd / c[-1], pos_size)
-                print(">> long ENTER")
+                pos_size =  position_size.calculate_position_size(broker.account_size_usd, c, atr_l, self._risk)
+                pos_size = min( broker.account_size_usd / c, pos_size)
+                log.debug("%s >> long ENTER", ticker.timestamp)
                 value,qty = broker.buy(pos_size)
                 self._position = qty
-                self._stop = atr_l[-1]
-                print("")
+                self._stop = atr_l
             if sell and self._short_enabled:
-                print(ticker.timestamp)
-                pos_size =  position_size.calculate_position_size(broker.account_size_usd, c[-1], atr_h[-1], self._risk)
-                pos_size = min( broker.account_size_usd / c[-1], pos_size)
-                print(">> short ENTER")
+                pos_size =  position_size.calculate_position_size(broker.account_size_usd, c, atr_h, self._risk)
+                pos_size = min( broker.account_size_usd / c, pos_size)
+                log.debug("%s >> short ENTER", ticker.timestamp)
                 value,qty = broker.sell(pos_size)
                 self._position = -qty
-                self._stop = atr_h[-1]
-                print("")
+                self._stop = atr_h
 
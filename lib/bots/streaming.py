@@ -0,0 +1,320 @@
+'''
+Streaming market data for live bots.
+A kline feed delivers candle updates as they happen, TickerStreaming keeps the recent bars in a ring buffer and
+StreamingConductor ticks the strategy as soon as a bar closes. Binance klines come over a websocket, so in steady
+state there are no REST requests at all: only the initial history and the bars missed while reconnecting are
+downloaded. ReplayKlineFeed plays back recorded candles instead, e.g. in tests
+'''
+import asyncio, json
+from abc import abstractmethod
+from typing import AsyncIterator, Iterable, List, NamedTuple, Tuple
+
+from lib.common import rate_limiter
+from lib.common.convert import timeframe_to_interval_ms
+from lib.common.streaming_ta import Bar, IndicatorBank
+from lib.common.id_map_binance import id_to_binance
+from lib.common.msg import warn
+from lib.trader.async_api import to_async
+from lib.bots.interfaces import Broker, Ticker, TickerArrays, Strategy, Conductor
+import pandas as pd
+import numpy as np
+
+BINANCE_WS_URI = "wss://stream.binance.com:9443/ws"
+# number of bars kept by TickerStreaming, same as the history downloaded by TickerLive
+DEFAULT_CAPACITY = 500
+
+
+class KlineEvent(NamedTuple):
+    timestamp:  int     # bar open time, ms
+    open:       float
+    high:       float
+    low:        float
+    close:      float
+    volume:     float
+    closed:     bool    # False while the bar is still forming
+
+    @classmethod
+    def from_candle(cls, candle: dict, closed: bool = True):
+        return cls(int(candle['timestamp']), float(candle['open']), float(candle['high']), float(candle['low']), float(candle['close']), float(candle['volume']), closed)
+
+
+class OHLCVRingBuffer:
+    '''
+    the last capacity bars in preallocated arrays. append() is O(1) and arrays returns read-only views in
+    chronological order without copying: every value is written twice, capacity apart, so the last capacity bars
+    are always contiguous
+    '''
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._columns = {name: np.zeros(2 * capacity, dtype=np.double) for name in ('open', 'high', 'low', 'close', 'volume')}
+        self._columns['timestamp'] = np.zeros(2 * capacity, dtype='datetime64[ms]')
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def append(self, event: KlineEvent):
+        for name, column in self._columns.items():
+            value = np.datetime64(event.timestamp, 'ms') if name == 'timestamp' else getattr(event, name)
+            column[self._next] = value
+            column[self._next + self._capacity] = value
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+    @property
+    def arrays(self) -> TickerArrays:
+        end = self._next + self._capacity
+        def view(name: str) -> np.ndarray:
+            a = self._columns[name][end - self._size:end]
+            a.flags.writeable = False
+            return a
+        return TickerArrays(*[view(name) for name in TickerArrays._fields])
+
+    @property
+    def last_timestamp(self) -> int:
+        '''
+        open time of the newest bar in ms, None if empty
+        '''
+        if self._size == 0:
+            return None
+        return int(self._columns['timestamp'][self._next + self._capacity - 1].astype(np.int64))
+
+
+class KlineFeed:
+    @abstractmethod
+    def events(self) -> AsyncIterator[KlineEvent]:
+        """async iterator of candle updates, ends only if the feed does"""
+
+
+class ReplayKlineFeed(KlineFeed):
+    '''
+    plays back given events, optionally delay_s apart
+    '''
+    def __init__(self, events: Iterable[KlineEvent], delay_s: float = 0.):
+        self._events = list(events)
+        self._delay_s = delay_s
+
+    @classmethod
+    def from_candles(cls, candles: List[dict], delay_s: float = 0.):
+        return cls([KlineEvent.from_candle(c) for c in candles], delay_s)
+
+    async def events(self) -> AsyncIterator[KlineEvent]:
+        for event in self._events:
+            if self._delay_s:
+                await asyncio.sleep(self._delay_s)
+            yield event
+
+
+class BinanceKlineFeed(KlineFeed):
+    '''
+    Binance kline stream of a market, reconnects with backoff when the connection drops.
+    Binance pushes an update of the forming bar about every two seconds and a final one when it closes
+    '''
+    def __init__(self, market: str, timeframe: str, uri: str = None):
+        self._uri = uri or f"{BINANCE_WS_URI}/{id_to_binance[market].lower()}@kline_{timeframe}"
+
+    @staticmethod
+    def parse_message(message: str) -> KlineEvent:
+        '''
+        kline event of a stream message, None for other messages
+        '''
+        data = json.loads(message)
+        k = data.get('k') if isinstance(data, dict) else None
+        if k is None:
+            return None
+        return KlineEvent(int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']), bool(k['x']))
+
+    async def events(self) -> AsyncIterator[KlineEvent]:
+        import websockets
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self._uri) as ws:
+                    attempt = 0
+                    async for message in ws:
+                        event = self.parse_message(message)
+                        if event is not None:
+                            yield event
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                delay = rate_limiter.backoff_delay(attempt)
+                warn(f"kline stream disconnected ({e}), reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+class TickerStreaming(Ticker):
+    '''
+     Ticker using candlestick data pushed by a kline feed.
+     Bars come from the ring buffer and indicators are fed one closed bar at a time. market_price follows the
+     forming bar, so it is also a realtime price between bar closes
+    '''
+    def __init__(self, market: str, timeframe: str, capacity: int = DEFAULT_CAPACITY, api=None):
+        '''
+        api: REST client used for the initial history and to fill gaps, binance_api.Binance() by default
+        '''
+        self._market = market
+        self._timeframe = timeframe
+        self._interval_ms = timeframe_to_interval_ms[timeframe]
+        self._bars = OHLCVRingBuffer(capacity)
+        self._indicators = IndicatorBank()
+        self._market_price = None
+        self._api = api
+
+    def _get_api(self):
+        if self._api is None:
+            from lib.trader import binance_api
+            self._api = binance_api.Binance()
+        return self._api
+
+    @property
+    def timeframe(self) -> str:
+        return self._timeframe
+
+    def _append(self, candles: List[dict]):
+        for candle in candles:
+            event = KlineEvent.from_candle(candle)
+            last = self._bars.last_timestamp
+            if last is not None and event.timestamp <= last:
+                continue
+            self._bars.append(event)
+            self._indicators.feed(Bar(event.open, event.high, event.low, event.close, event.volume))
+            self._market_price = event.close
+
+    def _fetch_history(self) -> List[dict]:
+        return self._get_api().get_candles_by_limit(id_to_binance[self._market], self._timeframe, limit=self._bars.capacity + 1)
+
+    def _fetch_range(self, ts_start: int, ts_end: int) -> List[dict]:
+        return self._get_api().get_candles_by_range_ms(id_to_binance[self._market], self._timeframe, ts_start, ts_end)
+
+    def _load_history(self, candles: List[dict], before_ms: int):
+        if before_ms is None:
+            # last candle is the one just opened (partial)
+            candles = candles[:-1]
+        else:
+            candles = [c for c in candles if KlineEvent.from_candle(c).timestamp < before_ms]
+        self._bars.clear()
+        self._indicators.reset()
+        self._append(candles)
+
+    def bootstrap(self, before_ms: int = None):
+        '''
+        loads the recent closed bars over REST, called once before streaming starts.
+        before_ms: open time of the first streamed bar, bars from it on are left to the stream, so that its close
+        is not taken for a repeat. Without it, the last bar returned is taken as the one just opened
+        '''
+        self._load_history(self._fetch_history(), before_ms)
+
+    async def bootstrap_async(self, before_ms: int = None):
+        '''
+        bootstrap with the REST request on a request thread, the event loop keeps serving the stream meanwhile
+        '''
+        self._load_history(await to_async(self._fetch_history)(), before_ms)
+
+    def _gap(self, event: KlineEvent) -> Tuple[int, int]:
+        '''
+        open times of the first and last bar closed while disconnected, None without a gap
+        '''
+        last = self._bars.last_timestamp
+        if event.closed and last is not None and event.timestamp > last + self._interval_ms:
+            return last + self._interval_ms, event.timestamp - self._interval_ms
+        return None
+
+    def _close(self, event: KlineEvent) -> bool:
+        self._market_price = event.close
+        if not event.closed:
+            return False
+        last = self._bars.last_timestamp
+        if last is not None and event.timestamp <= last:
+            # repeated after a reconnect
+            return False
+        self._append([event._asdict()])
+        return True
+
+    def on_kline(self, event: KlineEvent) -> bool:
+        '''
+        consumes a feed event, returns True if it closed a new bar. Bars closed while disconnected are loaded first
+        '''
+        gap = self._gap(event)
+        if gap is not None:
+            self._append(self._fetch_range(*gap))
+        return self._close(event)
+
+    async def on_kline_async(self, event: KlineEvent) -> bool:
+        '''
+        on_kline with the gap backfill on a request thread
+        '''
+        gap = self._gap(event)
+        if gap is not None:
+            self._append(await to_async(self._fetch_range)(*gap))
+        return self._close(event)
+
+    @property
+    def arrays(self) -> TickerArrays:
+        return self._bars.arrays
+
+    @property
+    def indicators(self) -> IndicatorBank:
+        return self._indicators
+
+    @property
+    def market_price(self) -> float:
+        return self._market_price
+
+    @property
+    def timestamp(self) -> pd.DatetimeIndex:
+        return pd.Timestamp(self._bars.last_timestamp, unit='ms')
+
+    @property
+    def open(self):
+        return self._bars.arrays.open
+
+    @property
+    def close(self):
+        return self._bars.arrays.close
+
+    @property
+    def high(self):
+        return self._bars.arrays.high
+
+    @property
+    def low(self):
+        return self._bars.arrays.low
+
+    @property
+    def volume(self):
+        return self._bars.arrays.volume
+
+
+class StreamingConductor(Conductor):
+    '''
+     Ticks the strategy on every bar close pushed by the feed, replaces LiveConductor.
+     With realtime on it ticks on every update of the forming bar as well, replacing RealtimeConductor polling
+    '''
+    def __init__(self, strategy: Strategy, ticker: TickerStreaming, broker: Broker, feed: KlineFeed, realtime: bool = False):
+        self._ticker = ticker
+        self._broker = broker
+        self._strategy = strategy
+        self._feed = feed
+        self._realtime = realtime
+
+    async def run_async(self):
+        bootstrapped = False
+        async for event in self._feed.events():
+            if not bootstrapped:
+                # history is loaded once the stream is up, so no bar falls in between
+                await self._ticker.bootstrap_async(event.timestamp)
+                bootstrapped = True
+            if await self._ticker.on_kline_async(event) or self._realtime:
+                self._strategy.tick(self._ticker, self._broker)
+
+    def run(self):
+        asyncio.run(self.run_async())
@@ -0,0 +1,188 @@
+import os, io, itertools, contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple
+import numpy as np
+import pandas as pd
+import yaml
+from lib.bots.interfaces import TickerArrays, VectorizedStrategy
+from lib.bots.framework import TickerHistorical, DummyBroker, BrokerAdapterPnL, BacktestingConductor, VectorizedBacktestingConductor, get_strategy_class
+from lib.common import pnl
+
+
+class SweepConfig(NamedTuple):
+    strategy:       str
+    sym:            str
+    tf:             str
+    start:          str
+    end:            str
+    account:        float
+    strategy_args:  Dict[str, list]
+
+
+class SweepResult(NamedTuple):
+    strategy_args:          dict
+    final_equity:           float
+    account_usd:            float
+    account_token:          float
+    break_even_price:       float
+    realized_pnl:           float
+    realized_pnl_percent:   float
+    unrealized_pnl:         float
+    unrealized_pnl_percent: float
+
+
+def load_sweep_config(path: str) -> SweepConfig:
+    '''
+    grid file: backtest parameters plus list of values for each strategy argument,
+    see config/example.sweep.yml
+    '''
+    with open(path, "r") as file:
+        cfg = yaml.safe_load(file)
+    grid = {k: v if isinstance(v, list) else [v] for k, v in (cfg.get("strategy_args") or {}).items()}
+    return SweepConfig(strategy=cfg["strategy"], sym=cfg["sym"], tf=cfg["tf"], start=str(cfg["start"]), end=str(cfg["end"]),
+                       account=float(cfg.get("account", 1000)), strategy_args=grid)
+
+
+def expand_grid(grid: Dict[str, list]) -> List[dict]:
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+class SharedBars:
+    '''
+    bar arrays copied once into a shared memory block, so that pool workers map them instead of unpickling a copy each.
+    layout: timestamp as int64 ms, followed by open, high, low, close, volume as float64, each n items
+    '''
+    _COLUMNS = TickerArrays._fields
+
+    def __init__(self, shm: shared_memory.SharedMemory, n: int):
+        self._shm = shm
+        self._n = n
+
+    @classmethod
+    def create(cls, arrays: TickerArrays):
+        n = len(arrays.close)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8 * len(cls._COLUMNS)))
+        bars = cls(shm, n)
+        for i, column in enumerate(cls._COLUMNS):
+            src = getattr(arrays, column)
+            if column == "timestamp":
+                src = src.astype("datetime64[ms]").view(np.int64)
+            dst = np.ndarray((n,), dtype=src.dtype, buffer=shm.buf, offset=i * n * 8)
+            dst[:] = src
+        return bars
+
+    @classmethod
+    def attach(cls, name: str, n: int):
+        return cls(shared_memory.SharedMemory(name=name), n)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __len__(self) -> int:
+        return self._n
+
+    def arrays(self) -> TickerArrays:
+        columns = []
+        for i, column in enumerate(self._COLUMNS):
+            dtype = np.int64 if column == "timestamp" else np.double
+            a = np.ndarray((self._n,), dtype=dtype, buffer=self._shm.buf, offset=i * self._n * 8)
+            if column == "timestamp":
+                a = a.view("datetime64[ms]")
+            a.flags.writeable = False
+            columns.append(a)
+        return TickerArrays(*columns)
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+_worker_bars: SharedBars = None
+
+
+def _init_worker(shm_name: str, n: int):
+    global _worker_bars
+    _worker_bars = SharedBars.attach(shm_name, n)
+
+
+def run_backtest(strategy: str, strategy_args: dict, arrays: TickerArrays, initial_account: float) -> SweepResult:
+    '''
+    run single backtest over given bars, console output of the strategy and broker is discarded
+    '''
+    ticker = TickerHistorical.from_arrays(arrays)
+    broker = BrokerAdapterPnL(ticker=ticker, broker=DummyBroker(ticker=ticker, initial_account=initial_account), report_each_trade=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        strategy_impl = get_strategy_class(strategy)(dict(strategy_args))
+        if isinstance(strategy_impl, VectorizedStrategy):
+            conductor = VectorizedBacktestingConductor(strategy=strategy_impl, ticker=ticker, broker=broker)
+        else:
+            conductor = BacktestingConductor(strategy=strategy_impl, ticker=ticker, broker=broker)
+        conductor.run()
+
+    last_close = float(arrays.close[-1]) if len(arrays.close) else 0.
+    if broker.orders:
+        pnl_data = broker.pnl_at(last_close)
+    else:
+        pnl_data = pnl.PnL(0, pnl.INVALID_PERCENT, 0, 0, 0, pnl.INVALID_PERCENT)
+    return SweepResult(
+        strategy_args=strategy_args,
+        final_equity=broker.account_size_usd + broker.account_size_token * last_close,
+        account_usd=broker.account_size_usd,
+        account_token=broker.account_size_token,
+        break_even_price=pnl_data.break_even_price,
+        realized_pnl=pnl_data.realized_pnl,
+        realized_pnl_percent=pnl_data.realized_pnl_percent,
+        unrealized_pnl=pnl_data.unrealized_pnl,
+        unrealized_pnl_percent=pnl_data.unrealized_pnl_percent,
+    )
+
+
+def _run_in_worker(strategy: str, strategy_args: dict, initial_account: float) -> SweepResult:
+    return run_backtest(strategy, strategy_args, _worker_bars.arrays(), initial_account)
+
+
+def run_sweep(cfg: SweepConfig, workers: int = None) -> List[SweepResult]:
+    '''
+    load bars once, then backtest every strategy_args combination of the grid in a process pool.
+    results are sorted by final equity, best first
+    '''
+    combinations = expand_grid(cfg.strategy_args)
+    arrays = TickerHistorical(cfg.sym, cfg.tf, cfg.start, cfg.end).arrays
+    workers = min(workers or os.cpu_count() or 1, len(combinations))
+
+    if workers <= 1:
+        results = [run_backtest(cfg.strategy, args, arrays, cfg.account) for args in combinations]
+    else:
+        bars = SharedBars.create(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(bars.name, len(bars))) as pool:
+                futures = [pool.submit(_run_in_worker, cfg.strategy, args, cfg.account) for args in combinations]
+                results = [f.result() for f in futures]
+        finally:
+            bars.close()
+            bars.unlink()
+
+    return sorted(results, key=lambda r: r.final_equity, reverse=True)
+
+
+def results_to_df(results: List[SweepResult]) -> pd.DataFrame:
+    rows = []
+    for r in results:
+        row = dict(r.strategy_args)
+        row.update({
+            'equity': round(r.final_equity, 1),
+            'usd': round(r.account_usd, 1),
+            'token': round(r.account_token, 4),
+            'break_even_price': round(r.break_even_price, 2),
+            'r pnl': round(r.realized_pnl, 1),
+            'r pnl %': round(r.realized_pnl_percent, 1) if r.realized_pnl_percent != pnl.INVALID_PERCENT else pnl.INVALID_PERCENT,
+            'u pnl': round(r.unrealized_pnl, 1),
+            'u pnl %': round(r.unrealized_pnl_percent, 1) if r.unrealized_pnl_percent != pnl.INVALID_PERCENT else pnl.INVALID_PERCENT,
+        })
+        rows.append(row)
+    return pd.DataFrame.from_records(rows)
@@ -1,3 +1,5 @@
+import threading, time
+from typing import Callable, Dict
 from pandas.core.frame import DataFrame
 from ..trader.poloniex_api import Poloniex
 from ..trader.ftx_api import Ftx
@@ -7,6 +9,9 @@ from ..trader.mexc_api import Mexc
 from ..trader.exante_api import Exante
 from kucoin.client import Margin as KucoinMargin
 from ..trader.api_keys_config import ApiKeysConfig
+from ..trader.async_api import run_concurrently
+from .kv_store import KVStore
+from .msg import warn
 
 
 def roundx(x: float):
@@ -56,37 +61,79 @@ def get_exante(api: Exante) -> float:
     return roundx(float(value[0]))
 
 
-def get_available_usd_balances_dca() -> DataFrame:
-    cfg = ApiKeysConfig()
-
-    poloniex_data = get_poloniex(Poloniex(*cfg.get_poloniex_ks()))
-    ftx_data = get_ftx(Ftx(cfg.get_ftx_ks()[0], cfg.get_ftx_ks()[1], cfg.get_ftx_subaccount_dca()))
-    okex_data = get_okex(Okex(*cfg.get_okex_ksp()))
-    kucoin_data = get_kucoin(KucoinMargin(*cfg.get_kucoin_ksp()))
-    mexc_data = get_mexc(Mexc(*cfg.get_mexc_ks()))
-    exante_data = get_exante(Exante(*cfg.get_exante()))
-    df = DataFrame.from_dict(
-        [
-            {
-                'cex_name':                     'FTX',
-                'available_including_borrow':   ftx_data['available_including_borrow'],
-                'borrow':                       ftx_data['borrow'],
-                'available_without_borrow':     ftx_data['available_without_borrow'],
-                'liquid':                       True,
-            },
-            {
-                'cex_name':                     'Kucoin',
-                'available_including_borrow':   kucoin_data['available_including_borrow'],
-                'borrow':                       kucoin_data['borrow'],
-                'available_without_borrow':     kucoin_data['available_without_borrow'],
-                'liquid':                       True,
-            },
-
-            {'cex_name': 'Poloniex',  'available_including_borrow': poloniex_data,      'borrow': 0,    'available_without_borrow': poloniex_data,  'liquid': True,},
-            {'cex_name': 'OKX',       'available_including_borrow': okex_data,          'borrow': 0,    'available_without_borrow': okex_data,      'liquid': True,},
-            {'cex_name': 'MEXC',      'available_including_borrow': mexc_data,          'borrow': 0,    'available_without_borrow': mexc_data,      'liquid': True,},
-            {'cex_name': 'Exante',    'available_including_borrow': exante_data,        'borrow': 0,    'available_without_borrow': exante_data,    'liquid': False,},
-        ]
-    )
-    return df
+# a balance request taking longer is given up, the exchange is reported stale
+BALANCE_TIMEOUT_S = 20
+# balances are fetched once for all parts of a command needing them
+BALANCES_CACHE_TTL_S = 60
 
+_balances: DataFrame = None
+_balances_time = 0.
+_balances_lock = threading.Lock()
+
+
+def _balance_row(cex_name: str, available_including_borrow: float, borrow: float, available_without_borrow: float, liquid: bool) -> dict:
+    return {
+        'cex_name':                     cex_name,
+        'available_including_borrow':   available_including_borrow,
+        'borrow':                       borrow,
+        'available_without_borrow':     available_without_borrow,
+        'liquid':                       liquid,
+    }
+
+
+def _balance_requests(cfg: ApiKeysConfig) -> Dict[str, Callable[[], dict]]:
+    def ftx() -> dict:
+        d = get_ftx(Ftx(cfg.get_ftx_ks()[0], cfg.get_ftx_ks()[1], cfg.get_ftx_subaccount_dca()))
+        return _balance_row('FTX', d['available_including_borrow'], d['borrow'], d['available_without_borrow'], True)
+    def kucoin() -> dict:
+        d = get_kucoin(KucoinMargin(*cfg.get_kucoin_ksp()))
+        return _balance_row('Kucoin', d['available_including_borrow'], d['borrow'], d['available_without_borrow'], True)
+    def poloniex() -> dict:
+        v = get_poloniex(Poloniex(*cfg.get_poloniex_ks()))
+        return _balance_row('Poloniex', v, 0, v, True)
+    def okex() -> dict:
+        v = get_okex(Okex(*cfg.get_okex_ksp()))
+        return _balance_row('OKX', v, 0, v, True)
+    def mexc() -> dict:
+        v = get_mexc(Mexc(*cfg.get_mexc_ks()))
+        return _balance_row('MEXC', v, 0, v, True)
+    def exante() -> dict:
+        v = get_exante(Exante(*cfg.get_exante()))
+        return _balance_row('Exante', v, 0, v, False)
+    return {'FTX': ftx, 'Kucoin': kucoin, 'Poloniex': poloniex, 'OKX': okex, 'MEXC': mexc, 'Exante': exante}
+
+
+def _collect_balances(requests: Dict[str, Callable[[], dict]], timeout_s: float) -> DataFrame:
+    '''
+    runs balance requests concurrently. An exchange that fails or times out is reported with its last known balance,
+    or zero if there is none, marked stale
+    '''
+    results = run_concurrently(requests, timeout_s=timeout_s)
+    last_known = KVStore("cex_balances")
+    fresh = {name: row for name, row in results.items() if not isinstance(row, Exception)}
+    if fresh:
+        last_known.set_many(fresh)
+    rows = []
+    for name, row in results.items():
+        if isinstance(row, Exception):
+            e = row
+            row = last_known.get(name)
+            warn(f"{name} balance unavailable, {'using last known' if row is not None else 'assuming 0'}: {e!r}")
+            row = dict(row if row is not None else _balance_row(name, 0, 0, 0, True), stale=True)
+        else:
+            row = dict(row, stale=False)
+        rows.append(row)
+    return DataFrame.from_dict(rows)
+
+
+def get_available_usd_balances_dca(refresh: bool = False) -> DataFrame:
+    '''
+    USD balances of all exchanges, requested concurrently and reused for BALANCES_CACHE_TTL_S.
+    Column stale marks exchanges that did not respond, see _collect_balances
+    '''
+    global _balances, _balances_time
+    with _balances_lock:
+        if refresh or _balances is None or time.monotonic() - _balances_time > BALANCES_CACHE_TTL_S:
+            _balances = _collect_balances(_balance_requests(ApiKeysConfig()), BALANCE_TIMEOUT_S)
+            _balances_time = time.monotonic()
+        return _balances.copy()
@@ -0,0 +1,201 @@
+'''
+Columnar bar storage: a directory per data set, one .npy file per column.
+Columns are memory-mapped read-only on load, so no parsing happens and only touched pages are read.
+'''
+import os, json, shutil, pathlib, datetime
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+
+_MANIFEST = "columns.json"
+_META = "meta.json"
+
+
+def save_columns(path: str, columns: Dict[str, np.ndarray], meta: dict = None):
+    '''
+    write columns and optional meta data to directory path, replacing previous content.
+    the manifest is written last, a directory without it is treated as missing
+    '''
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    pathlib.Path(tmp_path).mkdir(parents=True)
+    for name, a in columns.items():
+        np.save(f"{tmp_path}/{name}.npy", np.ascontiguousarray(a), allow_pickle=False)
+    if meta is not None:
+        with open(f"{tmp_path}/{_META}", "w") as f:
+            json.dump(meta, f)
+    with open(f"{tmp_path}/{_MANIFEST}", "w") as f:
+        json.dump(list(columns.keys()), f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_columns(path: str) -> Optional[Dict[str, np.ndarray]]:
+    '''
+    memory-mapped read-only columns stored in directory path, None if there are none
+    '''
+    manifest = f"{path}/{_MANIFEST}"
+    if not os.path.exists(manifest):
+        return None
+    with open(manifest) as f:
+        names: List[str] = json.load(f)
+    return {name: np.load(f"{path}/{name}.npy", mmap_mode="r", allow_pickle=False).view(np.ndarray) for name in names}
+
+
+def load_meta(path: str) -> dict:
+    meta = f"{path}/{_META}"
+    if not os.path.exists(meta):
+        return {}
+    with open(meta) as f:
+        return json.load(f)
+
+
+def df_to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    '''
+    numeric columns of df, plus its DatetimeIndex as timestamp column. Other columns are not stored
+    '''
+    columns = {}
+    if isinstance(df.index, pd.DatetimeIndex):
+        columns["timestamp"] = df.index.values.astype("datetime64[ms]")
+    for name in df.columns:
+        if pd.api.types.is_numeric_dtype(df[name]) and not pd.api.types.is_bool_dtype(df[name]):
+            columns[str(name)] = df[name].to_numpy(dtype=np.double)
+        elif pd.api.types.is_datetime64_any_dtype(df[name]):
+            columns[str(name)] = df[name].to_numpy().astype("datetime64[ms]")
+    return columns
+
+
+def columns_to_df(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    '''
+    DataFrame indexed by timestamp column, if there is one. Data is copied, the result may be modified
+    '''
+    data = {name: np.array(a) for name, a in columns.items() if name != "timestamp"}
+    if "timestamp" in columns:
+        return pd.DataFrame(data, index=pd.DatetimeIndex(np.array(columns["timestamp"]), name="timestamp"))
+    return pd.DataFrame(data)
+
+
+def _ts_ms(a: np.ndarray) -> np.ndarray:
+    return a.astype("datetime64[ms]", copy=False).view(np.int64)
+
+
+def _subtract_ranges(ranges: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    '''
+    parts of [start, end) not covered by sorted, disjoint ranges
+    '''
+    gaps = []
+    for a, b in ranges:
+        if b <= start:
+            continue
+        if a >= end:
+            break
+        if a > start:
+            gaps.append((start, a))
+        start = max(start, b)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+def _add_range(ranges: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    '''
+    union of sorted, disjoint ranges with [start, end), touching ranges are joined
+    '''
+    result = []
+    for a, b in sorted(ranges + [(start, end)]):
+        if result and a <= result[-1][1]:
+            result[-1] = (result[-1][0], max(result[-1][1], b))
+        else:
+            result.append((a, b))
+    return result
+
+
+def merge_columns(older: Optional[Dict[str, np.ndarray]], newer: Dict[str, np.ndarray], key: str = "timestamp") -> Dict[str, np.ndarray]:
+    '''
+    rows of both, sorted by key column. For equal keys the row of newer is kept
+    '''
+    if not older:
+        combined = {name: np.asarray(a) for name, a in newer.items()}
+    else:
+        combined = {name: np.concatenate([older[name], newer[name]]) for name in newer.keys()}
+    keys = combined[key]
+    # unique over the reversed keys picks the last occurrence, which is the one from newer
+    _, idx_reversed = np.unique(keys[::-1], return_index=True)
+    idx = len(keys) - 1 - idx_reversed
+    return {name: a[idx] for name, a in combined.items()}
+
+
+class CandleStore:
+    '''
+    Append-only bars of one symbol and timeframe, in a columnar store directory.
+    The store remembers which time ranges it has fetched, so that only the gaps of a requested range
+    go to the provider. Only closed bars are persisted, bars still forming are fetched again on next request.
+    '''
+    def __init__(self, path: str, interval_ms: int, fetch: Callable[[int, int], Dict[str, np.ndarray]], key: str = "timestamp"):
+        '''
+        fetch(ts_first, ts_last) returns columns of the bars opened between given ms timestamps, both inclusive
+        '''
+        self._path = path
+        self._interval_ms = interval_ms
+        self._fetch = fetch
+        self._key = key
+
+    def _load(self) -> Tuple[Optional[Dict[str, np.ndarray]], List[Tuple[int, int]]]:
+        columns = load_columns(self._path)
+        if columns is None:
+            return None, []
+        return columns, [tuple(r) for r in load_meta(self._path).get("ranges", [])]
+
+    def _save(self, columns: Dict[str, np.ndarray], ranges: List[Tuple[int, int]]):
+        save_columns(self._path, columns, {"ranges": [list(r) for r in ranges]})
+
+    def _first_open_bar_ms(self) -> int:
+        now_ms = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000)
+        return now_ms - now_ms % self._interval_ms
+
+    @property
+    def ranges(self) -> List[Tuple[int, int]]:
+        return self._load()[1]
+
+    def add(self, columns: Dict[str, np.ndarray], ts_start: int, ts_end: int):
+        '''
+        store bars known to be all bars of [ts_start, ts_end)
+        '''
+        stored, ranges = self._load()
+        open_from = self._first_open_bar_ms()
+        closed = _ts_ms(columns[self._key]) < open_from
+        ts_end = min(ts_end, open_from)
+        if ts_start < ts_end:
+            ranges = _add_range(ranges, ts_start, ts_end)
+        self._save(merge_columns(stored, {name: a[closed] for name, a in columns.items()}, self._key), ranges)
+
+    def get(self, ts_first: int, ts_last: int) -> Dict[str, np.ndarray]:
+        '''
+        bars opened between given ms timestamps, both inclusive. Missing parts are fetched first.
+        Returned arrays are read-only views of the memory-mapped store, unless bars still forming are included
+        '''
+        stored, ranges = self._load()
+        gaps = _subtract_ranges(ranges, ts_first, ts_last + 1)
+        forming = None
+        if gaps:
+            open_from = self._first_open_bar_ms()
+            fetched = None
+            for a, b in gaps:
+                fetched = merge_columns(fetched, self._fetch(a, b - 1), self._key)
+                if a < min(b, open_from):
+                    ranges = _add_range(ranges, a, min(b, open_from))
+            ts = _ts_ms(fetched[self._key])
+            closed = ts < open_from
+            if not closed.all():
+                forming = {name: a[~closed] for name, a in fetched.items()}
+            self._save(merge_columns(stored, {name: a[closed] for name, a in fetched.items()}, self._key), ranges)
+            stored = load_columns(self._path)
+
+        ts = _ts_ms(stored[self._key])
+        i0, i1 = np.searchsorted(ts, [ts_first, ts_last + 1])
+        columns = {name: a[i0:i1] for name, a in stored.items()}
+        if forming is not None:
+            columns = {name: np.concatenate([a, forming[name]]) for name, a in columns.items()}
+            for a in columns.values():
+                a.flags.writeable = False
+        return columns
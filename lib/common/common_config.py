@@ -0,0 +1,18 @@
+import os, threading, yaml
+
+_config = None
+_lock = threading.Lock()
+
+
+def get_common_config() -> dict:
+    '''
+    config/common.yml, read once per process. Empty if there is none, see config/example.common.yml
+    '''
+    global _config
+    with _lock:
+        if _config is None:
+            _config = {}
+            if os.path.exists("config/common.yml"):
+                with open("config/common.yml", "r") as f:
+                    _config = yaml.safe_load(f) or {}
+        return _config
@@ -1,17 +1,16 @@
-import os, pathlib, pycoingecko, yahoo_fin.stock_info, pickledb
+import threading
+from collections.abc import Mapping
+from lib.common.kv_store import KVStore
 
 
 class CryptoNameDb:
     def __init__(self):
-        is_uninitialized = not os.path.exists("cache/cg/names.db")
-        pathlib.Path("cache/cg").mkdir(parents=True, exist_ok=True)
-        self.db = pickledb.load("cache/cg/names.db", auto_dump=False)
-        if is_uninitialized:
+        self.db = KVStore("cg_names", legacy_json="cache/cg/names.db")
+        if len(self.db) == 0:
+            import pycoingecko
             cg = pycoingecko.CoinGeckoAPI()
             coins_list = cg.get_coins_list()
-            for entry in coins_list:
-                self.db.set(entry['id'], {'name': entry['name'],'sym': entry['symbol'].upper() })
-            self.db.dump()
+            self.db.set_many({entry['id']: {'name': entry['name'],'sym': entry['symbol'].upper() } for entry in coins_list})
 
     def get_name(self, ticker: str) -> str:
         entry = self.db.get(ticker)
@@ -22,52 +21,85 @@ class CryptoNameDb:
         return entry['sym'] if entry else None
 
     def get_id_to_ticker_map(self) -> dict:
-        m = {}
-        all_ids = self.db.getall()
-        for k in all_ids:
-            m[k] = self.get_sym(k)
-        return m
+        return {k: v['sym'] for k,v in self.db.items()}
 
 
 class StockNameDb:
     def __init__(self):
-        pathlib.Path("cache/yf").mkdir(parents=True, exist_ok=True)
-        self.db = pickledb.load("cache/yf/names.db", auto_dump=True)
+        self.db = KVStore("yf_names", legacy_json="cache/yf/names.db")
     def get_name(self, ticker: str) -> str:
         existing_name = self.db.get(ticker)
         if existing_name:
             return existing_name
         else:
             try:
+                import yahoo_fin.stock_info
                 name = yahoo_fin.stock_info.get_quote_data(ticker)["longName"]
             except:
                 name = ticker
             self.db.set(ticker, name)
             return name
 
-_crypto_name_db = CryptoNameDb()
-_stock_name_db = StockNameDb()
+# name databases are opened on first lookup, not on import
+_crypto_name_db = None
+_stock_name_db = None
+_name_db_lock = threading.Lock()
+
+def _get_crypto_name_db() -> CryptoNameDb:
+    global _crypto_name_db
+    with _name_db_lock:
+        if _crypto_name_db is None:
+            _crypto_name_db = CryptoNameDb()
+        return _crypto_name_db
+
+def _get_stock_name_db() -> StockNameDb:
+    global _stock_name_db
+    with _name_db_lock:
+        if _stock_name_db is None:
+            _stock_name_db = StockNameDb()
+        return _stock_name_db
 
 
 # DEPRECATED, use get_id_sym
-class TickerDict (dict):
-    # if id is not listed below its ticker is assumed to be equal to id
-    def __missing__(self,k):
-        return k
-id_to_ticker = TickerDict(_crypto_name_db.get_id_to_ticker_map())
+class TickerDict (Mapping):
+    '''
+    id to ticker map of all known coins, loaded on first access.
+    if id is not listed its ticker is assumed to be equal to id
+    '''
+    def __init__(self):
+        self._map = None
+
+    def _get_map(self) -> dict:
+        if self._map is None:
+            self._map = _get_crypto_name_db().get_id_to_ticker_map()
+        return self._map
+
+    def __getitem__(self, k):
+        return self._get_map().get(k, k)
+
+    def __contains__(self, k):
+        return k in self._get_map()
+
+    def __iter__(self):
+        return iter(self._get_map())
+
+    def __len__(self):
+        return len(self._get_map())
+
+id_to_ticker = TickerDict()
 
 
 
 def get_id_sym(asset_id: str) -> str:
-    sym = _crypto_name_db.get_sym(asset_id)
+    sym = _get_crypto_name_db().get_sym(asset_id)
     if sym is None:
         sym = asset_id
     return sym
 
 def get_id_name(asset_id: str) -> str:
-    name = _crypto_name_db.get_name(asset_id)
+    name = _get_crypto_name_db().get_name(asset_id)
     if name is None:
-        name = _stock_name_db.get_name(asset_id)
+        name = _get_stock_name_db().get_name(asset_id)
     return name
 
 def get_id_name_shorter(asset_id: str) -> str:
@@ -0,0 +1,121 @@
+'''
+Key-value cache tables in a shared SQLite database.
+The database is in WAL mode, so readers don't block the writer and several processes can use it at once.
+Values are stored JSON encoded, entries may expire
+'''
+import os, json, time, sqlite3, threading, pathlib, re
+from typing import Any, Dict, Iterable, List, Tuple
+
+DEFAULT_PATH = "cache/cache.sqlite"
+# wait this long for a write lock held by another process
+BUSY_TIMEOUT_S = 30
+
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+
+def _get_connection(path: str) -> Tuple[sqlite3.Connection, threading.Lock]:
+    '''
+    one connection per database file and process, shared by all tables and threads
+    '''
+    with _connections_lock:
+        if path not in _connections:
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            _connections[path] = (con, threading.Lock())
+        return _connections[path]
+
+
+class KVStore:
+    '''
+    a named table of the cache database. get() of a missing or expired key returns None.
+    Writes of many entries should go through set_many(), which commits them in one transaction
+    '''
+    def __init__(self, table: str, path: str = DEFAULT_PATH, legacy_json: str = None):
+        '''
+        legacy_json: pickledb file of the same data, imported once and removed
+        '''
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"invalid table name: {table}")
+        self._table = table
+        self._con, self._lock = _get_connection(path)
+        with self._lock:
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+        if legacy_json is not None and os.path.exists(legacy_json):
+            self._import_legacy_json(legacy_json)
+
+    def _import_legacy_json(self, path: str):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        # entries written meanwhile by a process already using the table are newer, keep them
+        self._write("INSERT OR IGNORE", data.items(), None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write(self, verb: str, items: Iterable[Tuple[str, Any]], ttl_s: float):
+        expires = None if ttl_s is None else time.time() + ttl_s
+        rows = [(key, json.dumps(value), expires) for key, value in items]
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                self._con.executemany(f"{verb} INTO {self._table} (key, value, expires) VALUES (?, ?, ?)", rows)
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._con.execute("COMMIT")
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._con.execute(f"SELECT value FROM {self._table} WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        '''
+        values of given keys, missing and expired keys are left out
+        '''
+        keys = list(keys)
+        result = {}
+        now = time.time()
+        # stays below the sqlite limit of host parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            with self._lock:
+                rows = self._con.execute(f"SELECT key, value FROM {self._table} WHERE key IN ({','.join('?' * len(chunk))}) AND (expires IS NULL OR expires > ?)", (*chunk, now)).fetchall()
+            for key, value in rows:
+                result[key] = json.loads(value)
+        return result
+
+    def set(self, key: str, value: Any, ttl_s: float = None):
+        self._write("INSERT OR REPLACE", [(key, value)], ttl_s)
+
+    def set_many(self, values: Dict[str, Any], ttl_s: float = None):
+        self._write("INSERT OR REPLACE", values.items(), ttl_s)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._con.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            rows = self._con.execute(f"SELECT key FROM {self._table} WHERE expires IS NULL OR expires > ?", (time.time(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        with self._lock:
+            rows = self._con.execute(f"SELECT key, value FROM {self._table} WHERE expires IS NULL OR expires > ?", (time.time(),)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._con.execute(f"SELECT COUNT(*) FROM {self._table} WHERE expires IS NULL OR expires > ?", (time.time(),)).fetchone()[0]
+
+    def purge_expired(self):
+        with self._lock:
+            self._con.execute(f"DELETE FROM {self._table} WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
@@ -1,148 +1,391 @@
-import os, talib, json, datetime, pathlib
+import os, talib, json, datetime, pathlib, threading, time, atexit
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from typing import List, Tuple, Any, NamedTuple
+from typing import List, Tuple, Any, NamedTuple, Dict, Iterable, Callable
 from .. market_data_providers.flyweight import MarketDataProviderFlyweight
 from lib.common.msg import warn
 from lib.common.misc import calc_raise_percent
+from lib.common import candle_store
 from math import nan
-import pickledb
-import yaml
+from lib.common.kv_store import KVStore
+from lib.common.common_config import get_common_config
 
 
 class HistoricalBarCache:
-    _cache_dir = f"cache/market_data/day_candles/{datetime.datetime.utcnow().strftime('%Y-%m-%d')}"
+    '''
+    daily bars per asset, accumulated over time. The last stored bar is the partial bar of the day
+    it was fetched on, it is replaced once bars of later days are put.
+    The UTC day of the last fetch is kept in the store meta data: bars are fresh for the rest of that day, also for
+    assets without a bar of the day, e.g. stocks on weekends or before the open, or delisted assets.
+    Bars are read from disk once per process and kept in memory. Returned frames are the cached ones, callers must not modify them
+    '''
+    _cache_dir = "cache/market_data/day_candles"
 
     def __init__(self):
         self._cache = {}
+        self._fetched: Dict[str, pd.Timestamp] = {}
+        self._lock = threading.RLock()
 
     @staticmethod
-    def _get_cache_file_name(asset: str):
-        return f"{HistoricalBarCache._cache_dir}/{asset}.json"
+    def _get_store_path(asset: str):
+        return f"{HistoricalBarCache._cache_dir}/{asset}"
 
-    def put(self, asset: str, df: List[Any]):
-        self._cache[asset] = df
-        if not os.path.exists(HistoricalBarCache._cache_dir):
-            pathlib.Path(HistoricalBarCache._cache_dir).mkdir(parents=True, exist_ok=True)
-        cache_file = HistoricalBarCache._get_cache_file_name(asset)
-        with open(cache_file, "w") as f:
-            d = df.to_dict(orient="records")
-            json.dump(d, f)
-            
-    def get(self, asset: str) -> List[Any]:
+    @staticmethod
+    def _today() -> pd.Timestamp:
+        return pd.Timestamp(datetime.datetime.utcnow().date())
+
+    def _load(self, asset: str) -> pd.DataFrame:
         if asset in self._cache.keys():
             return self._cache[asset]
-        cache_file = HistoricalBarCache._get_cache_file_name(asset)
-        if os.path.exists(cache_file):
-            return pd.DataFrame.from_dict(json.load(open(cache_file)))
-        else:
+        path = HistoricalBarCache._get_store_path(asset)
+        columns = candle_store.load_columns(path)
+        if columns is None or "timestamp" not in columns:
             return None
+        df = candle_store.columns_to_df(columns)
+        self._cache[asset] = df
+        fetched = candle_store.load_meta(path).get("fetched")
+        if fetched is not None:
+            self._fetched[asset] = pd.Timestamp(fetched)
+        elif df.index.size and isinstance(df.index, pd.DatetimeIndex):
+            # stored before fetch days were recorded
+            self._fetched[asset] = df.index[-1].normalize()
+        return df
+
+    def _fetched_day(self, asset: str) -> pd.Timestamp:
+        '''
+        UTC day bars of asset were last fetched on, None if they never were
+        '''
+        with self._lock:
+            df = self._load(asset)
+            if df is None or df.index.size == 0 or not isinstance(df.index, pd.DatetimeIndex):
+                return None
+            return self._fetched.get(asset)
+
+    def get(self, asset: str) -> pd.DataFrame:
+        '''
+        bars up to and including today, None if they were not fetched today yet
+        '''
+        fetched = self._fetched_day(asset)
+        if fetched is None or fetched < HistoricalBarCache._today():
+            return None
+        with self._lock:
+            return self._cache[asset]
+
+    def missing_days(self, asset: str, max_days: int) -> int:
+        '''
+        number of days to fetch, so that there is no gap to the stored bars. The day of the last fetch is fetched again,
+        its bar was partial then
+        '''
+        fetched = self._fetched_day(asset)
+        if fetched is None:
+            return max_days
+        return min(max_days, max(1, (HistoricalBarCache._today() - fetched).days + 1))
+
+    def put(self, asset: str, df: pd.DataFrame) -> pd.DataFrame:
+        '''
+        merge bars fetched today into the stored ones, a fetched bar replaces stored bar of the same day.
+        Returns all bars of the asset
+        '''
+        columns = candle_store.df_to_columns(df)
+        if "timestamp" not in columns:
+            # can not be merged by day, keep in memory only
+            with self._lock:
+                self._cache[asset] = df
+            return df
+        df = candle_store.columns_to_df(columns)
+        today = HistoricalBarCache._today()
+        with self._lock:
+            stored = self._load(asset)
+            if stored is not None and isinstance(stored.index, pd.DatetimeIndex):
+                df = pd.concat([stored, df])
+                df = df[~df.index.normalize().duplicated(keep="last")].sort_index()
+            self._cache[asset] = df
+            self._fetched[asset] = today
+            candle_store.save_columns(HistoricalBarCache._get_store_path(asset), candle_store.df_to_columns(df),
+                                      meta={"fetched": today.strftime("%Y-%m-%d")})
+        return df
+
+class IndicatorBundle:
+    '''
+    indicators of one set of daily bars of an asset. Columns are converted once, each indicator is computed
+    on first request and memoized. MarketData replaces the bundle when the bars or the live price change
+    '''
+    def __init__(self, bars: pd.DataFrame):
+        self.version = IndicatorBundle.version_of(bars)
+        self._open = bars['open'].to_numpy(dtype=float)
+        self._close = bars['close'].to_numpy(dtype=float)
+        self._low = bars['low'].to_numpy(dtype=float)
+        self._high = bars['high'].to_numpy(dtype=float)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    # bars the indicators are computed on, as many as MarketData caches
+    max_days = 365
+
+    @staticmethod
+    def version_of(bars: pd.DataFrame) -> tuple:
+        if bars.index.size == 0:
+            return (0,)
+        return (bars.index.size, bars.index[0], bars.index[-1], bars['open'].iat[-1], bars['close'].iat[-1], bars['low'].iat[-1], bars['high'].iat[-1])
+
+    def _memoized(self, key: tuple, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        r = fn()
+        with self._lock:
+            self._memo[key] = r
+        return r
+
+    def size(self, days_before: int) -> int:
+        '''
+        number of bars of the last days_before days and today
+        '''
+        return min(self._close.size, days_before + 1)
+
+    def change(self, days_before: int, back: int) -> Tuple[float,float]:
+        '''
+        absolute and percent change of the close back bars ago, within the last days_before days
+        '''
+        def calc():
+            close = self._close[-days_before-1:]
+            if close.size > 1:
+                previous_close = close[back]
+                current_price = close[-1]
+                return (current_price - previous_close), (current_price - previous_close) / previous_close * 100
+            return (0,0), 0
+        return self._memoized(("change", days_before, back), calc)
+
+    def trend(self, length_days: int) -> Tuple[int,int]:
+        '''
+        number of up and down bars of the last length_days bars
+        '''
+        def calc():
+            is_up = self._open[-length_days:] <= self._close[-length_days:]
+            return int(np.count_nonzero(is_up)), int(np.count_nonzero(~is_up))
+        return self._memoized(("trend", length_days), calc)
+
+    def ma(self, days_before: int, ta_ma_type: Callable) -> float:
+        def calc():
+            close = self._close[-days_before-1:]
+            return ta_ma_type(close, min(close.size-1, days_before))[-1]
+        return self._memoized(("ma", days_before, ta_ma_type.__name__), calc)
+
+    def lo_hi(self, days_before: int) -> Tuple[float,float]:
+        def calc():
+            n = min(self.size(days_before)-1, days_before)
+            return talib.MIN(self._low[-days_before-1:], n)[-1], talib.MAX(self._high[-days_before-1:], n)[-1]
+        return self._memoized(("lo_hi", days_before), calc)
+
+    def rsi(self, days_before: int, period: int) -> float:
+        def calc():
+            return talib.RSI(self._close[-days_before-1:], period)[-1]
+        return self._memoized(("rsi", days_before, period), calc)
+
 
 class MarketPriceCache:
     """
-        optimizes multiple recent accesses to market price of same asset.  
+        optimizes multiple recent accesses to market price of same asset.
+        Prices are kept in a process-wide LRU in front of the persistent cache table, which is shared with other processes.
+        Puts reach the table in batches: once flush_batch prices are pending, flush_interval_s after the first pending put, or at exit
     """
     class MarketPrice(NamedTuple):
         value:      float
         timestamp:  float
 
-    def __init__(self):
-        self._ttl_s = yaml.safe_load(open("config/common.yml", "r"))["market_price_cache_ttl_s"]
-        cache_d = "cache/market_data"
-        if not os.path.exists(cache_d):
-            pathlib.Path(cache_d).mkdir(parents=True, exist_ok=True)
-        self._cache = pickledb.load(cache_d+"/marketprice.db", auto_dump=True)
+    def __init__(self, ttl_s: float = None, max_size: int = 4096, flush_batch: int = 64, flush_interval_s: float = 5., store: KVStore = None):
+        self._ttl_s = get_common_config().get("market_price_cache_ttl_s", 600) if ttl_s is None else ttl_s
+        self._max_size = max_size
+        self._flush_batch = flush_batch
+        self._flush_interval_s = flush_interval_s
+        self._store = store
+        self._lru: "OrderedDict[str, MarketPriceCache.MarketPrice]" = OrderedDict()
+        self._pending: Dict[str, MarketPriceCache.MarketPrice] = {}
+        self._pending_since = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def _get_store(self) -> KVStore:
+        if self._store is None:
+            self._store = KVStore("market_prices")
+        return self._store
+
+    def _is_valid(self, v: "MarketPriceCache.MarketPrice") -> bool:
+        return time.time() - v.timestamp < self._ttl_s
+
+    def _remember(self, key: str, v: "MarketPriceCache.MarketPrice"):
+        self._lru[key] = v
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._max_size:
+            self._lru.popitem(last=False)
 
     def put(self, key: str, value: float):
-        self._cache.set(key, MarketPriceCache.MarketPrice(value=value, timestamp=datetime.datetime.now().timestamp()))
+        self.put_many({key: value})
+
+    def put_many(self, values: Dict[str, float]):
+        timestamp = time.time()
+        with self._lock:
+            for key, value in values.items():
+                v = MarketPriceCache.MarketPrice(value=value, timestamp=timestamp)
+                self._remember(key, v)
+                self._pending[key] = v
+            if self._pending_since is None:
+                self._pending_since = timestamp
+            if len(self._pending) >= self._flush_batch or timestamp - self._pending_since >= self._flush_interval_s:
+                self.flush()
+
+    def flush(self):
+        '''
+        write pending prices to the persistent cache in one transaction
+        '''
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._pending_since = self._pending, {}, None
+            self._get_store().set_many({key: list(v) for key, v in pending.items()}, ttl_s=self._ttl_s)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        '''
+        valid cached prices of given keys, the rest is left out
+        '''
+        result = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                v = self._lru.get(key)
+                if v is not None and self._is_valid(v):
+                    self._lru.move_to_end(key)
+                    result[key] = v.value
+                else:
+                    missing.append(key)
+            if missing:
+                # prices put by other processes
+                for key, v in self._get_store().get_many(missing).items():
+                    v = MarketPriceCache.MarketPrice(*v)
+                    if self._is_valid(v):
+                        self._remember(key, v)
+                        result[key] = v.value
+        return result
 
     def get(self, key: str) -> float:
-        v = self._cache.get(key)
-        if v:
-            # only valid if not older than 10 minutes
-            if (datetime.datetime.now() - datetime.datetime.fromtimestamp(self._cache[key][1])) < datetime.timedelta(seconds=self._ttl_s):
-                return v[0]
-        return None
+        return self.get_many([key]).get(key)
+
+
+_marketprice_cache = None
+_marketprice_cache_lock = threading.Lock()
+
+def get_marketprice_cache() -> MarketPriceCache:
+    '''
+    process-wide market price cache, shared by all MarketData instances
+    '''
+    global _marketprice_cache
+    with _marketprice_cache_lock:
+        if _marketprice_cache is None:
+            _marketprice_cache = MarketPriceCache()
+        return _marketprice_cache
 
 class MarketData:
+    '''
+    safe to use from multiple threads, requests to each provider are rate limited process-wide by lib.common.rate_limiter
+    '''
     def __init__(self):
         self._provider_flyweight = MarketDataProviderFlyweight()
         self._historical_bars_cache = HistoricalBarCache()
-        self._marketprice_cache = MarketPriceCache()
+        self._marketprice_cache = get_marketprice_cache()
+        self._indicators: Dict[str, IndicatorBundle] = {}
+        self._indicators_lock = threading.Lock()
+
+    def warm_up(self):
+        '''
+        create all providers and load their snapshots now rather than on first request, for long running processes
+        '''
+        self._provider_flyweight.warm_up()
+
+    def _provider(self, asset: str, method: str):
+        return self._provider_flyweight.get(asset, method)
 
     def get_market_price(self, asset: str) -> float:
         cached_market_price = self._marketprice_cache.get(asset)
         if cached_market_price is not None:
             return cached_market_price
         else:
-            market_price = self._provider_flyweight.get(asset, "get_market_price").get_market_price(asset)
+            market_price = self._provider(asset, "get_market_price").get_market_price(asset)
             self._marketprice_cache.put(asset, market_price)
             return market_price
 
+    def get_market_prices(self, assets: Iterable[str]) -> Dict[str, float]:
+        '''
+        prices of many assets: cached ones are reused, the rest is requested with one bulk request per provider
+        '''
+        assets = list(dict.fromkeys(assets))
+        prices = self._marketprice_cache.get_many(assets)
+        by_provider: Dict[str, List[str]] = {}
+        for asset in assets:
+            if asset not in prices:
+                by_provider.setdefault(self._provider_flyweight.get_id(asset, "get_market_price"), []).append(asset)
+
+        fetched = {}
+        for id, provider_assets in by_provider.items():
+            provider = self._provider_flyweight.get_by_id(id)
+            fetched |= provider.get_market_prices(provider_assets)
+            # left out by the bulk request, asked for one by one as get_market_price does
+            for asset in provider_assets:
+                if asset not in fetched:
+                    fetched[asset] = provider.get_market_price(asset)
+        if fetched:
+            self._marketprice_cache.put_many(fetched)
+        return prices | fetched
+
     def is_tradeable(self, asset: str) -> bool:
         return True
 
     def _get_historical_bars(self, asset, days_before):
+        '''
+        last days_before bars and today's bar, with today's bar updated to the current market price.
+        The returned frame is a copy, the cached bars are never modified
+        '''
         max_cache_days = 365
         assert days_before <= max_cache_days
         bar_data = self._historical_bars_cache.get(asset)
         if bar_data is None:
-            bar_data = self._provider_flyweight.get(asset, "get_historical_bars").get_historical_bars(asset, max_cache_days)
-            self._historical_bars_cache.put(asset, bar_data)
-            return bar_data[-days_before-1:]
+            missing_days = self._historical_bars_cache.missing_days(asset, max_cache_days)
+            bar_data = self._provider(asset, "get_historical_bars").get_historical_bars(asset, missing_days)
+            bar_data = self._historical_bars_cache.put(asset, bar_data)
+            return bar_data[-days_before-1:].copy()
         else:
+            bar_data = bar_data[-days_before-1:].copy()
             # update close value to current, since cached value is definitely not current
-            bar_data['close'].iat[-1] = self.get_market_price(asset)
+            market_price = self.get_market_price(asset)
+            bar_data.iloc[-1, bar_data.columns.get_loc('close')] = market_price
             # update new low/high if needed
-            bar_data['low'].iat[-1] = min(bar_data['low'].iat[-1], bar_data['close'].iat[-1])
-            bar_data['high'].iat[-1] = max(bar_data['high'].iat[-1], bar_data['close'].iat[-1])
-            return bar_data[-days_before-1:]
+            bar_data.iloc[-1, bar_data.columns.get_loc('low')] = min(bar_data['low'].iat[-1], market_price)
+            bar_data.iloc[-1, bar_data.columns.get_loc('high')] = max(bar_data['high'].iat[-1], market_price)
+            return bar_data
 
+    def _get_indicators(self, asset: str) -> IndicatorBundle:
+        bars = self._get_historical_bars(asset, IndicatorBundle.max_days)
+        version = IndicatorBundle.version_of(bars)
+        with self._indicators_lock:
+            bundle = self._indicators.get(asset)
+        if bundle is None or bundle.version != version:
+            bundle = IndicatorBundle(bars)
+            with self._indicators_lock:
+                self._indicators[asset] = bundle
+        return bundle
 
     def get_daily_change(self, asset: str) -> Tuple[float,float]:
-        daily_change = (0,0)
-        daily_change_percent = 0
-        df = self._get_historical_bars(asset, 1)
-        if df['close'].size > 1:
-            previous_close = df['close'].iat[-2]
-            current_price = df['close'].iat[-1]
-            daily_change = (current_price - previous_close)
-            daily_change_percent = (current_price - previous_close) / previous_close * 100
-        return daily_change,daily_change_percent
+        return self._get_indicators(asset).change(1, -2)
 
     def get_weekly_change(self, asset: str) -> Tuple[float,float]:
-        weekly_change = (0,0)
-        weekly_change_percent = 0
-        df = self._get_historical_bars(asset, 7)
-        if df['close'].size > 1:
-            previous_close = df['close'].iat[-8]
-            current_price = df['close'].iat[-1]
-            weekly_change = (current_price - previous_close)
-            weekly_change_percent = (current_price - previous_close) / previous_close * 100
-        return weekly_change,weekly_change_percent
+        return self._get_indicators(asset).change(7, -8)
 
     def get_annual_change(self, asset: str) -> Tuple[float,float]:
-        annual_change = (0,0)
-        annual_change_percent = 0
-        df = self._get_historical_bars(asset, 364)
-        if df['close'].size > 1:
-            previous_close = df['close'].iat[-365 if df['close'].size >= 365 else 0]
-            current_price = df['close'].iat[-1]
-            annual_change = (current_price - previous_close)
-            annual_change_percent = (current_price - previous_close) / previous_close * 100
-        return annual_change,annual_change_percent
+        ind = self._get_indicators(asset)
+        return ind.change(364, -365 if ind.size(364) >= 365 else 0)
 
     def get_short_term_trend(self, asset: str, length_days: int) -> str:
-        df = self._get_historical_bars(asset, length_days)
-        c_up = 0
-        c_down = 0
-        i = -length_days
-        while i <= -1:
-            if df['open'].iat[i] <= df['close'].iat[i]:
-                c_up += 1
-            else:
-                c_down += 1
-            i += 1
-
+        c_up, c_down = self._get_indicators(asset).trend(length_days)
         if c_up == length_days:
             return "up"
         elif c_down == length_days:
@@ -152,34 +395,32 @@ class MarketData:
 
 
     def get_avg_price_n_days(self, asset: str, days_before: int, ma_type: str="auto") -> float:
-        df = self._get_historical_bars(asset, days_before)
-        if df['close'].size > 1:
+        ind = self._get_indicators(asset)
+        if ind.size(days_before) > 1:
             if ma_type == "auto":
                 ta_ma_type = talib.SMA if days_before > 10 else talib.EMA
             elif ma_type == "EMA":
                 ta_ma_type = talib.EMA
             else:
                 ta_ma_type = talib.SMA
-            r = ta_ma_type(df['close'], min(df['close'].size-1, days_before)).iat[-1]
+            r = ind.ma(days_before, ta_ma_type)
             if r != r:
                 raise ValueError("r == NaN")
             return r
         return self.get_market_price(asset)
 
     def get_lo_hi_n_days(self, asset: str, days_before: int) -> float:
-        df = self._get_historical_bars(asset, days_before)
-        if df['close'].size > 1:
-            lo = talib.MIN(df['low'], min(df['close'].size-1, days_before)).iat[-1]
-            hi = talib.MAX(df['high'], min(df['close'].size-1, days_before)).iat[-1]
-            return lo,hi
+        ind = self._get_indicators(asset)
+        if ind.size(days_before) > 1:
+            return ind.lo_hi(days_before)
         return nan,nan
 
     def get_rsi(self, asset: str) -> float:
         rsi_period = 14
-        df = self._get_historical_bars(asset, 50)
+        ind = self._get_indicators(asset)
         r = None
-        if df['close'].size > rsi_period:
-            r = talib.RSI(df['close'], rsi_period).iat[-1]
+        if ind.size(50) > rsi_period:
+            r = ind.rsi(50, rsi_period)
             if r != r:
                 r = None
         return r
@@ -188,13 +429,35 @@ class MarketData:
         return calc_raise_percent(self.get_avg_price_n_days(coin, days_before), self.get_market_price(coin))
 
     def get_fundamentals(self, asset: str) -> dict:
-        return self._provider_flyweight.get(asset, "get_fundamentals").get_fundamentals(asset)
+        return self._provider(asset, "get_fundamentals").get_fundamentals(asset)
 
     def get_market_cap(self, asset: str) -> int:
-        return self._provider_flyweight.get(asset, "get_market_cap").get_market_cap(asset)
+        return self._provider(asset, "get_market_cap").get_market_cap(asset)
 
     def get_total_supply(self, asset: str) -> int:
-        return self._provider_flyweight.get(asset, "get_total_supply").get_total_supply(asset)
+        return self._provider(asset, "get_total_supply").get_total_supply(asset)
 
     def get_total_volume(self, asset: str) -> int:
-        return self._provider_flyweight.get(asset, "get_total_volume").get_total_volume(asset)
+        return self._provider(asset, "get_total_volume").get_total_volume(asset)
+
+
+_market_data = None
+_market_data_lock = threading.Lock()
+
+def get_market_data() -> MarketData:
+    '''
+    process-wide MarketData, so that all call sites share providers, their snapshots and the in-memory bar cache
+    '''
+    global _market_data
+    with _market_data_lock:
+        if _market_data is None:
+            _market_data = MarketData()
+        return _market_data
+
+def set_market_data(market_data: MarketData):
+    '''
+    replace the process-wide MarketData, e.g. by one with fake providers in tests. None resets it
+    '''
+    global _market_data
+    with _market_data_lock:
+        _market_data = market_data
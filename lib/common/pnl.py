@@ -1,4 +1,5 @@
-from typing import List, NamedTuple
+from typing import List, NamedTuple, Tuple, Union
+import numpy as np
 
 class PnL(NamedTuple):
     realized_pnl: float
@@ -15,37 +16,165 @@ class Order(NamedTuple):
     value:  float
     qty:    float
 
-def calculate_inc_pnl(orders: List[Order], market_price_now: float) -> PnL:
+class PnLState(NamedTuple):
+    """running totals over the orders seen so far, enough to continue with the next order"""
+    position_qty:                   float = 0
+    average_buying_rate:            float = None
+    cumulative_initial_buy_value:   float = 0
+    cumulative_sell_value:          float = 0
+    n_orders:                       int = 0
 
-    position_qty = 0
-    average_buying_rate = None
 
-    cumulative_initial_buy_value = 0
-    cumulative_sell_value = 0
+class PnLAccumulator:
+    '''
+    incremental calculate_inc_pnl: add() consumes one order in O(1), pnl() evaluates the state at a market price.
+    The state can be stored and resumed later with the orders that came after it
+    '''
+    def __init__(self, state: PnLState = None):
+        state = state or PnLState()
+        self.position_qty = state.position_qty
+        self.average_buying_rate = state.average_buying_rate
+        self.cumulative_initial_buy_value = state.cumulative_initial_buy_value
+        self.cumulative_sell_value = state.cumulative_sell_value
+        self.n_orders = state.n_orders
 
-    for o in orders:
+    @property
+    def state(self) -> PnLState:
+        return PnLState(self.position_qty, self.average_buying_rate, self.cumulative_initial_buy_value, self.cumulative_sell_value, self.n_orders)
+
+    def add(self, o: Order):
         if o.side == "BUY":
 
-            if average_buying_rate:
-                average_buying_rate = (average_buying_rate * position_qty + o.value)  / (position_qty + o.qty)
+            if self.average_buying_rate:
+                self.average_buying_rate = (self.average_buying_rate * self.position_qty + o.value)  / (self.position_qty + o.qty)
             else:
-                average_buying_rate = o.value / o.qty
-            position_qty += o.qty
+                self.average_buying_rate = o.value / o.qty
+            self.position_qty += o.qty
 
         elif o.side == "SELL":
-            initial_buy_value = o.qty * average_buying_rate
-            cumulative_initial_buy_value += initial_buy_value
-            cumulative_sell_value += o.value
-            position_qty -= o.qty
+            initial_buy_value = o.qty * self.average_buying_rate
+            self.cumulative_initial_buy_value += initial_buy_value
+            self.cumulative_sell_value += o.value
+            self.position_qty -= o.qty
+        self.n_orders += 1
 
+    def pnl(self, market_price_now: float) -> PnL:
+        unrealized_sell_value = self.position_qty * market_price_now
+        average_buying_value = self.position_qty * self.average_buying_rate if self.average_buying_rate else 0
+        unrealized_pnl = unrealized_sell_value - average_buying_value
+        unrealized_pnl_percent = unrealized_pnl / average_buying_value * 100 if average_buying_value > 1e-5 else INVALID_PERCENT
 
-    unrealized_sell_value = position_qty * market_price_now
-    average_buying_value = position_qty * average_buying_rate if average_buying_rate else 0
-    unrealized_pnl = unrealized_sell_value - average_buying_value
-    unrealized_pnl_percent = unrealized_pnl / average_buying_value * 100 if average_buying_value > 1e-5 else INVALID_PERCENT
+        realized_pnl = self.cumulative_sell_value - self.cumulative_initial_buy_value
+        realized_pnl_percent = realized_pnl / self.cumulative_initial_buy_value * 100 if self.cumulative_initial_buy_value > 1e-5 else INVALID_PERCENT
+
+        return PnL(
+            realized_pnl,
+            realized_pnl_percent,
+            self.average_buying_rate,
+            unrealized_sell_value,
+            unrealized_pnl,
+            unrealized_pnl_percent
+        )
+
+
+def calculate_inc_pnl(orders: List[Order], market_price_now: float) -> PnL:
+    accumulator = PnLAccumulator()
+    for o in orders:
+        accumulator.add(o)
+    return accumulator.pnl(market_price_now)
+
+
+SIDE_BUY = 1
+SIDE_SELL = -1
+# natural log of the largest rescaling within a run of calculate_inc_pnl_series, e^200 ~ 1e87
+RESCALE_LOG = 200.
 
+
+def orders_to_arrays(orders: List[Order]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    side as int8 SIDE_BUY/SIDE_SELL, value and qty as float64 columns of given orders
+    '''
+    side = np.array([SIDE_BUY if o.side == "BUY" else SIDE_SELL if o.side == "SELL" else 0 for o in orders], dtype=np.int8)
+    value = np.array([o.value for o in orders], dtype=np.float64)
+    qty = np.array([o.qty for o in orders], dtype=np.float64)
+    return side, value, qty
+
+
+def calculate_inc_pnl_series(side: np.ndarray, value: np.ndarray, qty: np.ndarray, market_price: Union[float, np.ndarray]) -> PnL:
+    '''
+    calculate_inc_pnl after each order at once: every PnL field is an array, element i is the PnL of orders[:i+1]
+    at market_price[i] (or at market_price, if it is a scalar). break_even_price is NaN before the first buy.
+
+    A buy moves the average buying rate r to a*r + b with a = qty before / qty after and b = value / qty after,
+    a sell keeps it. So the rate is a cumulative product of the a's times a cumulative sum of the b's scaled by it.
+    A buy restarts it, as PnLAccumulator.add does, when there is no rate (None or 0) or no position (a close to 0),
+    and the runs between restarts are evaluated one after the other.
+    Results match calculate_inc_pnl up to rounding
+    '''
+    side = np.asarray(side)
+    value = np.asarray(value, dtype=np.float64)
+    qty = np.asarray(qty, dtype=np.float64)
+    n = len(side)
+    buy = side == SIDE_BUY
+    sell = side == SIDE_SELL
+
+    signed_qty = np.where(buy, qty, np.where(sell, -qty, 0.))
+    position_qty = np.cumsum(signed_qty)
+    position_before = position_qty - signed_qty
+
+    a = np.ones(n)
+    b = np.zeros(n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a[buy] = position_before[buy] / position_qty[buy]
+        b[buy] = value[buy] / position_qty[buy]
+        restart_b = value / qty
+    # buys into a closed position, up to rounding of the position qty
+    closed = buy & (np.abs(a) < 1e-9)
+    # runs are also cut where the product of the a's has moved by RESCALE_LOG since the start of the run,
+    # so that the scale stays far from under- and overflow over long histories
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_a = np.log(np.abs(a))
+    # closed runs restart anyway
+    log_scale = np.cumsum(np.where(np.isfinite(log_a), log_a, 0.))
+    block = np.floor(log_scale / RESCALE_LOG)
+    rescaled = np.r_[False, block[1:] != block[:-1]] if n else np.zeros(0, dtype=bool)
+    cut = closed | rescaled
+
+    average_buying_rate = np.full(n, np.nan)
+    start = 0
+    while start < n:
+        end = start + 1 + np.argmax(cut[start+1:]) if cut[start+1:].any() else n
+        rate_before = average_buying_rate[start-1] if start > 0 else np.nan
+        if buy[start] and closed[start]:
+            rate_start = b[start]
+        elif buy[start] and (rate_before == 0 or np.isnan(rate_before)):
+            rate_start = restart_b[start]
+        else:
+            # continued from the previous run
+            rate_start = a[start] * rate_before + b[start]
+        scale = np.cumprod(np.r_[1., a[start+1:end]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = scale * (rate_start + np.cumsum(np.r_[0., b[start+1:end] / scale[1:]]))
+        # a later buy without rate restarts it
+        no_rate = buy[start+1:end] & ((rate[:-1] == 0) | np.isnan(rate[:-1]))
+        if no_rate.any():
+            end = start + 1 + np.argmax(no_rate)
+        average_buying_rate[start:end] = rate[:end-start]
+        start = end
+
+    # sells realize at the rate of the buys before them
+    rate_before = np.r_[np.nan, average_buying_rate[:-1]]
+    cumulative_initial_buy_value = np.cumsum(np.where(sell, qty * rate_before, 0.))
+    cumulative_sell_value = np.cumsum(np.where(sell, value, 0.))
+
+    unrealized_sell_value = position_qty * market_price
+    has_rate = ~np.isnan(average_buying_rate) & (average_buying_rate != 0)
+    average_buying_value = np.where(has_rate, position_qty * np.where(has_rate, average_buying_rate, 0.), 0.)
+    unrealized_pnl = unrealized_sell_value - average_buying_value
     realized_pnl = cumulative_sell_value - cumulative_initial_buy_value
-    realized_pnl_percent = realized_pnl / cumulative_initial_buy_value * 100 if cumulative_initial_buy_value > 1e-5 else INVALID_PERCENT
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unrealized_pnl_percent = np.where(average_buying_value > 1e-5, unrealized_pnl / average_buying_value * 100, INVALID_PERCENT)
+        realized_pnl_percent = np.where(cumulative_initial_buy_value > 1e-5, realized_pnl / cumulative_initial_buy_value * 100, INVALID_PERCENT)
 
     return PnL(
         realized_pnl,
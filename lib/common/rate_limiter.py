@@ -0,0 +1,273 @@
+import threading, time, random, requests
+from contextlib import contextmanager
+from math import inf
+from typing import Any, Callable, Dict, NamedTuple
+from lib.common.common_config import get_common_config
+
+
+class TokenBucket:
+    '''
+    thread-safe token bucket: refills at rate tokens per second, up to capacity tokens.
+    Callers reserve tokens in arrival order and sleep until their reservation is covered
+    '''
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._t = time.monotonic()
+        self._paused_until = 0.
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.) -> float:
+        '''
+        blocks until tokens are available, returns time spent waiting, s
+        '''
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0., self._paused_until - now)
+            if self._rate != inf:
+                self._tokens = min(self._capacity, self._tokens + (now - self._t) * self._rate)
+                self._t = now
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self._rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        '''
+        hold back all callers for given time, e.g. after the server asked to back off
+        '''
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RateLimit(NamedTuple):
+    rate:           float       # request weight per second
+    burst:          float       # request weight available at once
+    max_retries:    int = 3
+
+
+# kept well below the published limits, can be overridden in config/common.yml, see config/example.common.yml
+default_rate_limits: Dict[str, RateLimit] = {
+    "binance":  RateLimit(15.,  60.),   # 1200 request weight per minute
+    "ftx":      RateLimit(10.,  20.),   # 30 requests per second
+    "poloniex": RateLimit(5.,   5.),    # 6 calls per second
+    "bitrue":   RateLimit(5.,   10.),
+    "mexc":     RateLimit(10.,  20.),   # 20 requests per second
+    "okex":     RateLimit(5.,   10.),   # 20 requests per 2 seconds per endpoint
+    "exante":   RateLimit(2.,   5.),
+    "solscan":  RateLimit(2.,   5.),    # 150 requests per 30 seconds
+    "yf":       RateLimit(2.,   4.),    # no published limit, throttles bursts
+    "cg":       RateLimit(0.8,  5.),    # 50 calls per minute on free plan
+}
+
+REQUEST_TIMEOUT_S = 30
+BACKOFF_BASE_S = 1.
+BACKOFF_MAX_S = 60.
+
+# deadline of the requests of the current thread, see deadline()
+_deadline = threading.local()
+
+# rejected before being processed, safe to repeat for any request
+_RATE_LIMITED_STATUS = (418, 429)
+# repeated for idempotent requests only
+_TRANSIENT_STATUS = (500, 502, 503, 504)
+
+
+class _Limiter:
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.bucket = TokenBucket(limit.rate, limit.burst)
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests':     0,
+            'weight':       0.,
+            'throttled_s':  0.,
+            'rate_limited': 0,
+            'retries':      0,
+            'backoff_s':    0.,
+        }
+
+    def count(self, **kwargs):
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+
+_limiters: Dict[str, _Limiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _load_configured_limits() -> Dict[str, RateLimit]:
+    limits = dict(default_rate_limits)
+    for name, v in (get_common_config().get("rate_limits") or {}).items():
+        limits[name] = limits.get(name, RateLimit(inf, inf))._replace(**v)
+    return limits
+
+
+def _get_limiter(name: str) -> _Limiter:
+    with _limiters_lock:
+        if not _limiters:
+            for k, v in _load_configured_limits().items():
+                _limiters[k] = _Limiter(v)
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _Limiter(RateLimit(inf, inf))
+            _limiters[name] = limiter
+        return limiter
+
+
+def get_rate_limiter(name: str) -> TokenBucket:
+    '''
+    process-wide limiter of given exchange or data provider, not limited if there are no limits known for it
+    '''
+    return _get_limiter(name).bucket
+
+
+def get_stats() -> Dict[str, dict]:
+    '''
+    per limiter counters: requests, weight, time spent waiting for tokens, rate limited responses, retries, time spent in backoff
+    '''
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: dict(limiter.stats) for name, limiter in limiters.items() if limiter.stats['requests'] > 0}
+
+
+@contextmanager
+def deadline(timeout_s: float):
+    '''
+    requests of the current thread must be done within timeout_s: their HTTP timeouts are shortened to the time left
+    and they are not retried past it. Nested deadlines can only shorten the outer one
+    '''
+    outer = getattr(_deadline, "t", None)
+    t = time.monotonic() + timeout_s if timeout_s is not None else None
+    _deadline.t = t if outer is None else outer if t is None else min(outer, t)
+    try:
+        yield
+    finally:
+        _deadline.t = outer
+
+
+def time_left() -> float:
+    '''
+    seconds to the deadline of the current thread, inf without one
+    '''
+    t = getattr(_deadline, "t", None)
+    return t - time.monotonic() if t is not None else inf
+
+
+def request_timeout() -> float:
+    '''
+    HTTP timeout of the next request: REQUEST_TIMEOUT_S, or the time left to the deadline if that is shorter.
+    Raises requests.Timeout once the deadline has passed
+    '''
+    left = time_left()
+    if left <= 0:
+        raise requests.Timeout("deadline exceeded")
+    return min(REQUEST_TIMEOUT_S, left)
+
+
+class ThreadLocalSession:
+    '''
+    requests.Session of the calling thread, a drop-in for a session shared by a client: requests does not
+    guarantee a Session is safe to use from several threads at once, e.g. by the request threads of lib.trader.async_api.
+    Each thread keeps its own connection pool
+    '''
+    def __init__(self):
+        self._local = threading.local()
+
+    def __getattr__(self, name: str) -> Any:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return getattr(session, name)
+
+
+def backoff_delay(attempt: int) -> float:
+    '''
+    exponential backoff with jitter, attempt counts from 0
+    '''
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.5, 1.)
+
+
+def _retry_after(response: requests.Response) -> float:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def send(name: str, do_request: Callable[[], requests.Response], weight: float = 1., idempotent: bool = True) -> requests.Response:
+    '''
+    performs do_request under the rate limit of name.
+    Rate limited responses (429, 418) are retried after Retry-After or backoff, and hold back other callers meanwhile.
+    Connection errors and 5xx responses are retried with backoff only if the request is idempotent.
+    do_request is called again for every attempt, so that signed requests get a fresh timestamp
+    '''
+    limiter = _get_limiter(name)
+    attempt = 0
+    while True:
+        waited = limiter.bucket.acquire(weight)
+        limiter.count(requests=1, weight=weight, throttled_s=waited)
+        try:
+            response = do_request()
+        except (requests.ConnectionError, requests.Timeout):
+            if not idempotent or attempt >= limiter.limit.max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            if delay >= time_left():
+                raise
+        else:
+            if response.status_code in _RATE_LIMITED_STATUS:
+                limiter.count(rate_limited=1)
+                if attempt >= limiter.limit.max_retries:
+                    return response
+                delay = _retry_after(response) or backoff_delay(attempt)
+                limiter.bucket.pause(delay)
+                if delay >= time_left():
+                    return response
+            elif response.status_code in _TRANSIENT_STATUS and idempotent and attempt < limiter.limit.max_retries:
+                delay = _retry_after(response) or backoff_delay(attempt)
+                if delay >= time_left():
+                    return response
+            else:
+                return response
+        limiter.count(retries=1, backoff_s=delay)
+        time.sleep(delay)
+        attempt += 1
+
+
+def _is_transient(e: Exception) -> bool:
+    '''
+    transport errors, timeouts and rate limited or 5xx responses: worth another attempt, unlike e.g. an unknown symbol
+    '''
+    if isinstance(e, requests.HTTPError):
+        status = getattr(e.response, "status_code", None)
+        return status is None or status in _RATE_LIMITED_STATUS or status in _TRANSIENT_STATUS
+    return isinstance(e, (requests.RequestException, ConnectionError, TimeoutError))
+
+
+def call(name: str, fn: Callable[..., Any], *args, weight: float = 1., retry: bool = True, **kwargs) -> Any:
+    '''
+    calls fn of a third party API library under the rate limit of name.
+    Transport errors, timeouts and 429/5xx responses are retried with backoff, unless retry is off: for non-idempotent calls.
+    Other exceptions are raised at once
+    '''
+    limiter = _get_limiter(name)
+    attempt = 0
+    while True:
+        waited = limiter.bucket.acquire(weight)
+        limiter.count(requests=1, weight=weight, throttled_s=waited)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not retry or attempt >= limiter.limit.max_retries or not _is_transient(e):
+                raise
+            delay = backoff_delay(attempt)
+            if delay >= time_left():
+                raise
+        limiter.count(retries=1, backoff_s=delay)
+        time.sleep(delay)
+        attempt += 1
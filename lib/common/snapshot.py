@@ -0,0 +1,51 @@
+import threading, time
+from typing import Any, Callable, Dict, List
+from lib.common.common_config import get_common_config
+
+# used if config/common.yml has no market_snapshot_ttl_s
+DEFAULT_TTL_S = 60.
+
+
+def get_configured_ttl_s() -> float:
+    '''
+    refresh interval of market snapshots, market_snapshot_ttl_s in config/common.yml
+    '''
+    return float(get_common_config().get("market_snapshot_ttl_s", DEFAULT_TTL_S))
+
+
+class IndexedSnapshot:
+    '''
+    list of entries returned by a bulk request, e.g. all prices or all markets of an exchange, indexed by key.
+    Loaded on first access and reloaded once older than ttl_s, so that long running loops don't serve stale data.
+    Safe to use from multiple threads
+    '''
+    def __init__(self, load: Callable[[], List[dict]], key: str, ttl_s: float = None):
+        self._load = load
+        self._key = key
+        self._ttl_s = get_configured_ttl_s() if ttl_s is None else ttl_s
+        self._index: Dict[Any, dict] = None
+        self._t = 0.
+        self._lock = threading.Lock()
+
+    def _get_index(self) -> Dict[Any, dict]:
+        with self._lock:
+            if self._index is None or time.monotonic() - self._t >= self._ttl_s:
+                self._index = {entry[self._key]: entry for entry in self._load()}
+                self._t = time.monotonic()
+            return self._index
+
+    def get(self, key: Any) -> dict:
+        '''
+        entry of given key, KeyError if there is none
+        '''
+        return self._get_index()[key]
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._get_index()
+
+    def values(self) -> List[dict]:
+        return list(self._get_index().values())
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
@@ -0,0 +1,80 @@
+'''
+Import time breakdown of a command run with --profile-startup, similar to python -X importtime.
+enable() has to be called before the imports to be measured: it replaces __import__ with a timing wrapper
+and prints the slowest module imports, and the throttling of the rate limited APIs used, when the process exits
+'''
+import builtins, sys, time, atexit, threading
+from typing import List, NamedTuple
+
+
+class ImportRecord(NamedTuple):
+    module:         str
+    depth:          int
+    cumulative_s:   float   # including imports done by the module
+    self_s:         float
+
+
+_records: List[ImportRecord] = []
+_local = threading.local()
+_t0 = None
+
+
+def _resolve(name: str, globals: dict, level: int) -> str:
+    if level == 0 or not globals:
+        return name
+    package = (globals.get("__package__") or "").rsplit(".", level - 1)[0]
+    return f"{package}.{name}" if name else package
+
+
+def enable(top: int = 25):
+    '''
+    start measuring, the report lists top slowest imports by own time
+    '''
+    global _t0
+    if _t0 is not None:
+        return
+    _t0 = time.perf_counter()
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        stack = _local.__dict__.setdefault("stack", [])
+        n_modules = len(sys.modules)
+        t = time.perf_counter()
+        stack.append(0.)
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - t
+            children_s = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            # modules already imported cost nothing worth reporting
+            if len(sys.modules) > n_modules:
+                _records.append(ImportRecord(_resolve(name, globals, level), len(stack), elapsed, elapsed - children_s))
+
+    builtins.__import__ = timed_import
+    atexit.register(report, top)
+
+
+def report(top: int = 25):
+    total_s = time.perf_counter() - _t0
+    imports_s = sum(r.cumulative_s for r in _records if r.depth == 0)
+    print(f"\nstartup profile: {len(_records)} imports took {imports_s:.3f}s of {total_s:.3f}s run time", file=sys.stderr)
+    print(f"{'self, s':>9} {'cumulative, s':>14}  module", file=sys.stderr)
+    for r in sorted(_records, key=lambda r: r.self_s, reverse=True)[:top]:
+        print(f"{r.self_s:>9.3f} {r.cumulative_s:>14.3f}  {'  ' * r.depth}{r.module}", file=sys.stderr)
+    report_rate_limits()
+
+
+def report_rate_limits():
+    '''
+    per API counters of lib.common.rate_limiter, if the command used it
+    '''
+    rate_limiter = sys.modules.get("lib.common.rate_limiter")
+    stats = rate_limiter.get_stats() if rate_limiter is not None else {}
+    if not stats:
+        return
+    print("\nrate limits:", file=sys.stderr)
+    print(f"{'api':<10} {'requests':>8} {'weight':>8} {'throttled, s':>13} {'rate limited':>12} {'retries':>7} {'backoff, s':>10}", file=sys.stderr)
+    for name, s in sorted(stats.items()):
+        print(f"{name:<10} {s['requests']:>8} {s['weight']:>8g} {s['throttled_s']:>13.3f} {s['rate_limited']:>12} {s['retries']:>7} {s['backoff_s']:>10.3f}", file=sys.stderr)
@@ -0,0 +1,292 @@
+from collections import deque
+from math import nan, isnan
+from typing import Callable, Dict, NamedTuple, Tuple
+
+
+class Bar(NamedTuple):
+    open:   float
+    high:   float
+    low:    float
+    close:  float
+    volume: float
+
+
+class Line:
+    """last two values of an indicator output, NaN until enough bars are seen"""
+    def __init__(self):
+        self.value = nan
+        self.previous = nan
+
+    def _push(self, v: float):
+        self.previous = self.value
+        self.value = v
+
+
+class Indicator(Line):
+    """
+    Streaming indicator: update() consumes one new bar in O(1).
+    Values match the talib function of the same name computed over all bars seen so far.
+    """
+    def update(self, bar: Bar):
+        """consume next bar"""
+
+
+class SMA(Indicator):
+    def __init__(self, period: int, source: str = "close"):
+        super().__init__()
+        self._period = period
+        self._source = source
+        self._window = deque()
+        self._sum = 0.
+
+    def update(self, bar: Bar):
+        x = getattr(bar, self._source)
+        self._window.append(x)
+        self._sum += x
+        if len(self._window) > self._period:
+            self._sum -= self._window.popleft()
+        self._push(self._sum / self._period if len(self._window) == self._period else nan)
+
+
+class EMA(Indicator):
+    """seeded with SMA of the first period values, as talib does"""
+    def __init__(self, period: int, source: str = "close"):
+        super().__init__()
+        self._period = period
+        self._source = source
+        self._k = 2. / (period + 1)
+        self._count = 0
+        self._sum = 0.
+
+    def update(self, bar: Bar):
+        self._update(getattr(bar, self._source))
+
+    def _update(self, x: float):
+        self._count += 1
+        if self._count < self._period:
+            self._sum += x
+            self._push(nan)
+        elif self._count == self._period:
+            self._push((self._sum + x) / self._period)
+        else:
+            self._push((x - self.value) * self._k + self.value)
+
+
+class RSI(Indicator):
+    """Wilder's smoothing, seeded with simple average of the first period gains and losses"""
+    def __init__(self, period: int = 14, source: str = "close"):
+        super().__init__()
+        self._period = period
+        self._source = source
+        self._count = 0
+        self._last = nan
+        self._avg_gain = 0.
+        self._avg_loss = 0.
+
+    def update(self, bar: Bar):
+        x = getattr(bar, self._source)
+        if self._count > 0:
+            diff = x - self._last
+            gain = diff if diff > 0 else 0.
+            loss = -diff if diff < 0 else 0.
+            if self._count <= self._period:
+                self._avg_gain += gain
+                self._avg_loss += loss
+                if self._count == self._period:
+                    self._avg_gain /= self._period
+                    self._avg_loss /= self._period
+            else:
+                self._avg_gain = (self._avg_gain * (self._period - 1) + gain) / self._period
+                self._avg_loss = (self._avg_loss * (self._period - 1) + loss) / self._period
+        self._last = x
+        if self._count >= self._period:
+            total = self._avg_gain + self._avg_loss
+            self._push(100 * self._avg_gain / total if total != 0 else 0.)
+        else:
+            self._push(nan)
+        self._count += 1
+
+
+class ATR(Indicator):
+    """true range smoothed by Wilder's method, first value is average of the first period true ranges"""
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self._period = period
+        self._count = 0
+        self._last_close = nan
+        self._atr = 0.
+
+    def update(self, bar: Bar):
+        if self._count > 0:
+            tr = max(bar.high - bar.low, abs(bar.high - self._last_close), abs(bar.low - self._last_close))
+            if self._count <= self._period:
+                self._atr += tr
+                if self._count == self._period:
+                    self._atr /= self._period
+            else:
+                self._atr = (self._atr * (self._period - 1) + tr) / self._period
+        self._last_close = bar.close
+        self._push(self._atr if self._count >= self._period else nan)
+        self._count += 1
+
+
+class MACD(Indicator):
+    """
+    talib compatible MACD: the fast EMA is seeded on the same bar as the slow one,
+    and all three lines stay NaN until the signal line is available.
+    value is the MACD line.
+    """
+    def __init__(self, fastperiod: int = 12, slowperiod: int = 26, signalperiod: int = 9, source: str = "close"):
+        super().__init__()
+        self._source = source
+        self._slowperiod = slowperiod
+        self._fast_skip = slowperiod - fastperiod
+        self._fast = EMA(fastperiod)
+        self._slow = EMA(slowperiod)
+        self._signal = EMA(signalperiod)
+        self._count = 0
+        self.macd = self
+        self.signal = Line()
+        self.hist = Line()
+
+    def update(self, bar: Bar):
+        x = getattr(bar, self._source)
+        self._slow._update(x)
+        if self._count >= self._fast_skip:
+            self._fast._update(x)
+        self._count += 1
+        if self._count >= self._slowperiod:
+            macd = self._fast.value - self._slow.value
+            self._signal._update(macd)
+            if not isnan(self._signal.value):
+                self._push(macd)
+                self.signal._push(self._signal.value)
+                self.hist._push(macd - self._signal.value)
+                return
+        self._push(nan)
+        self.signal._push(nan)
+        self.hist._push(nan)
+
+
+class _Extremum(Indicator):
+    """monotonic deque of candidate extremes, O(1) amortized per bar"""
+    def __init__(self, period: int, source: str, better: Callable[[float, float], bool]):
+        super().__init__()
+        self._period = period
+        self._source = source
+        self._better = better
+        self._candidates = deque()
+        self._count = 0
+
+    def update(self, bar: Bar):
+        x = getattr(bar, self._source)
+        while self._candidates and not self._better(self._candidates[-1][1], x):
+            self._candidates.pop()
+        self._candidates.append((self._count, x))
+        if self._candidates[0][0] <= self._count - self._period:
+            self._candidates.popleft()
+        self._count += 1
+        self._push(self._candidates[0][1] if self._count >= self._period else nan)
+
+
+class MIN(_Extremum):
+    def __init__(self, period: int, source: str = "low"):
+        super().__init__(period, source, lambda candidate, x: candidate < x)
+
+
+class MAX(_Extremum):
+    def __init__(self, period: int, source: str = "high"):
+        super().__init__(period, source, lambda candidate, x: candidate > x)
+
+
+class HLC3(Indicator):
+    def update(self, bar: Bar):
+        self._push((bar.high + bar.low + bar.close) / 3)
+
+
+class Cross:
+    """crossing state of two lines as of the last bar, see ta.crossover / ta.crossunder"""
+    def __init__(self, a: Line, b: Line):
+        self._a = a
+        self._b = b
+
+    @property
+    def over(self) -> bool:
+        return self._a.previous < self._b.previous and self._a.value > self._b.value
+
+    @property
+    def under(self) -> bool:
+        return self._a.previous > self._b.previous and self._a.value < self._b.value
+
+
+# bars kept to replay indicators requested late. EMA and Wilder smoothing forget their seed within this many bars
+# for periods up to ~100, so replayed values agree with those over the whole series up to rounding
+DEFAULT_HISTORY = 1000
+
+
+class IndicatorBank:
+    """
+    Indicators requested by a strategy, updated with every new bar of the ticker.
+    An indicator requested for the first time is replayed over the last history bars seen so far,
+    later requests with the same parameters return the same instance. Requested once more bars than history were
+    fed, an indicator needing more than history bars raises ValueError, it could never get a value.
+    Memory stays bounded however long the ticker runs
+    """
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        self._bars: deque = deque(maxlen=history)
+        self._count = 0
+        self._indicators: Dict[Tuple, Indicator] = {}
+
+    def __len__(self) -> int:
+        """number of bars fed"""
+        return self._count
+
+    def feed(self, bar: Bar):
+        self._bars.append(bar)
+        self._count += 1
+        for indicator in self._indicators.values():
+            indicator.update(bar)
+
+    def reset(self):
+        self._bars.clear()
+        self._count = 0
+        self._indicators = {}
+
+    def _get(self, key: Tuple, factory: Callable[[], Indicator], bars_needed: int = 1) -> Indicator:
+        indicator = self._indicators.get(key)
+        if indicator is None:
+            if self._count > len(self._bars) and bars_needed > len(self._bars):
+                raise ValueError(f"{key[0]} needs {bars_needed} bars, only the last {len(self._bars)} bars are kept: "
+                                 f"request it before feeding bars or raise history")
+            indicator = factory()
+            for bar in self._bars:
+                indicator.update(bar)
+            self._indicators[key] = indicator
+        return indicator
+
+    def sma(self, period: int, source: str = "close") -> SMA:
+        return self._get(("sma", period, source), lambda: SMA(period, source), period)
+
+    def ema(self, period: int, source: str = "close") -> EMA:
+        return self._get(("ema", period, source), lambda: EMA(period, source), period)
+
+    def rsi(self, period: int = 14, source: str = "close") -> RSI:
+        return self._get(("rsi", period, source), lambda: RSI(period, source), period + 1)
+
+    def atr(self, period: int = 14) -> ATR:
+        return self._get(("atr", period), lambda: ATR(period), period + 1)
+
+    def macd(self, fastperiod: int = 12, slowperiod: int = 26, signalperiod: int = 9, source: str = "close") -> MACD:
+        return self._get(("macd", fastperiod, slowperiod, signalperiod, source), lambda: MACD(fastperiod, slowperiod, signalperiod, source), slowperiod + signalperiod - 1)
+
+    def min(self, period: int, source: str = "low") -> MIN:
+        return self._get(("min", period, source), lambda: MIN(period, source), period)
+
+    def max(self, period: int, source: str = "high") -> MAX:
+        return self._get(("max", period, source), lambda: MAX(period, source), period)
+
+    def hlc3(self) -> HLC3:
+        return self._get(("hlc3",), HLC3)
+
+    def cross(self, a: Line, b: Line) -> Cross:
+        return Cross(a, b)
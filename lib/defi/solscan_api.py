@@ -1,16 +1,17 @@
 import requests, time
 from typing import Optional, Any
+from lib.common import rate_limiter
 
 API_URI = 'https://public-api.solscan.io'
 
 class Solscan:
     def __init__(self, account: str):
         self._account = account
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
         request = requests.Request(method, API_URI + path, **kwargs)
-        response = self._session.send(request.prepare())
+        response = rate_limiter.send("solscan", lambda: self._session.send(request.prepare(), timeout=rate_limiter.request_timeout()))
         return self._process_response(response)
 
     def _get(self, path: str, params: Optional[dict[str, Any]] = None) -> Any:
@@ -1,23 +1,25 @@
-from lib.market_data_providers.provider_poloniex import MarketDataProviderPoloniex
+import importlib, threading
+from typing import Dict, List, Tuple
 from .interface import MarketDataProvider
-from .provider_binance import MarketDataProviderBinance
-from .provider_ftx import MarketDataProviderFTX
-from .provider_poloniex import MarketDataProviderPoloniex
-from .provider_yfinance import MarketDataProviderYF
-from .provider_coingecko import MarketDataProviderCoingecko
-from .provider_fallback import MarketDataProviderFallback
 
 
 class MarketDataProviderFlyweight:
+    '''
+    providers, and the modules implementing them, are loaded on first use,
+    so that a command only pays for the providers of the assets it touches
+    '''
+    _classes: Dict[str, Tuple[str, str]] = {
+        "binance":  ("provider_binance",   "MarketDataProviderBinance"),
+        "ftx":      ("provider_ftx",       "MarketDataProviderFTX"),
+        "poloniex": ("provider_poloniex",  "MarketDataProviderPoloniex"),
+        "yf":       ("provider_yfinance",  "MarketDataProviderYF"),
+        "cg":       ("provider_coingecko", "MarketDataProviderCoingecko"),
+        "fallback": ("provider_fallback",  "MarketDataProviderFallback"),
+    }
+
     def __init__(self):
-        self._map = {
-            "binance": MarketDataProviderBinance(),
-            "ftx": MarketDataProviderFTX(),
-            "poloniex": MarketDataProviderPoloniex(),
-            "yf": MarketDataProviderYF(),
-            "cg": MarketDataProviderCoingecko(),
-            "fallback": MarketDataProviderFallback(),
-        }
+        self._map: Dict[str, MarketDataProvider] = {}
+        self._lock = threading.Lock()
         self._prioritylist = [
             "binance",
             "ftx",
@@ -26,11 +28,31 @@ class MarketDataProviderFlyweight:
             "cg",
             "fallback",
         ]
-    
-    def get(self, asset: str, method: str) -> MarketDataProvider:
+
+    def get_id(self, asset: str, method: str) -> str:
         for id in self._prioritylist:
-            prov = self._map[id]
+            prov = self.get_by_id(id)
             if method in prov.get_supported_methods(asset):
                 #print(f"MarketDataProvider: {method}({asset}) handled by {id}")
-                return prov
+                return id
         raise ValueError(f"{asset} market data unobtainable")
+
+    def get_by_id(self, id: str) -> MarketDataProvider:
+        with self._lock:
+            prov = self._map.get(id)
+            if prov is None:
+                module_name, class_name = MarketDataProviderFlyweight._classes[id]
+                module = importlib.import_module(f".{module_name}", __package__)
+                prov = getattr(module, class_name)()
+                self._map[id] = prov
+            return prov
+
+    def get(self, asset: str, method: str) -> MarketDataProvider:
+        return self.get_by_id(self.get_id(asset, method))
+
+    def warm_up(self, ids: List[str] = None):
+        '''
+        create given providers, all by default, and load their snapshots ahead of first use. Meant for long running processes
+        '''
+        for id in ids or self._prioritylist:
+            self.get_by_id(id).warm_up()
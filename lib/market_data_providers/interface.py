@@ -7,10 +7,18 @@ class MarketDataProvider(object):
     def get_supported_methods(self, asset: str) -> List[str]:
         """return a list of supported methods for the asset"""
 
+    def warm_up(self):
+        """load data shared by all assets ahead of first use, e.g. price snapshots. Providers without such data do nothing"""
+
     @abstractmethod
     def get_market_price(self, asset: str) -> float:
         """return last price the instrument was trading at"""
 
+    def get_market_prices(self, assets: List[str]) -> Dict[str, float]:
+        """return last prices of many assets, keyed by asset. Assets the provider has no price for may be left out.
+        Providers with a bulk endpoint override this"""
+        return {asset: self.get_market_price(asset) for asset in assets}
+
     @abstractmethod
     def get_market_cap(self, asset: str) -> int:
         """return market cap in USD"""
@@ -1,7 +1,8 @@
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 from .interface import MarketDataProvider
 from lib.common.id_map_binance import id_to_binance
 from lib.trader.binance_api import Binance as BinanceAPI
+from lib.common.snapshot import IndexedSnapshot
 import pandas as pd
 
 def id_to_ticker(id: str) -> Tuple[str, bool]:
@@ -13,7 +14,7 @@ def id_to_ticker(id: str) -> Tuple[str, bool]:
 
 class MarketDataProviderBinance(MarketDataProvider):
     def __init__(self):
-        self._crypto_prices = BinanceAPI().get_prices()
+        self._crypto_prices = IndexedSnapshot(BinanceAPI().get_prices, "symbol")
 
     def get_supported_methods(self, asset: str) -> List[str]:
         if asset in id_to_binance.keys():
@@ -24,12 +25,24 @@ class MarketDataProviderBinance(MarketDataProvider):
         else:
             return []
 
+    def warm_up(self):
+        self._crypto_prices.values()
+
 
     def get_market_price(self, asset: str) -> float:
         ticker, reverse = id_to_ticker(asset)
-        price = float([x['price'] for x in self._crypto_prices if x['symbol'] == ticker][0])
+        price = float(self._crypto_prices.get(ticker)['price'])
         return 1 / price if reverse else price
 
+    def get_market_prices(self, assets: List[str]) -> Dict[str, float]:
+        result = {}
+        for asset in assets:
+            ticker, reverse = id_to_ticker(asset)
+            if ticker in self._crypto_prices:
+                price = float(self._crypto_prices.get(ticker)['price'])
+                result[asset] = 1 / price if reverse else price
+        return result
+
     def get_historical_bars(self, asset: str, days_before: int)->pd.DataFrame:
         ticker, reverse = id_to_ticker(asset)
         candles = BinanceAPI().get_candles_by_limit(ticker, "1d", limit=days_before)
@@ -1,7 +1,8 @@
-from typing import List
+from typing import List, Dict
 from math import nan
 from .interface import MarketDataProvider
 from lib.common.misc import is_crypto
+from lib.common import rate_limiter
 from lib.common.yaml_id_maps import get_id_map_by_key
 cg_known_coins = get_id_map_by_key("cg_known_coins")
 
@@ -27,11 +28,16 @@ class MarketDataProviderCoingecko(MarketDataProvider):
 
 
     def get_market_price(self, asset: str) -> float:
-        price_data = self._cg.get_price(ids=[asset], vs_currencies="usd", include_24hr_change="false")
+        price_data = rate_limiter.call("cg", self._cg.get_price, ids=[asset], vs_currencies="usd", include_24hr_change="false")
         return float(price_data[asset]['usd'])
 
+    def get_market_prices(self, assets: List[str]) -> Dict[str, float]:
+        price_data = rate_limiter.call("cg", self._cg.get_price, ids=list(assets), vs_currencies="usd", include_24hr_change="false")
+        # ids unknown to coingecko are missing in the response, and so in the result
+        return {asset: float(price_data[asset]['usd']) for asset in assets if asset in price_data}
+
     def get_historical_bars(self, asset: str, days_before: int)->pd.DataFrame:
-        cg_candles = self._cg.get_coin_ohlc_by_id(asset, "usd", 30)
+        cg_candles = rate_limiter.call("cg", self._cg.get_coin_ohlc_by_id, asset, "usd", 30)
         candles =[]
         current_ic = 0
         last_ic = len(cg_candles)
@@ -61,7 +67,7 @@ class MarketDataProviderCoingecko(MarketDataProvider):
 
     def _get_cached(self, asset: str):
         if self._cached is None:
-            market_cap_list = self._cg.get_coins_markets(ids=cg_known_coins, vs_currency="usd")
+            market_cap_list = rate_limiter.call("cg", self._cg.get_coins_markets, ids=cg_known_coins, vs_currency="usd")
             self._cached = {}
             for entry in market_cap_list:
                 self._cached [entry['id']] = entry
@@ -1,14 +1,15 @@
-from typing import List
+from typing import List, Dict
 from .interface import MarketDataProvider
 from lib.trader.ftx_api import FtxPublic
 from lib.common.id_map_ftx import id_to_ftx
+from lib.common.snapshot import IndexedSnapshot
 import pandas as pd
 import datetime
 
 class MarketDataProviderFTX(MarketDataProvider):   
     def __init__(self):
         self._api = FtxPublic()
-        self._markets = None
+        self._markets = IndexedSnapshot(self._api.get_markets, "name")
 
     def get_supported_methods(self, asset: str) -> List[str]:
         if asset in id_to_ftx.keys():
@@ -19,15 +20,18 @@ class MarketDataProviderFTX(MarketDataProvider):
         else:
             return []
 
+    def warm_up(self):
+        self._markets.values()
+
     def _get_market(self, market: str):
-        if self._markets is None:
-            self._markets = self._api.get_markets()
-        market = [m for m in self._markets if m['name'] ==  market][0]
-        return market
+        return self._markets.get(market)
 
     def get_market_price(self, asset: str) -> float:
         return self._get_market(id_to_ftx[asset])['price']
 
+    def get_market_prices(self, assets: List[str]) -> Dict[str, float]:
+        return {asset: self._get_market(id_to_ftx[asset])['price'] for asset in assets if id_to_ftx[asset] in self._markets}
+
     def get_historical_bars(self, asset: str, days_before: int)->pd.DataFrame:
         t = int(datetime.datetime.now().timestamp())
         seconds_per_day = 3600 * 24
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Dict
 from datetime import datetime
 from .interface import MarketDataProvider
 from lib.common.id_map_poloniex import id_to_poloniex
@@ -23,6 +23,10 @@ class MarketDataProviderPoloniex(MarketDataProvider):
     def get_market_price(self, asset: str) -> float:
         return self._api.returnTicker(id_to_poloniex[asset])
 
+    def get_market_prices(self, assets: List[str]) -> Dict[str, float]:
+        prices = self._api.returnTickers([id_to_poloniex[asset] for asset in assets])
+        return {asset: prices[id_to_poloniex[asset]] for asset in assets if id_to_poloniex[asset] in prices}
+
     def get_historical_bars(self, asset: str, days_before: int)->pd.DataFrame:
         ts_end = datetime.datetime.now().timestamp()
         ts_start = ts_end - days_before * 24 * 3600
@@ -5,20 +5,26 @@
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-import datetime, pathlib, pickledb
+import datetime, threading
 from math import nan, isclose
 from typing import Any
 import pandas as pd
 import yahoo_fin.stock_info as yfsi
-import logging
 from .interface import MarketDataProvider
 from lib.common.misc import is_crypto
+from lib.common import rate_limiter
+from lib.common.kv_store import KVStore
+
+
+def _seconds_until_utc_midnight() -> float:
+    now = datetime.datetime.utcnow()
+    return (datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()) - now).total_seconds()
 
 
 class StockInfoDb:
     def __init__(self):
-        pathlib.Path("cache/yf").mkdir(parents=True, exist_ok=True)
-        self.db = pickledb.load(f"cache/yf/info_{datetime.datetime.utcnow().strftime('%Y-%m-%d')}.db", auto_dump=True)
+        # info is refreshed daily, entries expire at the end of the UTC day
+        self.db = KVStore("yf_info")
     def get_info(self, ticker: str) -> str:
         existing_data = self.db.get(ticker)
         if existing_data:
@@ -26,21 +32,21 @@ class StockInfoDb:
         else:
             data ={}
             try:
-                data = yfsi.get_quote_data(ticker)
-                data |= yfsi.get_quote_table(ticker)
-                for _,cols in yfsi.get_stats(ticker).iterrows():
+                # missing data is common here, failures are not retried
+                data = rate_limiter.call("yf", yfsi.get_quote_data, ticker, retry=False)
+                data |= rate_limiter.call("yf", yfsi.get_quote_table, ticker, retry=False)
+                for _,cols in rate_limiter.call("yf", yfsi.get_stats, ticker, retry=False).iterrows():
                     data[cols['Attribute']] = cols['Value']
             except:
                 pass
             
-            self.db.set(ticker, data)
+            self.db.set(ticker, data, ttl_s=_seconds_until_utc_midnight())
             return data
 
 
 class CompanyInfoDb:
     def __init__(self):
-        pathlib.Path("cache/yf").mkdir(parents=True, exist_ok=True)
-        self.db = pickledb.load(f"cache/yf/companyinfo.db", auto_dump=True)
+        self.db = KVStore("yf_company_info", legacy_json="cache/yf/companyinfo.db")
     def get_company_info(self, ticker: str) -> str:
         existing_data = self.db.get(ticker)
         if existing_data:
@@ -48,7 +54,7 @@ class CompanyInfoDb:
         else:
             try:
                 data = {}
-                for index,cols in yfsi.get_company_info(ticker).iterrows():
+                for index,cols in rate_limiter.call("yf", yfsi.get_company_info, ticker, retry=False).iterrows():
                     data[index] = cols['Value']
             except:
                 pass
@@ -80,8 +86,10 @@ def decode_yf_percent_value(v: str, precision: int) -> float:
 
 class MarketDataProviderYF(MarketDataProvider):
     def __init__(self):
-        self._stock_info_db = StockInfoDb()
-        self._company_info_db = CompanyInfoDb()
+        # info databases are opened on first fundamentals request, price and bar requests don't need them
+        self._stock_info_db = None
+        self._company_info_db = None
+        self._lock = threading.Lock()
 
     def get_supported_methods(self, asset: str) -> list[str]:
         if not is_crypto(asset):
@@ -97,29 +105,26 @@ class MarketDataProviderYF(MarketDataProvider):
 
     def _get_history(self, asset: str, days: int, interval: str) -> Any:
         d_start = datetime.datetime.utcnow().timestamp() - days*60*60*24
-        return yfsi.get_data(ticker=asset,start_date=d_start, end_date=None, interval=interval)
+        return rate_limiter.call("yf", yfsi.get_data, ticker=asset,start_date=d_start, end_date=None, interval=interval)
 
     def _get_info(self, asset: str) -> Any:
+        with self._lock:
+            if self._stock_info_db is None:
+                self._stock_info_db = StockInfoDb()
         return self._stock_info_db.get_info(asset)
 
     def _get_companyinfo(self, asset: str) -> Any:
+        with self._lock:
+            if self._company_info_db is None:
+                self._company_info_db = CompanyInfoDb()
         return self._company_info_db.get_company_info(asset)
 
     def _get(self, asset: str, op: Any, **kwargs) -> Any:
-        retries = 3
-        while True:
-            try:
-                return op(asset, **kwargs)
-            except:
-                if retries > 0:
-                    retries -= 1
-                    logging.debug(f"YahooFinance exception - retrying, {retries} attempts remaining")
-                    continue
-                else:
-                    raise
+        # requests are rate limited and retried by rate_limiter.call
+        return op(asset, **kwargs)
 
     def get_market_price(self, asset: str) -> float:
-        return yfsi.get_live_price(asset)
+        return rate_limiter.call("yf", yfsi.get_live_price, asset)
 
     def get_market_cap(self, asset: str) -> int:
         info = self._get(asset, self._get_info)
@@ -1,66 +1,112 @@
 import sqlite3, datetime
-from typing import Tuple
+from typing import Dict, List, Tuple
+from lib.common import pnl
 from . historical_order import HistoricalOrder
 
+DEFAULT_PATH = 'config/dca.db'
+
+# statements upgrading the schema from version i to i+1, the version is kept in PRAGMA user_version
+_migrations: List[List[str]] = [
+    # per symbol queries ordered by date, the index covers all columns they read
+    [
+        "CREATE INDEX IF NOT EXISTS dca_sym_date ON dca (sym, date, qty, price)",
+        "CREATE INDEX IF NOT EXISTS dca_date ON dca (date)",
+    ],
+    # PnL state per symbol as of its orders up to last_date, see get_pnl_by_sym()
+    [
+        '''CREATE TABLE IF NOT EXISTS pnl_state (sym text PRIMARY KEY, position_qty real, average_buying_rate real,
+            cumulative_initial_buy_value real, cumulative_sell_value real, n_orders integer, last_date text)''',
+    ],
+]
+SCHEMA_VERSION = len(_migrations)
+
+
+def _row_to_order(qty: float, price: float, date: str) -> HistoricalOrder:
+    t = datetime.datetime.fromisoformat(date)
+    if qty < 0:
+        return HistoricalOrder(side="SELL", value=-qty*price, qty=-qty, timestamp=t)
+    return HistoricalOrder(side="BUY", value=qty*price, qty=qty, timestamp=t)
+
+
 class Db:
-    def __init__(self):
-        self.con = sqlite3.connect('config/dca.db')
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.con = sqlite3.connect(path)
         self.con.execute('''CREATE TABLE IF NOT EXISTS dca (date text, sym text, qty real, price real)''')
         self.con.commit()
+        self._migrate()
 
-    def add(self, sym: str, qty: float, price: float, timestamp: datetime.datetime=None ):
+    def _migrate(self):
+        version = self.con.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.con:
+            for statements in _migrations[version:]:
+                for statement in statements:
+                    self.con.execute(statement)
+            self.con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _insert(self, sym: str, qty: float, price: float, timestamp: datetime.datetime):
         if timestamp is None:
             timestamp = datetime.datetime.now()
-        self.con.execute("INSERT INTO dca VALUES (?,?,?,?)", (timestamp, sym, qty, price))
-        self.con.commit()
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.isoformat(" ")
+        # every row is a filled order, so it is committed right away
+        with self.con:
+            self.con.execute("INSERT INTO dca (date, sym, qty, price) VALUES (?,?,?,?)", (timestamp, sym, qty, price))
+
+    def add(self, sym: str, qty: float, price: float, timestamp: datetime.datetime=None ):
+        self._insert(sym, qty, price, timestamp)
 
     def remove(self, sym: str, qty: float, price: float, timestamp: datetime.datetime=None ):
-        if timestamp is None:
-            timestamp = datetime.datetime.now()
-        self.con.execute("INSERT INTO dca VALUES (?,?,?,?)", (timestamp, sym, -qty, price))
-        self.con.commit()
+        self._insert(sym, -qty, price, timestamp)
 
     def burn(self, sym: str, qty: float):
-        now = datetime.datetime.now()
-        self.con.execute("INSERT INTO dca VALUES (?,?,?,?)", (now, sym, -qty, 0))
-        self.con.commit()
+        self._insert(sym, -qty, 0, None)
 
     def delete_all(self, sym: str):
-        self.con.execute("DELETE FROM dca WHERE sym = ?", (sym,))
-        self.con.commit()
+        with self.con:
+            self.con.execute("DELETE FROM dca WHERE sym = ?", (sym,))
+            self.con.execute("DELETE FROM pnl_state WHERE sym = ?", (sym,))
 
     def get_syms(self) -> list:
-        syms = []
-        for row in self.con.execute(f"SELECT DISTINCT sym FROM dca"):
-            syms.append(row[0])
-        return syms
+        return [row[0] for row in self.con.execute("SELECT DISTINCT sym FROM dca ORDER BY sym")]
 
-    def _get_sym_trades(self, sym: str) -> Tuple[float, float, str]:
+    def _get_sym_trades(self, sym: str) -> List[Tuple[float, float, str]]:
         """returns [ [ [+-]coin_qty, price, date ] ]"""
-        trades = list()
-        for row in self.con.execute(f"SELECT qty,price,date FROM dca WHERE sym = '{sym}' ORDER BY date"):
-            entry =(row[0], row[1], row[2] )
-            trades.append(entry)
-        return trades
+        return self.con.execute("SELECT qty,price,date FROM dca WHERE sym = ? ORDER BY date", (sym,)).fetchall()
 
     def get_sym_available_qty(self, sym:str) -> float:
-        trades = self._get_sym_trades(sym)
-        return sum([i[0] for i in trades])
+        return self.con.execute("SELECT COALESCE(SUM(qty), 0) FROM dca WHERE sym = ?", (sym,)).fetchone()[0]
 
     def get_sym_orders(self, sym:str) -> list[HistoricalOrder]:
-        trades = self._get_sym_trades(sym)
-        orders:list[HistoricalOrder] = []
-        for i in trades:
-            t = datetime.datetime.fromisoformat(i[2])
-            if i[0] < 0:
-                o = HistoricalOrder(side="SELL", value=-i[0]*i[1], qty=-i[0], timestamp=t)
-            else:
-                o = HistoricalOrder(side="BUY", value=i[0]*i[1], qty=i[0], timestamp=t)
-            orders.append(o)
-        return orders
+        return [_row_to_order(*trade) for trade in self._get_sym_trades(sym)]
 
     def get_last_buy_timestamp(self) -> datetime.datetime:
-        ts = None
-        for row in self.con.execute(f"SELECT date FROM dca WHERE qty > 0 ORDER BY date DESC LIMIT 1"):
-            ts = datetime.datetime.fromisoformat(row[0])
-        return ts
\ No newline at end of file
+        row = self.con.execute("SELECT date FROM dca WHERE qty > 0 ORDER BY date DESC LIMIT 1").fetchone()
+        return None if row is None else datetime.datetime.fromisoformat(row[0])
+
+    def get_pnl_by_sym(self) -> Dict[str, pnl.PnLAccumulator]:
+        '''
+        PnL state after all orders of each symbol. Resumed from the states stored by the previous call, so only orders
+        added since are read; the updated states are stored again.
+        A stored state no longer matching the orders it was built from, e.g. after adding an order dated in the past,
+        is rebuilt from all orders of its symbol
+        '''
+        states = {row[0]: (pnl.PnLState(*row[1:6]), row[6]) for row in self.con.execute(
+            "SELECT sym, position_qty, average_buying_rate, cumulative_initial_buy_value, cumulative_sell_value, n_orders, last_date FROM pnl_state")}
+        counts = dict(self.con.execute("SELECT s.sym, COUNT(d.sym) FROM pnl_state s LEFT JOIN dca d ON d.sym = s.sym AND d.date <= s.last_date GROUP BY s.sym"))
+        outdated = [sym for sym, (state, _) in states.items() if counts[sym] != state.n_orders]
+        with self.con:
+            self.con.executemany("DELETE FROM pnl_state WHERE sym = ?", [(sym,) for sym in outdated])
+
+        accumulators = {sym: pnl.PnLAccumulator(state) for sym, (state, _) in states.items() if sym not in outdated}
+        last_dates = {sym: last_date for sym, (_, last_date) in states.items() if sym not in outdated}
+        for sym, qty, price, date in self.con.execute(
+                "SELECT d.sym, d.qty, d.price, d.date FROM dca d LEFT JOIN pnl_state s ON s.sym = d.sym WHERE s.sym IS NULL OR d.date > s.last_date ORDER BY d.sym, d.date"):
+            accumulators.setdefault(sym, pnl.PnLAccumulator()).add(_row_to_order(qty, price, date))
+            last_dates[sym] = date
+
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO pnl_state VALUES (?,?,?,?,?,?,?)",
+                [(sym, *accumulator.state, last_dates[sym]) for sym, accumulator in accumulators.items()])
+        return dict(sorted(accumulators.items()))
@@ -1,8 +1,8 @@
-import pickledb
+from lib.common.kv_store import KVStore
 
 class BlacklistDb:
     def __init__(self):
-        self._db = pickledb.load("cache/blacklist.db", auto_dump=True)
+        self._db = KVStore("screener_blacklist", legacy_json="cache/blacklist.db")
 
     def add_blacklist(self, ticker: str) -> None:
         self._db.set(ticker, True)
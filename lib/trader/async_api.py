@@ -0,0 +1,133 @@
+'''
+asyncio access to the synchronous exchange and data API clients.
+AsyncClient(Binance(...)) has the same methods as the wrapped client, returning coroutines. Each request runs
+on one of a fixed set of request threads, with the client's session of that thread (see rate_limiter.ThreadLocalSession),
+so connection pooling, keep-alive, request signing and the process-wide rate limits of lib.common.rate_limiter
+all stay as they are
+'''
+import asyncio, functools, queue, threading
+from typing import Any, Awaitable, Callable, Dict
+from lib.common import rate_limiter
+
+# enough to have a request in flight to every exchange at once
+MAX_CONCURRENT_REQUESTS = 16
+
+_jobs: "queue.SimpleQueue[Callable[[], None]]" = queue.SimpleQueue()
+_workers_lock = threading.Lock()
+_workers = 0
+_unfinished = 0
+
+
+def _resolve(future: asyncio.Future, result: Any, exception: BaseException):
+    if future.cancelled():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+def _worker():
+    global _unfinished
+    while True:
+        job = _jobs.get()
+        try:
+            job()
+        finally:
+            with _workers_lock:
+                _unfinished -= 1
+
+
+def _submit(job: Callable[[], None]):
+    '''
+    queues job for the request threads, starting another one while all are busy, up to MAX_CONCURRENT_REQUESTS
+    '''
+    global _workers, _unfinished
+    with _workers_lock:
+        _unfinished += 1
+        if _unfinished > _workers and _workers < MAX_CONCURRENT_REQUESTS:
+            _workers += 1
+            threading.Thread(target=_worker, name=f"async_api-{_workers}", daemon=True).start()
+    _jobs.put(job)
+
+
+def _run_in_thread(fn: Callable[[], Any], timeout_s: float) -> asyncio.Future:
+    '''
+    runs fn on a request thread, at most MAX_CONCURRENT_REQUESTS at once, the rest wait in the queue.
+    Request threads are daemons: unlike the workers of a ThreadPoolExecutor, which are joined at exit,
+    a call that never returns does not keep the process alive
+    '''
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    def job():
+        result, exception = None, None
+        try:
+            with rate_limiter.deadline(timeout_s):
+                result = fn()
+        except BaseException as e:
+            exception = e
+        try:
+            loop.call_soon_threadsafe(_resolve, future, result, exception)
+        except RuntimeError:
+            # the loop is closed, nobody waits for the result anymore
+            pass
+    _submit(job)
+    return future
+
+
+def to_async(fn: Callable[..., Any], timeout_s: float = None) -> Callable[..., Awaitable[Any]]:
+    '''
+    coroutine function running blocking fn on a request thread.
+    With timeout_s, the HTTP requests fn makes through lib.common.rate_limiter give up when it has passed,
+    see rate_limiter.deadline
+    '''
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await _run_in_thread(functools.partial(fn, *args, **kwargs), timeout_s)
+    return wrapper
+
+
+class AsyncClient:
+    '''
+    asyncio variant of a synchronous API client, e.g. AsyncClient(Ftx(key, secret, subaccount)).
+    Public methods of the client become coroutine functions, other attributes are passed through
+    '''
+    def __init__(self, client: Any):
+        self._client = client
+
+    @property
+    def sync(self) -> Any:
+        '''
+        the wrapped synchronous client
+        '''
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        return to_async(attr)
+
+
+async def gather(calls: Dict[str, Awaitable[Any]], timeout_s: float = None) -> Dict[str, Any]:
+    '''
+    awaits calls concurrently, returns their results by name.
+    The result of a call that raised or did not complete within timeout_s is its exception
+    '''
+    async def result_or_exception(call: Awaitable[Any]) -> Any:
+        try:
+            return await asyncio.wait_for(call, timeout_s)
+        except Exception as e:
+            return e
+    results = await asyncio.gather(*[result_or_exception(call) for call in calls.values()])
+    return dict(zip(calls.keys(), results))
+
+
+def run_concurrently(calls: Dict[str, Callable[[], Any]], timeout_s: float = None) -> Dict[str, Any]:
+    '''
+    synchronous entry point for callers outside of asyncio: runs blocking calls concurrently, see gather.
+    Their HTTP requests time out with timeout_s. A call still running after it, e.g. in a third party client
+    without timeouts, is left to finish in the background and its result is dropped. It does not delay the exit
+    of the process
+    '''
+    return asyncio.run(gather({name: to_async(fn, timeout_s)() for name, fn in calls.items()}, timeout_s))
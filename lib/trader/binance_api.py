@@ -1,6 +1,7 @@
 import random, requests, datetime, math
 from typing import Optional, Dict, Any
 from .. common.convert import timeframe_to_interval_ms
+from .. common import rate_limiter
 
 API_URIS = [
     "https://api.binance.com",
@@ -14,17 +15,37 @@ def get_random_api_uri():
     return random.choice(API_URIS)
 
 
+def get_request_weight(path: str, params: Optional[Dict[str, Any]]) -> int:
+    '''
+    request weight counted against the limit of 1200 per minute, see https://binance-docs.github.io/apidocs/spot/en/#limits
+    '''
+    params = params or {}
+    if path == "/api/v3/depth":
+        limit = params.get('limit', 100)
+        return 5 if limit <= 100 else 25 if limit <= 500 else 50 if limit <= 1000 else 250
+    if path == "/api/v3/klines":
+        limit = params.get('limit', 500)
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == "/api/v3/ticker/price":
+        return 2 if 'symbol' in params else 4
+    if path == "/api/v3/ticker/24hr":
+        return 2 if 'symbol' in params else 80
+    return 2
+
+
 def datetime_iso_to_binance(dt: str)->int:
     return math.floor(datetime.datetime.fromisoformat(dt).replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
 
 
 class Binance:
     def __init__(self) -> None:
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = requests.Request(method, get_random_api_uri() + path, **kwargs)
-        response = self._session.send(request.prepare())
+        def send() -> requests.Response:
+            request = requests.Request(method, get_random_api_uri() + path, **kwargs)
+            return self._session.send(request.prepare(), timeout=rate_limiter.request_timeout())
+        response = rate_limiter.send("binance", send, weight=get_request_weight(path, kwargs.get('params')), idempotent=method == 'GET')
         return self._process_response(response)
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
@@ -79,14 +100,19 @@ class Binance:
         return self._get_candles(pair, interval, limit=limit)
 
     def get_candles_by_range(self, pair: str, interval: str, dt_start: str, dt_end: str) -> dict:
+        return self.get_candles_by_range_ms(pair, interval, datetime_iso_to_binance(dt_start), datetime_iso_to_binance(dt_end))
+
+    def get_candles_by_range_ms(self, pair: str, interval: str, ts_start: int, ts_end: int) -> dict:
+        '''
+        candles opened between ts_start and ts_end, both inclusive
+        '''
         candles = []
-        ts_start = datetime_iso_to_binance(dt_start)
-        ts_end = datetime_iso_to_binance(dt_end)
         # default binance limit is 500 candles per call, so make sure we are below it
         step =  timeframe_to_interval_ms[interval] * 300
         pos = ts_start
-        while pos < ts_end:
-            next_candles =self._get_candles(pair, interval, ts_start=pos, ts_end=min(pos+step,ts_end))
+        while pos <= ts_end:
+            # startTime and endTime are both inclusive, chunks must not overlap
+            next_candles =self._get_candles(pair, interval, ts_start=pos, ts_end=min(pos+step-1,ts_end))
             pos += step
             candles += next_candles
         return candles
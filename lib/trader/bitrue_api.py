@@ -1,6 +1,7 @@
 import hmac, time, datetime, requests
 from urllib.parse import urlencode
 from typing import Optional, Dict, Any
+from lib.common import rate_limiter
 
 API_URI = "https://www.bitrue.com"
 
@@ -23,7 +24,7 @@ class Bitrue:
     def __init__(self, api_key: str, secret: str) -> None:
         self._api_key = api_key
         self._secret = secret
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         return self._request('GET', path, params=params)
@@ -35,13 +36,16 @@ class Bitrue:
         return self._request('DELETE', path, params=params)
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = requests.Request(method, API_URI + path, **kwargs)
-        self._sign_request(request)
-        response = self._session.send(request.prepare())
+        def send() -> requests.Response:
+            request = requests.Request(method, API_URI + path, **kwargs)
+            self._sign_request(request)
+            return self._session.send(request.prepare(), timeout=rate_limiter.request_timeout())
+        response = rate_limiter.send("bitrue", send, idempotent=method == 'GET')
         return self._process_response(response)
 
     def _sign_request(self, request: requests.Request) -> None:
         request.headers['X-MBX-APIKEY'] = self._api_key
+        request.params = dict(request.params)
         request.params['timestamp'] = int(time.time() * 1000)
         request.params['recvWindow'] = 5000
         signature_payload = urlencode(request.params).encode('utf-8')
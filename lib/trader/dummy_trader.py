@@ -1,7 +1,7 @@
 import re
 from typing import Tuple
 from lib.trader.trader import Trader
-from lib.common.market_data import MarketData
+from lib.common.market_data import get_market_data
 from math import ceil
 
 class DummyTrader(Trader):
@@ -20,7 +20,7 @@ class DummyTrader(Trader):
             self._sym = sym
 
     def buy_market(self, qty: float, qty_in_usd: bool) -> Tuple[float,float]:
-        market_data = MarketData()
+        market_data = get_market_data()
         market_price = market_data.get_market_price(self._sym)
         qty_sym = qty / market_price if qty_in_usd else qty
         qty_sym = qty_sym if self._fractional else ceil(qty_sym)
@@ -28,7 +28,7 @@ class DummyTrader(Trader):
         return [market_price, qty_sym]
 
     def sell_market(self, qty_sym: float) -> Tuple[float,float]:
-        market_data = MarketData()
+        market_data = get_market_data()
         market_price = market_data.get_market_price(self._sym)
         qty_sym = qty_sym if self._fractional else ceil(qty_sym)
         print(f"SIMULATE: selling {round(qty_sym,8)} {self._sym_original_name} at {round(market_price,8)}")
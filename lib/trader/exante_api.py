@@ -2,6 +2,7 @@ import logging
 from typing import Any
 from xnt.http_api import HTTPApi, AuthMethods
 from xnt.models.http_api_models import OrderMarketV2, Reject, FeedLevel
+from lib.common import rate_limiter
 
 API_URI_DEMO="https://api-demo.exante.eu"
 API_URI_LIVE="https://api-live.exante.eu"
@@ -19,31 +20,32 @@ class Exante:
         self._accountid = accountid
 
     def get_account_summary(self):
-        return self._api.get_account_summary(account=self._accountid, currency="USD")
+        return rate_limiter.call("exante", self._api.get_account_summary, account=self._accountid, currency="USD")
 
     def get_last_quote(self, sym: str):
-        last_quote = self._api.get_last_quote(sym, level=FeedLevel.BEST_PRICE)
+        last_quote = rate_limiter.call("exante", self._api.get_last_quote, sym, level=FeedLevel.BEST_PRICE)
         return { 'bid': last_quote[0].bid[0].value, 'ask': last_quote[0].ask[0].value }
 
     def get_min_qty(self, sym: str) -> float:
-        return self._api.get_symbol_spec(sym).lot_size
+        return rate_limiter.call("exante", self._api.get_symbol_spec, sym).lot_size
 
     def place_market_order(self, sym: str, side: str, size: float, duration: str) -> str:
-        result = self._api.place_order(OrderMarketV2(account_id=self._accountid, instrument=sym, side=side, quantity=size, duration=duration))
+        result = rate_limiter.call("exante", self._api.place_order, OrderMarketV2(account_id=self._accountid, instrument=sym, side=side, quantity=size, duration=duration), retry=False)
         result = result[0]
         if isinstance(result, Reject):
             raise ExanteRejectError(result)
         return result.id_
 
     def get_order(self, order_id: str) -> Any:
-        return self._api.get_order(order_id)
+        return rate_limiter.call("exante", self._api.get_order, order_id)
 
     def cancel_order(self, order_id: str) -> None:
-        return self._api.cancel_order(order_id)
+        return rate_limiter.call("exante", self._api.cancel_order, order_id, retry=False)
 
     def is_valid_symbol(self, sym: str) -> bool:
         log_level = self._api.logger.level          # save current log level
         self._api.logger.setLevel(logging.CRITICAL) # prevent 404 response spam on failed get_symbol
-        r = self._api.get_symbol(sym) is not None
+        # unknown symbol is an expected failure here, not retried
+        r = rate_limiter.call("exante", self._api.get_symbol, sym, retry=False) is not None
         self._api.logger.setLevel(log_level)        # restore saved log level
         return r
\ No newline at end of file
@@ -1,5 +1,6 @@
 import hashlib, hmac, time, json, requests, urllib
 from typing import Optional, Dict, Any, List
+from lib.common import rate_limiter
 
 
 class FtxQueryError(Exception):
@@ -18,10 +19,10 @@ class FtxPublic:
     API_URI = "https://ftx.com/api"
 
     def __init__(self) -> None:
-        pass
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
-        response = requests.get(FtxPublic.API_URI + path, params=params)
+        response = rate_limiter.send("ftx", lambda: self._session.get(FtxPublic.API_URI + path, params=params, timeout=rate_limiter.request_timeout()))
         try:
             data = response.json()
         except ValueError:
@@ -53,7 +54,7 @@ class Ftx:
         self._api_key = api_key
         self._secret = secret
         self._subaccount = subaccount
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
@@ -66,9 +67,11 @@ class Ftx:
         return self._request('DELETE', path, json=params)
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = requests.Request(method, Ftx.API_URI + path, **kwargs)
-        self._sign_request(request)
-        response = self._session.send(request.prepare())
+        def send() -> requests.Response:
+            request = requests.Request(method, Ftx.API_URI + path, **kwargs)
+            self._sign_request(request)
+            return self._session.send(request.prepare(), timeout=rate_limiter.request_timeout())
+        response = rate_limiter.send("ftx", send, idempotent=method == 'GET')
         return self._process_response(response)
 
     def _sign_request(self, request: requests.Request) -> None:
@@ -1,6 +1,7 @@
 import hmac, time, requests
 from urllib.parse import urlencode
 from typing import Optional, Any
+from lib.common import rate_limiter
 
 class MexcQueryError(Exception):
     def __init__(self, status_code: int, data: dict):
@@ -14,7 +15,7 @@ class Mexc:
     def __init__(self, api_key: str, secret: str) -> None:
         self._api_key = api_key
         self._secret = secret
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _get(self, path: str, params: Optional[dict[str, Any]] = None) -> Any:
         return self._request('GET', path, params=params)
@@ -26,9 +27,11 @@ class Mexc:
         return self._request('DELETE', path, json=params)
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = requests.Request(method, Mexc.API_URI + path, **kwargs)
-        self._sign_request(request)
-        response = self._session.send(request.prepare())
+        def send() -> requests.Response:
+            request = requests.Request(method, Mexc.API_URI + path, **kwargs)
+            self._sign_request(request)
+            return self._session.send(request.prepare(), timeout=rate_limiter.request_timeout())
+        response = rate_limiter.send("mexc", send, idempotent=method == 'GET')
         return self._process_response(response)
 
     def _sign_request(self, request: requests.Request) -> None:
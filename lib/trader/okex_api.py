@@ -1,5 +1,6 @@
 import hmac, datetime, requests, codecs
 from typing import Optional, Any
+from lib.common import rate_limiter
 
 
 class OkexQueryError(Exception):
@@ -21,7 +22,7 @@ class Okex:
         self._api_key = api_key
         self._secret = secret
         self._passphrase = passphrase
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
     def _get(self, path: str, params: Optional[dict[str, Any]] = None) -> Any:
         return self._request('GET', path, params=params)
@@ -33,9 +34,11 @@ class Okex:
         return self._request('DELETE', path, json=params)
 
     def _request(self, method: str, path: str, **kwargs) -> Any:
-        request = requests.Request(method, Okex.API_URI + path, **kwargs)
-        self._sign_request(request)
-        response = self._session.send(request.prepare())
+        def send() -> requests.Response:
+            request = requests.Request(method, Okex.API_URI + path, **kwargs)
+            self._sign_request(request)
+            return self._session.send(request.prepare(), timeout=rate_limiter.request_timeout())
+        response = rate_limiter.send("okex", send, idempotent=method == 'GET')
         return self._process_response(response)
 
     def _sign_request(self, request: requests.Request) -> None:
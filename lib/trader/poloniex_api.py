@@ -1,6 +1,7 @@
 import hashlib, hmac, time, urllib, requests
 from lib.common.convert import timeframe_to_interval_ms
 from typing import Optional
+from lib.common import rate_limiter
 
 
 POLONIEX_PUBLIC_API = "https://poloniex.com/public"
@@ -23,29 +24,31 @@ class Poloniex:
     def __init__(self, api_key: str, secret: str) -> None:
         self._api_key = api_key
         self._secret = secret
-        self._session = requests.Session()
+        self._session = rate_limiter.ThreadLocalSession()
 
 
     def _post(self, command: str, data: dict={}) -> dict:
-        post_data = {
-            "command": command,
-            "nonce": int(time.time() * 1000),
-            **data
-        }
-        post_data_quote = urllib.parse.urlencode(post_data)
-        sign = hmac.new(str.encode(self._secret, "utf-8"), str.encode(post_data_quote, "utf-8"), hashlib.sha512).hexdigest()
-        headers = {
-            "Sign": sign,
-            "Key": self._api_key
-        }
-        return self._check_resp(self._session.post(POLONIEX_PRIVATE_API, data=post_data, headers=headers))
+        def send() -> requests.Response:
+            post_data = {
+                "command": command,
+                "nonce": int(time.time() * 1000),
+                **data
+            }
+            post_data_quote = urllib.parse.urlencode(post_data)
+            sign = hmac.new(str.encode(self._secret, "utf-8"), str.encode(post_data_quote, "utf-8"), hashlib.sha512).hexdigest()
+            headers = {
+                "Sign": sign,
+                "Key": self._api_key
+            }
+            return self._session.post(POLONIEX_PRIVATE_API, data=post_data, headers=headers, timeout=rate_limiter.request_timeout())
+        return self._check_resp(rate_limiter.send("poloniex", send, idempotent=False))
 
     def _get(self, command: str, data: dict={}) -> dict:
         params = {
             "command": command,
             **data
         }
-        return self._check_resp(self._session.get(POLONIEX_PUBLIC_API, params=params))
+        return self._check_resp(rate_limiter.send("poloniex", lambda: self._session.get(POLONIEX_PUBLIC_API, params=params, timeout=rate_limiter.request_timeout())))
 
     def _check_resp(self, resp: requests.Response) -> dict:
         if resp.status_code != 200:
@@ -59,6 +62,14 @@ class Poloniex:
         data = self._get("returnTicker")
         return float(data.get(currencyPair, {})["last"])
 
+    def returnTickers(self, currencyPairs: list) -> dict:
+        '''
+        last prices of given pairs, from a single returnTicker call. Pairs not in the response are left out
+        https://docs.poloniex.com/#returnticker
+        '''
+        data = self._get("returnTicker")
+        return {pair: float(data[pair]["last"]) for pair in currencyPairs if pair in data}
+
     def return24hVolume(self) -> dict:
         '''
         # https://docs.poloniex.com/#return24hvolume
@@ -37,25 +37,8 @@ reports_dir="reports"
 
 
 # backtesting fast MA length
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=5,overprice_filter_ma_length=20 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_5_20.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=5,overprice_filter_ma_length=50 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_5_50.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=5,overprice_filter_ma_length=100 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_5_100.txt
-
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=20,overprice_filter_ma_length=20 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_20_20.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=20,overprice_filter_ma_length=50 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_20_50.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=20,overprice_filter_ma_length=100 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_20_100.txt
-
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=50,overprice_filter_ma_length=20 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_50_20.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=50,overprice_filter_ma_length=50 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_50_50.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=50,overprice_filter_ma_length=100 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_50_100.txt
-
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=100,overprice_filter_ma_length=20 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_100_20.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=100,overprice_filter_ma_length=50 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_100_50.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=100,overprice_filter_ma_length=100 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_100_100.txt
-
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=200,overprice_filter_ma_length=20 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_200_20.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=200,overprice_filter_ma_length=50 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_200_50.txt
-# python bots_demo.py --strategy=DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA --strategy-args=dca_base_quota=100,quota_factor_ma_length=200,overprice_filter_ma_length=100 --sym=bitcoin --backtest --pnl --account=1000000 --tf=1d --start=2017-09-01 --end=2021-09-01 > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA_200_100.txt
+# all 15 combinations in parallel, ranked by final equity:
+# python bots_demo.py --sweep=config/example.sweep.yml --csv=$reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA.csv > $reports_dir/DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA.txt
 ###
 #Results for above:
 # Q = quota factor SMA length
@@ -1,7 +1,13 @@
+import sys
+if "--profile-startup" in sys.argv:
+    from lib.common import startup_profile
+    startup_profile.enable()
+
 import argparse, yaml
+from concurrent.futures import ThreadPoolExecutor
 from math import nan
 from pandas.core.frame import DataFrame
-from lib.common.market_data import MarketData
+from lib.common.market_data import MarketData, get_market_data
 from lib.common.widgets import simple_progress_track
 from lib.common.misc import is_crypto, calc_raise_percent
 from lib.common.metrics import calc_discount_score, calc_heat_score
@@ -66,110 +72,132 @@ class FundamentalFilter:
         return ok
 
 
-def show_overview(assets: list[str], sort_by: str, columns: list[str], csvfile: str):
-    m = MarketData()
+def load_overview_row(m: MarketData, asset: str, columns: list[str]) -> dict:
+    '''
+    technical data of overview columns for asset, raises if it can't be loaded
+    '''
+    def should_include_column(col):
+        return columns is None or col in columns
+
+    d ={
+        'ticker': get_id_sym(asset),
+        'name': get_id_name(asset),
+
+        'sector':       nan,
+        'industry':     nan,
+        'supply,M':     nan,
+        'cap,M':        nan,
+        'vol,M':        nan,
+        'vol/cap,%':    nan,
+        'price':        nan,
+        'chg':          nan,
+        'chg%':         nan,
+        'w.chg':        nan,
+        'w.chg%':       nan,
+        'an.chg':       nan,
+        'an.chg%':      nan,
+        'mean':         nan,
+        'bottom':       nan,
+        'top':          nan,
+        'down,%':       nan,
+        'up mean,%':    nan,
+        'heat score':   nan,
+        'discount f.':  nan,
+        'tr P/E':       nan,
+        'fw P/E':       nan,
+        'P/B':          nan,
+        'd/e':          nan,
+        'div rate':     nan,
+        'div yield,%':  nan,
+        'expense,%':    nan,
+    }
+
+    if should_include_column("price") or should_include_column("down,%") or should_include_column("up mean,%") or should_include_column("heat score") or should_include_column("discount f."):
+        market_price = m.get_market_price(asset)
+        d['price'] = market_price
+    if should_include_column("mean") or should_include_column("up mean,%") or should_include_column("heat score"):
+        ma200_price = m.get_avg_price_n_days(asset,200)
+        d['mean'] = round(ma200_price,2)
+        d['up mean,%'] = round(calc_raise_percent(ma200_price,market_price),1)
+    if should_include_column("heat score"):
+        rsi = m.get_rsi(asset)
+    if should_include_column("down,%") or should_include_column("bottom") or should_include_column("top") or should_include_column("discount f.") or should_include_column("heat score"):
+        lo200,hi200 = m.get_lo_hi_n_days(asset,200)
+        d['bottom'] = round(lo200,2)
+        d['top'] = round(hi200,2)
+    if should_include_column("chg")  or should_include_column("chg%"):
+        chg,chg_p = m.get_daily_change(asset)
+        d['chg'] = round(chg,2)
+        d['chg%'] = round(chg_p,1)
+    if should_include_column("w.chg")  or should_include_column("w.chg%"):
+        wchg,wchg_p = m.get_weekly_change(asset)
+        d['w.chg'] = round(wchg,2)
+        d['w.chg%'] = round(wchg_p,1)
+    if should_include_column("an.chg")  or should_include_column("an.chg%"):
+        anchg,anchg_p = m.get_annual_change(asset)
+        d['an.chg'] = round(anchg,2)
+        d['an.chg%'] = round(anchg_p,1)
+    if should_include_column("heat score"):
+        heat_score = calc_heat_score(market_price=market_price, ma200=ma200_price, hi200=hi200, rsi=rsi)
+        d['heat score'] = round(heat_score,1)
+    if should_include_column("discount f."):
+        discount_factor = calc_discount_score(market_price=market_price, low=lo200, high=hi200)
+        d['discount f.'] = round(discount_factor,1)
+    if should_include_column("supply,M"):
+        supply = m.get_total_supply(asset)
+        d['supply,M'] = round(supply * 0.000001,1)
+    if should_include_column("cap,M") or should_include_column("vol/cap,%"):
+        mcap = m.get_market_cap(asset)
+        d['cap,M'] = round(mcap * 0.000001,1)
+    if should_include_column("vol,M") or should_include_column("vol/cap,%"):
+        vol  = m.get_total_volume(asset)
+        d['vol,M'] = round(vol * 0.000001,1)
+    if should_include_column("vol/cap,%"):
+        vol_mcap = vol / (mcap if mcap > 0 else nan)
+        d['vol/cap,%'] = round(vol_mcap * 100.0 ,1)
+    if should_include_column("down,%"):
+        d['down,%'] = round(calc_raise_percent(hi200,market_price),1)
+    return d
+
+
+def show_overview(assets: list[str], sort_by: str, columns: list[str], csvfile: str, workers: int = 8):
+    m = get_market_data()
     data = []
     ff = FundamentalFilter()
     blacklistdb = BlacklistDb()
 
-    # processing is conservatively sequential here, to prevent triggering various order rate limits
-    for asset in simple_progress_track(assets):
-
-        def should_include_column(col):
-            return columns is None or col in columns
-
-        d ={
-            'ticker': get_id_sym(asset),
-            'name': get_id_name(asset),
-
-            'sector':       nan,
-            'industry':     nan,
-            'supply,M':     nan,
-            'cap,M':        nan,
-            'vol,M':        nan,
-            'vol/cap,%':    nan,
-            'price':        nan,
-            'chg':          nan,
-            'chg%':         nan,
-            'w.chg':        nan,
-            'w.chg%':       nan,
-            'an.chg':       nan,
-            'an.chg%':      nan,
-            'mean':         nan,
-            'bottom':       nan,
-            'top':          nan,
-            'down,%':       nan,
-            'up mean,%':    nan,
-            'heat score':   nan,
-            'discount f.':  nan,
-            'tr P/E':       nan,
-            'fw P/E':       nan,
-            'P/B':          nan,
-            'd/e':          nan,
-            'div rate':     nan,
-            'div yield,%':  nan,
-            'expense,%':    nan,
-        }
-
+    def load(asset: str):
         try:
-            if should_include_column("price") or should_include_column("down,%") or should_include_column("up mean,%") or should_include_column("heat score") or should_include_column("discount f."):
-                market_price = m.get_market_price(asset)
-                d['price'] = market_price
-            if should_include_column("mean") or should_include_column("up mean,%") or should_include_column("heat score"):
-                ma200_price = m.get_avg_price_n_days(asset,200)
-                d['mean'] = round(ma200_price,2)
-                d['up mean,%'] = round(calc_raise_percent(ma200_price,market_price),1)
-            if should_include_column("heat score"):
-                rsi = m.get_rsi(asset)
-            if should_include_column("down,%") or should_include_column("bottom") or should_include_column("top") or should_include_column("discount f.") or should_include_column("heat score"):
-                lo200,hi200 = m.get_lo_hi_n_days(asset,200)
-                d['bottom'] = round(lo200,2)
-                d['top'] = round(hi200,2)
-            if should_include_column("chg")  or should_include_column("chg%"):
-                chg,chg_p = m.get_daily_change(asset)
-                d['chg'] = round(chg,2)
-                d['chg%'] = round(chg_p,1)
-            if should_include_column("w.chg")  or should_include_column("w.chg%"):
-                wchg,wchg_p = m.get_weekly_change(asset)
-                d['w.chg'] = round(wchg,2)
-                d['w.chg%'] = round(wchg_p,1)
-            if should_include_column("an.chg")  or should_include_column("an.chg%"):
-                anchg,anchg_p = m.get_annual_change(asset)
-                d['an.chg'] = round(anchg,2)
-                d['an.chg%'] = round(anchg_p,1)
-            if should_include_column("heat score"):
-                heat_score = calc_heat_score(market_price=market_price, ma200=ma200_price, hi200=hi200, rsi=rsi)
-                d['heat score'] = round(heat_score,1)
-            if should_include_column("discount f."):
-                discount_factor = calc_discount_score(market_price=market_price, low=lo200, high=hi200)
-                d['discount f.'] = round(discount_factor,1)
-            if should_include_column("supply,M"):
-                supply = m.get_total_supply(asset)
-                d['supply,M'] = round(supply * 0.000001,1)
-            if should_include_column("cap,M") or should_include_column("vol/cap,%"):
-                mcap = m.get_market_cap(asset)
-                d['cap,M'] = round(mcap * 0.000001,1)
-            if should_include_column("vol,M") or should_include_column("vol/cap,%"):
-                vol  = m.get_total_volume(asset)
-                d['vol,M'] = round(vol * 0.000001,1)
-            if should_include_column("vol/cap,%"):
-                vol_mcap = vol / (mcap if mcap > 0 else nan)
-                d['vol/cap,%'] = round(vol_mcap * 100.0 ,1)
-            if should_include_column("down,%"):
-                d['down,%'] = round(calc_raise_percent(hi200,market_price),1)
+            d = load_overview_row(m, asset, columns)
         except Exception as e:
-            print(f"{asset} : failed to load technical data: {e}")
-            blacklistdb.add_blacklist(asset)
-            continue
-
+            return None, e
         if not is_crypto(asset):
             fundamental_data = m.get_fundamentals(asset)
             for k,v in fundamental_data.items():
                 d[k] = v
-            if ff.check(d):
+        return d, None
+
+    try:
+        # warms the market price cache with one bulk request per provider
+        m.get_market_prices(assets)
+    except Exception as e:
+        print(f"bulk market price request failed, prices are requested per asset: {e}")
+
+    # assets are loaded concurrently, MarketData keeps the requests to each provider within its rate limit
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(load, asset) for asset in assets]
+        for asset, future in zip(simple_progress_track(assets), futures):
+            d, e = future.result()
+            if e is not None:
+                print(f"{asset} : failed to load technical data: {e}")
+                blacklistdb.add_blacklist(asset)
+                continue
+
+            if not is_crypto(asset):
+                if ff.check(d):
+                    data.append(d)
+            else:
                 data.append(d)
-        else:
-            data.append(d)
 
     df = DataFrame.from_dict(data)
     if len(df) > 0 and sort_by is not None:
@@ -190,7 +218,7 @@ def show_overview(assets: list[str], sort_by: str, columns: list[str], csvfile:
 
 def precache(assets: list[str]):
     print("precaching")
-    m = MarketData()
+    m = get_market_data()
     blacklistdb = BlacklistDb()
     for asset in simple_progress_track(assets):
         try:
@@ -207,7 +235,7 @@ def precache(assets: list[str]):
 
 
 def show_rsi_filter(assets: list[str]):
-    m = MarketData()
+    m = get_market_data()
     data_oversold = []
     data_overbought = []
 
@@ -245,7 +273,7 @@ def show_rsi_filter(assets: list[str]):
 
 
 def show_dir(assets: list[str]):
-    m = MarketData()
+    m = get_market_data()
 
     total = 0
     ups = 0
@@ -288,9 +316,11 @@ def main():
     parser.add_argument('--sort-by', type=str, default=None, help='overview: sort by column name')
     parser.add_argument('--csv', type=str, default=None, help='overview: write csv file')
     parser.add_argument('--precache', action='store_const', const='True', help='populate data cache only')
+    parser.add_argument('--workers', type=int, default=8, help='overview: number of assets loaded concurrently')
     
     parser.add_argument('--rsi',action='store_const', const='True', help='list oversold/overbought')
     parser.add_argument('--dir',action='store_const', const='True', help='detect common market direction')
+    parser.add_argument('--profile-startup', action='store_const', const='True', help='print import time breakdown on exit')
     
     args = parser.parse_args()
 
@@ -298,7 +328,7 @@ def main():
     assets = get_list_of_assets(include_stocks=args.stocks,include_crypto=args.crypto,include_owned=args.owned,extra_tickers=extra_tickers)
 
     if args.overview:
-        show_overview(assets=assets, sort_by=args.sort_by, columns=screener_conf['columns'], csvfile=args.csv)
+        show_overview(assets=assets, sort_by=args.sort_by, columns=screener_conf['columns'], csvfile=args.csv, workers=args.workers)
     elif args.precache:
         precache(assets=assets)
     elif args.rsi:
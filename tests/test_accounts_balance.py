@@ -0,0 +1,103 @@
+import importlib.util, sys, time, types
+import pytest
+
+
+def stub_sdk_modules(modules: dict):
+    '''
+    exchange clients imported by accounts_balance need the Kucoin and Exante SDKs, the tests don't call them:
+    placeholder modules stand in for the SDKs that are not installed
+    '''
+    missing = {name.split(".")[0] for name in modules if importlib.util.find_spec(name.split(".")[0]) is None}
+    for name, attrs in modules.items():
+        if name.split(".")[0] not in missing:
+            continue
+        module = sys.modules.setdefault(name, types.ModuleType(name))
+        for attr in attrs:
+            setattr(module, attr, None)
+
+
+stub_sdk_modules({
+    "kucoin": [], "kucoin.client": ["Margin"],
+    "xnt": [], "xnt.http_api": ["HTTPApi", "AuthMethods"],
+    "xnt.models": [], "xnt.models.http_api_models": ["OrderMarketV2", "Reject", "FeedLevel"],
+})
+
+from lib.common import accounts_balance
+from lib.common.accounts_balance import _balance_row, _collect_balances, get_available_usd_balances_dca
+from lib.common.kv_store import KVStore
+
+
+class StubExchange:
+    '''
+    balance request of an exchange client: returns its balance, raises or hangs
+    '''
+    def __init__(self, name: str, balance: float = 0., error: Exception = None, delay: float = 0.):
+        self.name = name
+        self.balance = balance
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self) -> dict:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return _balance_row(self.name, self.balance, 0, self.balance, True)
+
+
+@pytest.fixture
+def last_known(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(accounts_balance, "KVStore", lambda table: KVStore(table, path=path))
+    return KVStore("cex_balances", path=path)
+
+
+def test_unavailable_exchange_reports_last_known_balance(last_known):
+    exchanges = {name: StubExchange(name, balance) for name, balance in [("FTX", 100.), ("OKX", 200.), ("MEXC", 300.)]}
+    df = _collect_balances(exchanges, timeout_s=1.)
+    assert list(df['available_including_borrow']) == [100., 200., 300.]
+    assert not df['stale'].any()
+    assert last_known.get("OKX")['available_including_borrow'] == 200.
+
+    exchanges["FTX"].balance = 150.
+    exchanges["OKX"].delay = 5.
+    exchanges["MEXC"].error = ConnectionError("refused")
+    t0 = time.monotonic()
+    df = _collect_balances(exchanges, timeout_s=0.2).set_index('cex_name')
+    assert time.monotonic() - t0 < 1.
+    assert list(df['available_including_borrow']) == [150., 200., 300.]
+    assert list(df['stale']) == [False, True, True]
+    # only responses replace the last known balances
+    assert last_known.get("FTX")['available_including_borrow'] == 150.
+    assert last_known.get("MEXC")['available_including_borrow'] == 300.
+
+
+def test_unavailable_exchange_without_last_known_balance(last_known):
+    df = _collect_balances({"Exante": StubExchange("Exante", error=ValueError("no account"))}, timeout_s=1.)
+    assert df.iloc[0]['cex_name'] == "Exante"
+    assert df.iloc[0]['available_including_borrow'] == 0
+    assert bool(df.iloc[0]['stale'])
+
+
+def test_balances_are_cached(last_known, monkeypatch):
+    exchange = StubExchange("FTX", 100.)
+    monkeypatch.setattr(accounts_balance, "ApiKeysConfig", lambda: None)
+    monkeypatch.setattr(accounts_balance, "_balance_requests", lambda cfg: {"FTX": exchange})
+    monkeypatch.setattr(accounts_balance, "_balances", None)
+    monkeypatch.setattr(accounts_balance, "BALANCES_CACHE_TTL_S", 0.2)
+
+    df = get_available_usd_balances_dca()
+    # callers get copies of the cached balances
+    df.loc[0, 'available_including_borrow'] = 0.
+    assert get_available_usd_balances_dca().loc[0, 'available_including_borrow'] == 100.
+    assert exchange.calls == 1
+
+    exchange.balance = 120.
+    assert get_available_usd_balances_dca(refresh=True).loc[0, 'available_including_borrow'] == 120.
+    assert exchange.calls == 2
+
+    exchange.balance = 130.
+    time.sleep(0.25)
+    assert get_available_usd_balances_dca().loc[0, 'available_including_borrow'] == 130.
+    assert exchange.calls == 3
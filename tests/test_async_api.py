@@ -0,0 +1,104 @@
+import asyncio, socket, subprocess, sys, threading, time
+import pytest, requests
+from lib.common import rate_limiter
+from lib.trader import async_api
+from lib.trader.async_api import AsyncClient, gather, run_concurrently
+
+
+class SlowClient:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.name = "slow"
+
+    def get_balances(self, coin: str = "USD") -> dict:
+        time.sleep(self.delay)
+        return {coin: 100.}
+
+    def fail(self):
+        raise ValueError("rejected")
+
+
+def test_async_client_same_surface():
+    client = AsyncClient(SlowClient(0.01))
+    assert client.name == "slow"
+    assert isinstance(client.sync, SlowClient)
+    assert asyncio.run(client.get_balances(coin="USDT")) == {"USDT": 100.}
+    with pytest.raises(ValueError):
+        asyncio.run(client.fail())
+
+
+def test_gather_runs_concurrently():
+    clients = [AsyncClient(SlowClient(0.2)) for _ in range(5)]
+    t0 = time.monotonic()
+    results = asyncio.run(gather({f"cex{i}": c.get_balances() for i, c in enumerate(clients)}))
+    assert time.monotonic() - t0 < 0.6
+    assert results == {f"cex{i}": {"USD": 100.} for i in range(5)}
+
+
+def test_run_concurrently_partial_failure():
+    t0 = time.monotonic()
+    results = run_concurrently({
+        "fast": SlowClient(0.01).get_balances,
+        "failing": SlowClient(0.).fail,
+        "hanging": SlowClient(1.).get_balances,
+    }, timeout_s=0.2)
+    assert time.monotonic() - t0 < 0.5
+    assert results["fast"] == {"USD": 100.}
+    assert isinstance(results["failing"], ValueError)
+    assert isinstance(results["hanging"], TimeoutError)
+
+
+def test_burst_of_calls_reuses_request_threads():
+    def request_threads() -> int:
+        return sum(1 for t in threading.enumerate() if t.name.startswith("async_api"))
+    def call() -> int:
+        time.sleep(0.01)
+        return request_threads()
+    results = run_concurrently({f"call{i}": call for i in range(200)}, timeout_s=5.)
+    assert max(results.values()) <= async_api.MAX_CONCURRENT_REQUESTS
+    n = request_threads()
+    run_concurrently({f"call{i}": SlowClient(0.).get_balances for i in range(50)})
+    assert request_threads() == n
+
+
+def test_session_per_thread():
+    session = rate_limiter.ThreadLocalSession()
+    sessions = run_concurrently({f"call{i}": lambda: (session.get_adapter("https://"), session.get_adapter("https://"))
+                                 for i in range(2)})
+    for a, b in sessions.values():
+        assert a is b
+    main_thread_adapter = session.get_adapter("https://")
+    assert all(a is not main_thread_adapter for a, _ in sessions.values())
+
+
+def test_timeout_reaches_http_requests():
+    # accepts connections, never responds
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    url = f"http://127.0.0.1:{server.getsockname()[1]}/"
+    done = threading.Event()
+    def stuck_request():
+        try:
+            return rate_limiter.send("test-stuck", lambda: requests.get(url, timeout=rate_limiter.request_timeout()))
+        finally:
+            done.set()
+    try:
+        t0 = time.monotonic()
+        results = run_concurrently({"stuck": stuck_request}, timeout_s=0.3)
+        assert time.monotonic() - t0 < 1.
+        assert isinstance(results["stuck"], TimeoutError)
+        # the request itself gave up too, not only the caller
+        assert done.wait(1.)
+    finally:
+        server.close()
+
+
+def test_stuck_call_does_not_block_exit():
+    code = "import time\nfrom lib.trader.async_api import run_concurrently\n" \
+           "print(run_concurrently({'stuck': lambda: time.sleep(60)}, timeout_s=0.1))"
+    t0 = time.monotonic()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=30)
+    assert out.returncode == 0
+    assert "TimeoutError" in out.stdout
+    assert time.monotonic() - t0 < 10
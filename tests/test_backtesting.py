@@ -0,0 +1,74 @@
+import numpy as np
+from lib.bots.framework import TickerHistorical, DummyBroker, BacktestingConductor, VectorizedBacktestingConductor, candles_to_arrays, get_strategy_class
+from lib.bots.interfaces import VectorizedStrategy, Ticker, TickerArrays, Signals, Broker
+from lib.bots.recorder import TradeRecorder
+
+
+def make_arrays(n: int) -> TickerArrays:
+    rng = np.random.default_rng(3)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    o = np.r_[c[0], c[:-1]]
+    return candles_to_arrays([{'timestamp': 1500000000000 + i * 86400000, 'open': o[i], 'high': max(o[i], c[i]) * 1.01,
+                               'low': min(o[i], c[i]) * 0.99, 'close': c[i], 'volume': 1.0} for i in range(n)])
+
+
+class SellThenBuy(VectorizedStrategy):
+    '''
+    sells on every 5th bar and buys on every 3rd, both on every 15th: the sell goes first
+    '''
+    def tick(self, ticker: Ticker, broker: Broker):
+        i = len(ticker.close) - 1
+        if i % 5 == 0 and i > 0:
+            broker.sell(0.5)
+        if i % 3 == 0:
+            broker.buy(1.)
+
+    def signals(self, bars: TickerArrays) -> Signals:
+        i = np.arange(len(bars.close))
+        return Signals(buy=np.where(i % 3 == 0, 1., 0.), sell=np.where((i % 5 == 0) & (i > 0), 0.5, 0.))
+
+
+def backtest(conductor_class, strategy, arrays: TickerArrays) -> DummyBroker:
+    ticker = TickerHistorical.from_arrays(arrays)
+    broker = DummyBroker(ticker=ticker, initial_account=10000., recorder=TradeRecorder(10000.))
+    conductor_class(strategy=strategy, ticker=ticker, broker=broker).run()
+    assert ticker.ended()
+    return broker
+
+
+def assert_same_fills(tick: DummyBroker, vectorized: DummyBroker):
+    a, b = tick.recorder.trades(), vectorized.recorder.trades()
+    assert len(a) == len(b) > 0
+    assert np.array_equal(a['timestamp'].to_numpy(), b['timestamp'].to_numpy())
+    assert list(a['side']) == list(b['side'])
+    for column in ('price', 'qty', 'value', 'account_usd', 'account_token'):
+        assert np.allclose(a[column], b[column], rtol=1e-12, atol=0), column
+    assert np.isclose(tick.account_size_usd, vectorized.account_size_usd, rtol=1e-12, atol=0)
+    assert np.isclose(tick.account_size_token, vectorized.account_size_token, rtol=1e-12, atol=0)
+
+
+def test_vectorized_dca_strategies_match_tick_backtest():
+    arrays = make_arrays(600)
+    for name, args in [
+        ('DCA_ConstQuota', {'dca_base_quota': 10}),
+        ('DCA_QuotaFromBasePrice', {'dca_base_quota': 10, 'dca_base_price': 120}),
+        ('DCA_QuotaFromSlowSMA', {'dca_base_quota': 10, 'ma_period': 50}),
+        ('DCA_QuotaFromSlowSMA_FilterOverpricedByFastSMA', {'dca_base_quota': 10, 'quota_factor_ma_length': 20, 'overprice_filter_ma_length': 50}),
+    ]:
+        strategy_class = get_strategy_class(name)
+        assert issubclass(strategy_class, VectorizedStrategy), name
+        tick = backtest(BacktestingConductor, strategy_class(args), arrays)
+        vectorized = backtest(VectorizedBacktestingConductor, strategy_class(args), arrays)
+        assert_same_fills(tick, vectorized)
+
+
+def test_vectorized_fills_on_signal_bars_sell_first():
+    arrays = make_arrays(100)
+    tick = backtest(BacktestingConductor, SellThenBuy(), arrays)
+    vectorized = backtest(VectorizedBacktestingConductor, SellThenBuy(), arrays)
+    assert_same_fills(tick, vectorized)
+
+    trades = vectorized.recorder.trades()
+    # filled at the close of the signal bars
+    assert np.array_equal(trades['price'].to_numpy(), arrays.close[np.searchsorted(arrays.timestamp, trades['timestamp'].to_numpy())])
+    assert list(trades['side'][trades['timestamp'] == arrays.timestamp[15]]) == ["SELL", "BUY"]
@@ -0,0 +1,160 @@
+import os, json
+import numpy as np
+import pandas as pd
+from lib.common import candle_store
+from lib.common.market_data import HistoricalBarCache
+from lib.bots.framework import TickerHistorical
+
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def make_candles(n: int):
+    return [{'timestamp': 1499990400000 + i * DAY_MS, 'open': str(100. + i), 'high': str(101. + i), 'low': str(99. + i), 'close': str(100.5 + i), 'volume': str(10. * i)} for i in range(n)]
+
+
+def test_save_load_columns(tmp_path):
+    path = str(tmp_path / "store")
+    columns = {'timestamp': np.array([1, 2, 3], dtype='datetime64[ms]'), 'close': np.array([1., 2., 3.])}
+    candle_store.save_columns(path, columns)
+    loaded = candle_store.load_columns(path)
+    assert list(loaded.keys()) == ['timestamp', 'close']
+    assert np.array_equal(loaded['close'], columns['close'])
+    assert loaded['timestamp'].dtype == np.dtype('datetime64[ms]')
+    assert not loaded['close'].flags.writeable
+    assert candle_store.load_columns(str(tmp_path / "missing")) is None
+
+
+def test_df_round_trip():
+    df = pd.DataFrame({'open': [1., 2.], 'close': [3, 4], 'ticker': ['A', 'A']},
+                      index=pd.DatetimeIndex(pd.to_datetime([0, 86400000], unit="ms"), name="timestamp"))
+    loaded = candle_store.columns_to_df(candle_store.df_to_columns(df))
+    assert list(loaded.columns) == ['open', 'close']
+    assert (loaded.index == df.index).all()
+    loaded.iloc[-1, 1] = 5
+    assert loaded['close'].iat[-1] == 5
+
+
+def make_fetch(calls: list, interval_ms: int = DAY_MS):
+    def fetch(ts_first: int, ts_last: int):
+        calls.append((ts_first, ts_last))
+        first = -(-ts_first // interval_ms) * interval_ms
+        ts = np.arange(first, ts_last + 1, interval_ms, dtype=np.int64)
+        return {'timestamp': ts.astype('datetime64[ms]'), 'close': ts / interval_ms}
+    return fetch
+
+
+def test_candle_store_fetches_only_gaps(tmp_path):
+    calls = []
+    store = candle_store.CandleStore(str(tmp_path / "bitcoin-1d"), DAY_MS, make_fetch(calls))
+    columns = store.get(10 * DAY_MS, 19 * DAY_MS)
+    assert list(columns['close']) == list(range(10, 20))
+    assert calls == [(10 * DAY_MS, 19 * DAY_MS)]
+
+    columns = store.get(12 * DAY_MS, 15 * DAY_MS)
+    assert list(columns['close']) == list(range(12, 16))
+    assert len(calls) == 1
+
+    columns = store.get(5 * DAY_MS, 25 * DAY_MS)
+    assert list(columns['close']) == list(range(5, 26))
+    assert calls[1:] == [(5 * DAY_MS, 10 * DAY_MS - 1), (19 * DAY_MS + 1, 25 * DAY_MS)]
+    assert store.ranges == [(5 * DAY_MS, 25 * DAY_MS + 1)]
+    assert not columns['close'].flags.writeable
+
+
+def test_candle_store_does_not_persist_forming_bar(tmp_path):
+    calls = []
+    store = candle_store.CandleStore(str(tmp_path / "bitcoin-1d"), DAY_MS, make_fetch(calls))
+    today = int(pd.Timestamp.now('UTC').normalize().timestamp() * 1000)
+    columns = store.get(today - 3 * DAY_MS, today)
+    assert len(columns['close']) == 4
+    assert store.ranges == [(today - 3 * DAY_MS, today)]
+    store.get(today - 3 * DAY_MS, today)
+    assert calls[-1] == (today, today)
+
+
+def test_ticker_historical_imports_legacy_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("cache")
+    with open("cache/cache_candles-bitcoin-1d-2017-07-14-2017-07-23.json", "w") as f:
+        json.dump(make_candles(10), f)
+    calls = []
+    monkeypatch.setattr(TickerHistorical, "_load_candles_live", lambda self, market, tf, ts_first, ts_last: calls.append((ts_first, ts_last)))
+    ticker = TickerHistorical("bitcoin", "1d", "2017-07-15", "2017-07-20")
+    assert not os.path.exists("cache/cache_candles-bitcoin-1d-2017-07-14-2017-07-23.json")
+    assert len(ticker.arrays.close) == 6
+    assert calls == []
+
+
+def make_day_bars(days: pd.DatetimeIndex, close: float):
+    return pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close}, index=days)
+
+
+def test_historical_bar_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    today = pd.Timestamp.now('UTC').tz_localize(None).normalize()
+    cache = HistoricalBarCache()
+    assert cache.missing_days("bitcoin", 365) == 365
+    # fetched 3 days ago
+    with monkeypatch.context() as m:
+        m.setattr(HistoricalBarCache, "_today", staticmethod(lambda: today - pd.Timedelta(days=3)))
+        cache.put("bitcoin", make_day_bars(pd.date_range(end=today - pd.Timedelta(days=3), periods=10), 1.))
+        assert cache.get("bitcoin") is not None
+    assert HistoricalBarCache().get("bitcoin") is None
+    missing_days = HistoricalBarCache().missing_days("bitcoin", 365)
+    # the day of the fetch is fetched again
+    assert missing_days == 4
+
+    df = HistoricalBarCache().put("bitcoin", make_day_bars(pd.date_range(end=today, periods=missing_days), 2.))
+    assert len(df) == 13
+    assert df['close'][today - pd.Timedelta(days=3)] == 2.
+    assert list(df['close'][-5:]) == [1., 2., 2., 2., 2.]
+    assert HistoricalBarCache().missing_days("bitcoin", 365) == 1
+    loaded = HistoricalBarCache().get("bitcoin")
+    assert np.array_equal(loaded['close'].values, df['close'].values)
+    assert HistoricalBarCache().get("ethereum") is None
+
+
+def test_bars_without_bar_of_the_day_are_fetched_once_a_day(tmp_path, monkeypatch):
+    from lib.common.market_data import MarketData
+    monkeypatch.chdir(tmp_path)
+    today = pd.Timestamp.now('UTC').tz_localize(None).normalize()
+    calls = []
+    class Provider:
+        def get_historical_bars(self, asset, days_before):
+            calls.append(days_before)
+            # market closed since two days, e.g. a weekend
+            return make_day_bars(pd.date_range(end=today - pd.Timedelta(days=2), periods=20), 2.)
+
+    def market_data():
+        d = MarketData.__new__(MarketData)
+        d._historical_bars_cache = HistoricalBarCache()
+        d._provider = lambda asset, method: Provider()
+        d.get_market_price = lambda asset: 2.
+        return d
+
+    d = market_data()
+    for days in (14, 7, 1, 1):
+        assert len(d._get_historical_bars("V", days)) == days + 1
+    assert calls == [365]
+    # fresh for the rest of the day in other processes as well
+    market_data()._get_historical_bars("V", 14)
+    assert calls == [365]
+
+
+def test_live_price_overlay_does_not_modify_cache(tmp_path, monkeypatch):
+    from lib.common.market_data import MarketData
+    monkeypatch.chdir(tmp_path)
+    today = pd.Timestamp.now('UTC').tz_localize(None).normalize()
+    cache = HistoricalBarCache()
+    cache.put("bitcoin", make_day_bars(pd.date_range(end=today, periods=10), 2.))
+    d = MarketData.__new__(MarketData)
+    d._historical_bars_cache = cache
+    d.get_market_price = lambda asset: 3.
+
+    for _ in range(2):
+        bars = d._get_historical_bars("bitcoin", 5)
+        assert len(bars) == 6
+        assert list(bars.iloc[-1][['close', 'low', 'high']]) == [3., 2., 3.]
+        assert bars['close'].iat[-2] == 2.
+    assert (cache.get("bitcoin")[['close', 'low', 'high']].values == 2.).all()
@@ -0,0 +1,52 @@
+import json, time
+from concurrent.futures import ThreadPoolExecutor
+from lib.common.kv_store import KVStore
+
+
+def test_kv_store_get_set(tmp_path):
+    db = KVStore("test", path=str(tmp_path / "cache.sqlite"))
+    assert db.get("bitcoin") is None
+    db.set("bitcoin", {"name": "Bitcoin", "sym": "BTC"})
+    db.set_many({"ethereum": {"name": "Ethereum", "sym": "ETH"}, "solana": {"name": "Solana", "sym": "SOL"}})
+    db.set("solana", {"name": "Solana", "sym": "SOL2"})
+    assert db.get("bitcoin") == {"name": "Bitcoin", "sym": "BTC"}
+    assert db.get_many(["solana", "ethereum", "unknown"]) == {"solana": {"name": "Solana", "sym": "SOL2"}, "ethereum": {"name": "Ethereum", "sym": "ETH"}}
+    assert len(db) == 3
+    assert sorted(db.keys()) == ["bitcoin", "ethereum", "solana"]
+    db.delete("bitcoin")
+    assert db.get("bitcoin") is None
+
+    # tables of the same database are separate, data persists across instances
+    other = KVStore("other", path=str(tmp_path / "cache.sqlite"))
+    assert len(other) == 0
+    assert KVStore("test", path=str(tmp_path / "cache.sqlite")).get("ethereum")["sym"] == "ETH"
+
+
+def test_kv_store_ttl(tmp_path):
+    db = KVStore("test", path=str(tmp_path / "cache.sqlite"))
+    db.set_many({"V": 200., "MSFT": 250.}, ttl_s=0.05)
+    db.set("AAPL", 150.)
+    assert db.get("V") == 200.
+    time.sleep(0.06)
+    assert db.get("V") is None
+    assert db.get_many(["V", "MSFT", "AAPL"]) == {"AAPL": 150.}
+    assert len(db) == 1
+    db.purge_expired()
+    db.set("V", 201.)
+    assert db.get("V") == 201.
+
+
+def test_kv_store_legacy_import(tmp_path):
+    legacy = tmp_path / "names.db"
+    legacy.write_text(json.dumps({"V": "Visa Inc.", "MSFT": "Microsoft Corporation"}))
+    db = KVStore("names", path=str(tmp_path / "cache.sqlite"), legacy_json=str(legacy))
+    assert db.get("V") == "Visa Inc."
+    assert not legacy.exists()
+
+
+def test_kv_store_threads(tmp_path):
+    db = KVStore("test", path=str(tmp_path / "cache.sqlite"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: db.set(f"k{i}", i), range(200)))
+    assert len(db) == 200
+    assert db.get("k123") == 123
@@ -1,3 +1,4 @@
+import time
 from lib.common.market_data import MarketData
 
 def test_market_data():
@@ -18,3 +19,144 @@ def test_market_data():
 
     print(d.get_daily_change("bitcoin"))
 
+
+
+class FakePriceCache:
+    def __init__(self, values: dict = {}):
+        self.values = dict(values)
+        self.writes = 0
+    def get_many(self, keys: list) -> dict:
+        return {k: self.values[k] for k in keys if k in self.values}
+    def put_many(self, values: dict):
+        self.values |= values
+        self.writes += 1
+
+
+class FakeProvider:
+    def __init__(self, prices: dict, bulk: bool = True):
+        self.prices = prices
+        self.bulk = bulk
+        self.calls = []
+    def get_market_price(self, asset: str) -> float:
+        self.calls.append(asset)
+        return self.prices[asset]
+    def get_market_prices(self, assets: list) -> dict:
+        self.calls.append(tuple(assets))
+        return {a: self.prices[a] for a in assets if self.bulk}
+
+
+class FakeFlyweight:
+    def __init__(self, providers: dict):
+        self.providers = providers
+    def get_id(self, asset: str, method: str) -> str:
+        return next(id for id, p in self.providers.items() if asset in p.prices)
+    def get_by_id(self, id: str):
+        return self.providers[id]
+
+
+def test_get_market_prices_one_request_per_provider():
+    crypto = FakeProvider({"bitcoin": 20000., "ethereum": 1500., "solana": 30.})
+    stocks = FakeProvider({"V": 200., "MSFT": 250.}, bulk=False)
+    d = MarketData.__new__(MarketData)
+    d._provider_flyweight = FakeFlyweight({"crypto": crypto, "stocks": stocks})
+    d._marketprice_cache = FakePriceCache({"solana": 31.})
+
+    prices = d.get_market_prices(["bitcoin", "V", "ethereum", "solana", "MSFT", "bitcoin"])
+
+    assert prices == {"bitcoin": 20000., "ethereum": 1500., "solana": 31., "V": 200., "MSFT": 250.}
+    assert crypto.calls == [("bitcoin", "ethereum")]
+    # assets left out by the bulk request are asked for one by one
+    assert stocks.calls == [("V", "MSFT"), "V", "MSFT"]
+    assert d._marketprice_cache.writes == 1
+    assert d._marketprice_cache.values["ethereum"] == 1500.
+
+
+def test_flyweight_creates_providers_on_first_use():
+    from lib.market_data_providers.flyweight import MarketDataProviderFlyweight
+    from lib.market_data_providers.provider_fallback import MarketDataProviderFallback
+    fw = MarketDataProviderFlyweight()
+    assert fw._map == {}
+    prov = fw.get_by_id("fallback")
+    assert isinstance(prov, MarketDataProviderFallback)
+    assert fw.get_by_id("fallback") is prov
+    assert list(fw._map.keys()) == ["fallback"]
+
+
+def test_market_price_cache_batches_writes(tmp_path):
+    from lib.common.kv_store import KVStore
+    from lib.common.market_data import MarketPriceCache
+    store = KVStore("market_prices", path=str(tmp_path / "cache.sqlite"))
+    cache = MarketPriceCache(ttl_s=60, max_size=2, flush_batch=3, store=store)
+
+    cache.put("bitcoin", 20000.)
+    cache.put("ethereum", 1500.)
+    assert cache.get("bitcoin") == 20000.
+    assert len(store) == 0
+    cache.put("solana", 30.)
+    assert len(store) == 3
+
+    # evicted from the in-process tier, read back from the persistent one
+    assert cache.get("bitcoin") == 20000.
+    # another process sharing the persistent tier
+    other = MarketPriceCache(ttl_s=60, store=KVStore("market_prices", path=str(tmp_path / "cache.sqlite")))
+    assert other.get_many(["ethereum", "solana", "V"]) == {"ethereum": 1500., "solana": 30.}
+
+    cache.put("V", 200.)
+    assert store.get("V") is None
+    cache.flush()
+    assert other.get("V") == 200.
+
+
+def test_market_price_cache_ttl(tmp_path):
+    from lib.common.kv_store import KVStore
+    from lib.common.market_data import MarketPriceCache
+    cache = MarketPriceCache(ttl_s=0.05, store=KVStore("market_prices", path=str(tmp_path / "cache.sqlite")))
+    cache.put("bitcoin", 20000.)
+    cache.flush()
+    assert cache.get("bitcoin") == 20000.
+    time.sleep(0.06)
+    assert cache.get("bitcoin") is None
+
+
+def test_market_data_is_shared_and_injectable():
+    from lib.common.market_data import get_market_data, set_market_data
+    fake = MarketData.__new__(MarketData)
+    set_market_data(fake)
+    try:
+        assert get_market_data() is fake
+        assert get_market_data() is get_market_data()
+    finally:
+        set_market_data(None)
+    assert get_market_data() is not fake
+
+
+def test_indicators_memoized_until_bars_change():
+    import threading
+    import numpy as np
+    import pandas as pd
+    close = np.linspace(100., 160., 60)
+    bars = pd.DataFrame({'open': close - 1, 'close': close, 'low': close - 2, 'high': close + 2}, index=pd.date_range("2022-01-01", periods=60, freq="D"))
+    d = MarketData.__new__(MarketData)
+    d._indicators = {}
+    d._indicators_lock = threading.Lock()
+    d._get_historical_bars = lambda asset, days_before: bars[-days_before-1:]
+
+    assert d.get_short_term_trend("bitcoin", 5) == "up"
+    assert d.get_lo_hi_n_days("bitcoin", 10) == (close[-10] - 2, close[-1] + 2)
+    assert d.get_rsi("bitcoin") == 100.
+    bundle = d._indicators["bitcoin"]
+    assert d.get_daily_change("bitcoin") == (close[-1] - close[-2], (close[-1] - close[-2]) / close[-2] * 100)
+    assert d._indicators["bitcoin"] is bundle
+
+    # live price moved
+    bars = bars.copy()
+    bars.iloc[-1, bars.columns.get_loc('close')] = 150.
+    assert d.get_daily_change("bitcoin")[0] == 150. - close[-2]
+    assert d._indicators["bitcoin"] is not bundle
+
+
+def test_poloniex_prices_leave_out_unlisted_pairs():
+    from lib.market_data_providers.provider_poloniex import MarketDataProviderPoloniex
+    provider = MarketDataProviderPoloniex()
+    provider._api._get = lambda command, data={}: {"USDT_ZRX": {"last": "0.25"}, "USDT_BTC": {"last": "20000"}}
+    assert provider.get_market_prices(["0x", "aave"]) == {"0x": 0.25}
@@ -1,4 +1,4 @@
-from lib.common.pnl import Order, calculate_inc_pnl, INVALID_PERCENT
+from lib.common.pnl import Order, PnLAccumulator, calculate_inc_pnl, calculate_inc_pnl_series, orders_to_arrays, INVALID_PERCENT
 from math import isclose
 
 def test_calculate_pnl_no_buys_or_sells():
@@ -286,3 +286,106 @@ def test_calculate_pnl_realized_must_remain_constant():
     ], market_price_now=0)
     assert pnl.realized_pnl == 1
     assert pnl.realized_pnl_percent == 100
+
+
+def test_accumulator_matches_replay_of_every_prefix():
+    import numpy as np
+    rng = np.random.default_rng(5)
+    orders = []
+    qty = 0
+    for _ in range(200):
+        price = float(rng.uniform(50, 150))
+        if qty > 1 and rng.uniform() < 0.3:
+            sell_qty = float(rng.uniform(0, qty))
+            orders.append(Order("SELL", value=sell_qty * price, qty=sell_qty))
+            qty -= sell_qty
+        else:
+            buy_qty = float(rng.uniform(0.1, 2))
+            orders.append(Order("BUY", value=buy_qty * price, qty=buy_qty))
+            qty += buy_qty
+
+    accumulator = PnLAccumulator()
+    for i, o in enumerate(orders):
+        accumulator.add(o)
+        assert accumulator.pnl(100.) == calculate_inc_pnl(orders[:i+1], 100.)
+        if i == 99:
+            # resumed from its stored state
+            accumulator = PnLAccumulator(accumulator.state)
+    assert accumulator.state.n_orders == len(orders)
+
+
+def test_series_matches_scalar_cases():
+    import numpy as np
+    cases = [
+        ([Order("BUY", value=1, qty=1)], 1),
+        ([Order("BUY", value=1, qty=1), Order("SELL",value=1, qty=1-0.00000000000000144329)], 1),
+        ([Order("BUY", value=1, qty=2), Order("BUY", value=2, qty=2)], 1),
+        ([Order("BUY", value=10, qty=5)], 0),
+        ([Order("BUY", value=1, qty=1), Order("SELL",value=5, qty=1)], 1),
+        ([Order("BUY", value=1, qty=1), Order("SELL",value=0, qty=1)], 1),
+        ([Order("BUY", value=3, qty=3), Order("SELL",value=0.5, qty=1)], 1),
+        ([Order("BUY", value=3, qty=3), Order("SELL",value=2, qty=1)], 0.5),
+        ([Order("BUY", value=3, qty=3), Order("SELL",value=2, qty=1)], 2),
+        ([Order("BUY", value=2, qty=1), Order("SELL",value=3, qty=1), Order("BUY", value=1, qty=1), Order("SELL",value=1, qty=0.5)], 3),
+        # oversold position
+        ([Order("BUY", value=100, qty=10), Order("SELL",value=300, qty=15), Order("BUY", value=100, qty=10)], 12),
+        # zero value buy, the next buy sets the rate
+        ([Order("BUY", value=0, qty=10), Order("BUY", value=100, qty=10), Order("SELL",value=60, qty=5)], 12),
+        # closed up to rounding
+        ([Order("BUY", value=0.3, qty=0.3), Order("SELL",value=0.2, qty=0.1), Order("SELL",value=0.4, qty=0.2), Order("BUY", value=2, qty=1)], 3),
+    ]
+    for orders, price in cases:
+        series = calculate_inc_pnl_series(*orders_to_arrays(orders), price)
+        for i in range(len(orders)):
+            expected = calculate_inc_pnl(orders[:i+1], price)
+            for field, values, value in zip(expected._fields, series, expected):
+                assert isclose(values[i], value, rel_tol=1e-9, abs_tol=1e-9), (orders, i, field)
+
+    series = calculate_inc_pnl_series(*orders_to_arrays([]), 1.)
+    assert all(len(values) == 0 for values in series)
+    series = calculate_inc_pnl_series(*orders_to_arrays([Order("BUY", value=1, qty=1)]), np.array([2.]))
+    assert series.unrealized_pnl[0] == 1
+
+
+def test_series_matches_accumulator_with_closed_positions():
+    import numpy as np
+    rng = np.random.default_rng(11)
+    orders = []
+    qty = 0
+    for _ in range(300):
+        price = float(rng.uniform(50, 150))
+        u = rng.uniform()
+        if qty > 0 and u < 0.05:
+            orders.append(Order("SELL", value=qty * price, qty=qty))
+            qty = 0
+        elif qty > 0 and u < 0.3:
+            sell_qty = float(rng.uniform(0, qty))
+            orders.append(Order("SELL", value=sell_qty * price, qty=sell_qty))
+            qty -= sell_qty
+        else:
+            buy_qty = float(rng.uniform(0.1, 2))
+            orders.append(Order("BUY", value=buy_qty * price, qty=buy_qty))
+            qty += buy_qty
+    prices = rng.uniform(50, 150, len(orders))
+
+    series = calculate_inc_pnl_series(*orders_to_arrays(orders), prices)
+    accumulator = PnLAccumulator()
+    for i, o in enumerate(orders):
+        accumulator.add(o)
+        expected = accumulator.pnl(prices[i])
+        assert np.allclose([values[i] for values in series], expected, rtol=1e-9, atol=1e-9)
+
+
+def test_series_matches_accumulator_over_long_history():
+    import numpy as np, warnings
+    # a position partly sold and bought back over and over
+    orders = [Order("BUY", value=100, qty=1)]
+    for i in range(3000):
+        orders += [Order("SELL", value=60, qty=0.5), Order("BUY", value=50 + i % 7, qty=0.5)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        series = calculate_inc_pnl_series(*orders_to_arrays(orders), 100.)
+    accumulator = PnLAccumulator()
+    for i, o in enumerate(orders):
+        accumulator.add(o)
+        assert np.allclose([values[i] for values in series], accumulator.pnl(100.), rtol=1e-9, atol=1e-9), i
@@ -0,0 +1,101 @@
+from math import isclose
+import numpy as np
+import pandas as pd
+from lib.bots.framework import candles_to_arrays
+from lib.bots.portfolio_backtest import PortfolioDcaConductor, auto_accumulate_assets, passes_acc_filter, equity_curve, positions
+from lib.common.market_data import IndicatorBundle
+from lib.common.metrics import calc_discount_score
+
+DAY_MS = 86400000
+
+
+def make_bars(n: int, first_day: int, seed: int):
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    o = c * np.exp(rng.normal(0, 0.02, n))
+    return candles_to_arrays([{'timestamp': 1500000000000 + (first_day + i) * DAY_MS, 'open': o[i], 'high': max(o[i], c[i]) * 1.01,
+                               'low': min(o[i], c[i]) * 0.99, 'close': c[i], 'volume': 1.0} for i in range(n)])
+
+
+def make_cfg(**checks):
+    cfg = {
+        'categories': {'crypto': {'core': ['bitcoin', 'ethereum'], 'alts': ['solana', 'cardano']}, 'stocks': ['AAPL']},
+        'auto_accumulate': ['bitcoin', '/all/crypto/alts', '/all/crypto'],
+        'quota_usd': 10,
+        'total_quota_usd': 25,
+        'quota_fixed_factor': {'bitcoin': 2, '/all/crypto/alts': 0.5, 'cardano': 0},
+        'check_market_open': False, 'check_correction': False, 'check_correction_min_sequential_days': 2,
+        'check_pump': False, 'check_pump_threshold': 3, 'check_rsi': False, 'check_rsi_threshold': 55,
+        'check_discount': False, 'check_discount_threshold': 50,
+        'no_filter_list': [], 'no_filter_categories': [],
+    }
+    cfg.update(checks)
+    return cfg
+
+
+def reference_passes(cfg: dict, bars, t: int) -> bool:
+    '''
+    dca.passes_acc_filter on day t, from the indicators MarketData computes
+    '''
+    df = pd.DataFrame({name: getattr(bars, name)[:t+1] for name in ('open', 'high', 'low', 'close')}, index=bars.timestamp[:t+1])[-366:]
+    ind = IndicatorBundle(df)
+    if cfg['check_correction']:
+        length = cfg['check_correction_min_sequential_days']
+        if ind.trend(length)[1] != length:
+            return False
+    if cfg['check_pump'] and ind.change(1, -2)[1] > cfg['check_pump_threshold']:
+        return False
+    if cfg['check_rsi'] and ind.size(50) > 14:
+        rsi = ind.rsi(50, 14)
+        if rsi == rsi and rsi > cfg['check_rsi_threshold']:
+            return False
+    # a single bar window fails in talib
+    if cfg['check_discount'] and ind.size(200) > 2:
+        low, high = ind.lo_hi(200)
+        if calc_discount_score(market_price=df['close'].iat[-1], low=low, high=high) < cfg['check_discount_threshold']:
+            return False
+    return True
+
+
+def test_auto_accumulate_assets():
+    assert auto_accumulate_assets(make_cfg()) == [('bitcoin', '/all/crypto/core'), ('solana', '/all/crypto/alts'), ('cardano', '/all/crypto/alts'), ('ethereum', '/all/crypto/core')]
+
+
+def test_filters_match_live_evaluation():
+    bars = make_bars(400, 0, 1)
+    for checks in [{'check_correction': True}, {'check_pump': True}, {'check_rsi': True}, {'check_discount': True},
+                   {'check_correction': True, 'check_correction_min_sequential_days': 1, 'check_rsi': True, 'check_discount': True}]:
+        cfg = make_cfg(**checks)
+        passes = passes_acc_filter(cfg, bars)
+        assert list(passes) == [reference_passes(cfg, bars, t) for t in range(len(bars.close))], checks
+        assert 0 < passes.sum() < len(passes)
+
+
+def test_quotas_are_limited_per_day():
+    bars = {'bitcoin': make_bars(300, 0, 1), 'ethereum': make_bars(250, 50, 2), 'solana': make_bars(100, 200, 3), 'cardano': make_bars(300, 0, 4)}
+    cfg = make_cfg(check_pump=True, no_filter_list=['ethereum'])
+    result = PortfolioDcaConductor(cfg, bars, start=str(np.datetime64(1500000000000 + 20 * DAY_MS, 'ms'))).run()
+    assert result.assets == ['bitcoin', 'solana', 'cardano', 'ethereum']
+    assert result.buy_value.shape == (300, 4)
+    # before start, and never the asset with quota factor 0
+    assert not result.buy_value[:20].any()
+    assert not result.buy_value[:, 2].any()
+
+    pumps = {asset: ~passes_acc_filter(cfg, b) for asset, b in bars.items()}
+    for day in range(20, 300):
+        enabled = {}
+        for asset, factor, first_day in [('bitcoin', 2, 0), ('solana', 0.5, 200), ('ethereum', 1, 50)]:
+            i = day - first_day
+            if 0 <= i < len(bars[asset].close) and (asset == 'ethereum' or not pumps[asset][i]):
+                enabled[asset] = factor
+        total_value = sum(round(10 * f) for f in enabled.values())
+        quota = round(10 * 25 / total_value, 2) if total_value > 25 else 10
+        for j, asset in enumerate(result.assets):
+            assert isclose(result.buy_value[day, j], quota * enabled.get(asset, 0)), (day, asset)
+
+    equity = equity_curve(result)
+    assert isclose(equity['invested'].iloc[-1], result.buy_value.sum())
+    table = positions(result).set_index('asset')
+    assert isclose(table.loc['bitcoin', 'value'], result.buy_qty[:, 0].sum() * bars['bitcoin'].close[-1])
+    # ethereum's last bar is carried over to the end
+    assert isclose(table.loc['ethereum', 'last price'], bars['ethereum'].close[-1])
@@ -0,0 +1,74 @@
+import sqlite3, datetime
+from lib.common.pnl import calculate_inc_pnl
+from lib.portfolio.db import Db, SCHEMA_VERSION
+
+
+def test_migrates_legacy_db(tmp_path):
+    path = str(tmp_path / "dca.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE dca (date text, sym text, qty real, price real)")
+    con.execute("INSERT INTO dca VALUES (?,?,?,?)", ("2022-01-02 10:00:00.000001", "bitcoin", 0.5, 40000.))
+    con.commit()
+    con.close()
+
+    db = Db(path)
+    assert db.con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    indexes = {row[0] for row in db.con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"dca_sym_date", "dca_date"} <= indexes
+    assert db.get_sym_available_qty("bitcoin") == 0.5
+    plan = " ".join(str(row) for row in db.con.execute("EXPLAIN QUERY PLAN SELECT sym,qty,price,date FROM dca ORDER BY sym, date"))
+    assert "COVERING INDEX dca_sym_date" in plan
+    # reopening doesn't migrate again
+    Db(path)
+
+
+def test_orders(tmp_path):
+    db = Db(str(tmp_path / "dca.db"))
+    t = datetime.datetime(2022, 1, 1)
+    db.add("ethereum", 2., 3000., t + datetime.timedelta(days=1))
+    db.add("bitcoin", 1., 40000., t + datetime.timedelta(days=2))
+    db.add("ethereum", 1., 2000., t)
+    db.remove("ethereum", 0.5, 4000., t + datetime.timedelta(days=3))
+    db.add("it's", 1., 1., t)
+    db.burn("bitcoin", 0.25)
+
+    assert db.get_syms() == ["bitcoin", "ethereum", "it's"]
+    orders = db.get_sym_orders("ethereum")
+    assert [o.side for o in orders] == ["BUY", "BUY", "SELL"]
+    assert [o.timestamp for o in orders] == [t, t + datetime.timedelta(days=1), t + datetime.timedelta(days=3)]
+    assert orders[2].value == 2000.
+    assert db.get_sym_available_qty("bitcoin") == 0.75
+    assert db.get_last_buy_timestamp() == t + datetime.timedelta(days=2)
+
+    db.delete_all("it's")
+    assert db.get_syms() == ["bitcoin", "ethereum"]
+    assert db.get_sym_available_qty("it's") == 0
+
+
+def test_pnl_state_is_resumed(tmp_path):
+    db = Db(str(tmp_path / "dca.db"))
+    t = datetime.datetime(2022, 1, 1)
+    for i in range(10):
+        db.add("bitcoin", 1. + i, 100. + 3 * i, t + datetime.timedelta(days=i))
+    db.remove("bitcoin", 4., 150., t + datetime.timedelta(days=10))
+    db.add("ethereum", 1., 10., t)
+
+    def expected(sym):
+        return calculate_inc_pnl(db.get_sym_orders(sym), 120.)
+
+    pnl_by_sym = db.get_pnl_by_sym()
+    assert list(pnl_by_sym) == ["bitcoin", "ethereum"]
+    assert pnl_by_sym["bitcoin"].pnl(120.) == expected("bitcoin")
+    assert pnl_by_sym["bitcoin"].position_qty == db.get_sym_available_qty("bitcoin")
+
+    # newer orders continue the stored state
+    db.add("bitcoin", 2., 90., t + datetime.timedelta(days=11))
+    assert db.get_pnl_by_sym()["bitcoin"].state.n_orders == 12
+    assert db.get_pnl_by_sym()["bitcoin"].pnl(120.) == expected("bitcoin")
+
+    # an order dated before the stored state invalidates it
+    db.remove("bitcoin", 1., 200., t + datetime.timedelta(days=5, hours=1))
+    assert db.get_pnl_by_sym()["bitcoin"].pnl(120.) == expected("bitcoin")
+
+    db.delete_all("ethereum")
+    assert list(db.get_pnl_by_sym()) == ["bitcoin"]
@@ -0,0 +1,133 @@
+import time, requests
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from lib.common import rate_limiter
+from lib.common.rate_limiter import TokenBucket, get_rate_limiter
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=50., capacity=5.)
+    t0 = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire() == 0.
+    assert time.monotonic() - t0 < 0.05
+    for _ in range(10):
+        bucket.acquire()
+    # 10 tokens beyond the burst at 50/s
+    assert time.monotonic() - t0 >= 0.18
+
+
+def test_token_bucket_threads():
+    bucket = TokenBucket(rate=100., capacity=1.)
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: bucket.acquire(), range(21)))
+    assert time.monotonic() - t0 >= 0.19
+
+
+def test_unknown_provider_not_limited():
+    limiter = get_rate_limiter("fallback")
+    assert all(limiter.acquire() == 0. for _ in range(1000))
+    assert get_rate_limiter("binance") is get_rate_limiter("binance")
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict = {}):
+        self.status_code = status_code
+        self.headers = headers
+
+
+def test_send_retries_rate_limited(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.01)
+    responses = [FakeResponse(429, {"Retry-After": "0.05"}), FakeResponse(503), FakeResponse(200)]
+    t0 = time.monotonic()
+    response = rate_limiter.send("test-send", lambda: responses.pop(0))
+    assert response.status_code == 200
+    assert time.monotonic() - t0 >= 0.06
+    stats = rate_limiter.get_stats()["test-send"]
+    assert stats['requests'] == 3
+    assert stats['rate_limited'] == 1
+    assert stats['retries'] == 2
+
+
+def test_send_does_not_repeat_failed_order(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.01)
+    calls = []
+    def do_request():
+        calls.append(1)
+        return FakeResponse(503)
+    assert rate_limiter.send("test-order", do_request, idempotent=False).status_code == 503
+    assert len(calls) == 1
+
+
+def test_call_retries_until_limit(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.)
+    calls = []
+    def fail():
+        calls.append(1)
+        raise requests.ConnectionError("refused")
+    with pytest.raises(requests.ConnectionError):
+        rate_limiter.call("test-call", fail)
+    assert len(calls) == 4
+    with pytest.raises(requests.ConnectionError):
+        rate_limiter.call("test-call", fail, retry=False)
+    assert len(calls) == 5
+
+
+def test_call_retries_transient_errors_only(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.)
+    def http_error(status: int) -> requests.HTTPError:
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(f"{status}", response=response)
+    for error, attempts in [(KeyError("XYZ"), 1), (ValueError("unknown symbol"), 1), (http_error(404), 1),
+                            (http_error(429), 4), (http_error(503), 4), (TimeoutError(), 4), (requests.Timeout(), 4)]:
+        calls = []
+        def fail():
+            calls.append(1)
+            raise error
+        with pytest.raises(type(error)):
+            rate_limiter.call("test-call-transient", fail)
+        assert len(calls) == attempts, repr(error)
+
+
+def test_deadline_shortens_timeouts_and_retries(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.2)
+    assert rate_limiter.request_timeout() == rate_limiter.REQUEST_TIMEOUT_S
+    with rate_limiter.deadline(1.):
+        with rate_limiter.deadline(None):
+            assert 0.9 < rate_limiter.request_timeout() <= 1.
+        with rate_limiter.deadline(60.):
+            assert rate_limiter.request_timeout() <= 1.
+        # a retry would end after the deadline
+        with rate_limiter.deadline(0.1):
+            responses = [FakeResponse(503), FakeResponse(200)]
+            assert rate_limiter.send("test-deadline", lambda: responses.pop(0)).status_code == 503
+            time.sleep(0.1)
+            with pytest.raises(requests.Timeout):
+                rate_limiter.request_timeout()
+    assert rate_limiter.request_timeout() == rate_limiter.REQUEST_TIMEOUT_S
+
+
+def test_binance_request_weights():
+    from lib.trader.binance_api import get_request_weight
+    assert get_request_weight("/api/v3/depth", {'symbol': "BTCUSDT", 'limit': 5000}) == 250
+    assert get_request_weight("/api/v3/ticker/price", None) == 4
+    assert get_request_weight("/api/v3/ticker/price", {'symbol': "BTCUSDT"}) == 2
+    # klines by limit, 500 by default
+    assert [get_request_weight("/api/v3/klines", {'limit': limit}) for limit in (1, 99, 100, 499, 500, 1000)] == [1, 1, 2, 2, 5, 5]
+    assert get_request_weight("/api/v3/klines", {'symbol': "BTCUSDT", 'interval': "1d"}) == 5
+    assert get_request_weight("/api/v3/exchangeInfo", None) == 2
+
+
+def test_stats_are_reported_at_exit(monkeypatch, capsys):
+    from lib.common import startup_profile
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.)
+    def fail():
+        raise requests.ConnectionError("refused")
+    with pytest.raises(requests.ConnectionError):
+        rate_limiter.call("test-report", fail)
+    assert rate_limiter.get_stats()["test-report"]["retries"] == 3
+    startup_profile.report_rate_limits()
+    row = next(line for line in capsys.readouterr().err.splitlines() if line.startswith("test-report"))
+    assert row.split()[1:3] == ["4", "4"]
@@ -0,0 +1,52 @@
+import numpy as np
+from lib.bots.framework import TickerHistorical, DummyBroker, BrokerAdapterPnL, BacktestingConductor, candles_to_arrays, get_strategy_class
+from lib.bots.recorder import TradeRecorder, write_table
+
+
+def make_candles(n: int):
+    rng = np.random.default_rng(9)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return [{'timestamp': 1500000000000 + i * 86400000, 'open': c[i], 'high': c[i] * 1.01, 'low': c[i] * 0.99, 'close': c[i], 'volume': 1.0} for i in range(n)]
+
+
+def test_backtest_is_recorded_without_printing(capsys, tmp_path):
+    arrays = candles_to_arrays(make_candles(1500))
+    ticker = TickerHistorical.from_arrays(arrays)
+    recorder = TradeRecorder(1000., capacity=16)
+    broker = BrokerAdapterPnL(ticker=ticker, broker=DummyBroker(ticker=ticker, initial_account=1000., recorder=recorder))
+    BacktestingConductor(strategy=get_strategy_class("DCA_ConstQuota")({'dca_base_quota': 10}), ticker=ticker, broker=broker).run()
+    assert capsys.readouterr().out == ""
+    # final PnL at the last close, printed on request
+    broker.print_pnl(float(arrays.close[-1]))
+    out = capsys.readouterr().out
+    assert out.startswith(f"break_even_price={broker.pnl.break_even_price} ")
+    assert "u pnl=" in out and "r pnl=" in out
+
+    assert len(recorder) == 1500
+    trades = recorder.trades()
+    assert np.array_equal(trades['timestamp'].to_numpy(), arrays.timestamp)
+    assert np.allclose(trades['value'], 10.)
+    assert trades['account_usd'].iloc[-1] == broker.account_size_usd
+    assert trades['account_token'].iloc[-1] == broker.account_size_token
+
+    equity = recorder.equity_curve(arrays)
+    assert np.isclose(equity['equity'].iloc[-1], broker.account_size_usd + broker.account_size_token * arrays.close[-1])
+    summary = recorder.summary(arrays)
+    assert summary.buys == 1500 and summary.sells == 0
+    assert np.isclose(summary.bought_value, 15000.)
+    assert np.isclose(summary.final_equity, equity['equity'].iloc[-1])
+
+    path = str(tmp_path / "trades.csv")
+    write_table(trades, path)
+    assert open(path).read().count("\n") == 1501
+
+
+def test_equity_curve_before_and_between_trades():
+    arrays = candles_to_arrays(make_candles(5))
+    recorder = TradeRecorder(100.)
+    recorder.record(arrays.timestamp[2], 1, float(arrays.close[2]), 0.5, 0.5 * float(arrays.close[2]), 100. - 0.5 * float(arrays.close[2]), 0.5)
+    equity = recorder.equity_curve(arrays)
+    assert list(equity['account_token']) == [0., 0., 0.5, 0.5, 0.5]
+    assert np.allclose(equity['equity'][:3], 100.)
+    assert np.isclose(equity['equity'].iloc[4], 100. + 0.5 * (arrays.close[4] - arrays.close[2]))
+    assert TradeRecorder(100.).summary(arrays).final_equity == 100.
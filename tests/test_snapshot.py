@@ -0,0 +1,40 @@
+import time
+import pytest
+from lib.common.snapshot import IndexedSnapshot
+
+
+def test_indexed_snapshot_lookup_and_refresh():
+    loads = []
+    def load():
+        loads.append(time.monotonic())
+        return [{"name": "BTC/USD", "price": 20000. + len(loads)}, {"name": "ETH/USD", "price": 1500.}]
+
+    snapshot = IndexedSnapshot(load, "name", ttl_s=0.05)
+    assert len(loads) == 0
+    assert snapshot.get("BTC/USD")["price"] == 20001.
+    assert "ETH/USD" in snapshot
+    assert "SOL/USD" not in snapshot
+    with pytest.raises(KeyError):
+        snapshot.get("SOL/USD")
+    assert len(loads) == 1
+
+    time.sleep(0.06)
+    assert snapshot.get("BTC/USD")["price"] == 20002.
+    assert len(loads) == 2
+
+    snapshot.invalidate()
+    assert len(snapshot.values()) == 2
+    assert len(loads) == 3
+
+
+def test_bulk_prices_from_snapshots():
+    from lib.market_data_providers.provider_binance import MarketDataProviderBinance
+    from lib.market_data_providers.provider_ftx import MarketDataProviderFTX
+    binance = MarketDataProviderBinance()
+    binance._crypto_prices = IndexedSnapshot(lambda: [{"symbol": "AAVEUSDT", "price": "80"}, {"symbol": "USDTUAH", "price": "40"}], "symbol")
+    # 0x has no price, it is left out
+    assert binance.get_market_prices(["aave", "UAH", "0x"]) == {"aave": 80., "UAH": 0.025}
+
+    ftx = MarketDataProviderFTX()
+    ftx._markets = IndexedSnapshot(lambda: [{"name": "ZRX/USD", "price": 0.2}], "name")
+    assert ftx.get_market_prices(["0x", "aave"]) == {"0x": 0.2}
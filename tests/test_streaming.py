@@ -0,0 +1,159 @@
+import asyncio, json, time
+import numpy as np
+from lib.common.streaming_ta import Bar, IndicatorBank
+from lib.bots.streaming import KlineEvent, OHLCVRingBuffer, ReplayKlineFeed, BinanceKlineFeed, TickerStreaming, StreamingConductor
+
+INTERVAL_MS = 3600 * 1000
+
+
+def make_candles(n: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return [{'timestamp': i * INTERVAL_MS, 'open': c[i - 1] if i else c[0], 'high': c[i] * 1.01, 'low': c[i] * 0.99, 'close': c[i], 'volume': 10. + i} for i in range(n)]
+
+
+class FakeApi:
+    def __init__(self, candles):
+        self.candles = candles
+        self.calls = []
+
+    def get_candles_by_limit(self, pair, interval, limit):
+        self.calls.append(('limit', limit))
+        return self.candles[-limit:]
+
+    def get_candles_by_range_ms(self, pair, interval, ts_start, ts_end):
+        self.calls.append(('range', ts_start, ts_end))
+        return [c for c in self.candles if ts_start <= c['timestamp'] <= ts_end]
+
+
+class RecordingStrategy:
+    def __init__(self):
+        self.ticks = []
+
+    def tick(self, ticker, broker):
+        self.ticks.append((ticker.timestamp, ticker.market_price, len(ticker.close), ticker.indicators.sma(5).value))
+
+
+def test_ring_buffer_wraps_in_order():
+    buffer = OHLCVRingBuffer(4)
+    assert buffer.last_timestamp is None
+    for i in range(10):
+        buffer.append(KlineEvent(i * 1000, i, i + 1, i - 1, i + .5, 1., True))
+        arrays = buffer.arrays
+        expected = np.arange(max(0, i - 3), i + 1)
+        assert len(buffer) == len(expected)
+        assert np.array_equal(arrays.open, expected)
+        assert np.array_equal(arrays.timestamp.astype(np.int64), expected * 1000)
+        assert buffer.last_timestamp == i * 1000
+    assert not arrays.close.flags.writeable
+
+
+def test_conductor_ticks_on_bar_close_only():
+    candles = make_candles(60)
+    history, live = candles[:41], candles[40:]
+    api = FakeApi(history)
+    forming = KlineEvent.from_candle(live[1], closed=False)._replace(close=123.)
+    events = [KlineEvent.from_candle(live[0]), forming, KlineEvent.from_candle(live[0])] + [KlineEvent.from_candle(c) for c in live[1:]]
+    ticker = TickerStreaming("bitcoin", "1h", capacity=30, api=api)
+    strategy = RecordingStrategy()
+    StreamingConductor(strategy=strategy, ticker=ticker, broker=None, feed=ReplayKlineFeed(events)).run()
+
+    # history without the partial bar, then one tick per closed bar, the repeated close is dropped
+    assert api.calls == [('limit', 31)]
+    assert len(strategy.ticks) == len(live)
+    assert ticker.timestamp.value // 10**6 == live[-1]['timestamp']
+    assert np.allclose(ticker.close, [c['close'] for c in candles[-30:]])
+
+    bank = IndicatorBank()
+    for c in candles:
+        bank.feed(Bar(c['open'], c['high'], c['low'], c['close'], c['volume']))
+    assert np.isclose(ticker.indicators.sma(5).value, bank.sma(5).value)
+
+
+def test_realtime_price_follows_forming_bar():
+    candles = make_candles(10)
+    ticker = TickerStreaming("bitcoin", "1h", api=FakeApi(candles[:6]))
+    strategy = RecordingStrategy()
+    forming = KlineEvent.from_candle(candles[5], closed=False)._replace(close=42.)
+    StreamingConductor(strategy=strategy, ticker=ticker, broker=None, feed=ReplayKlineFeed([forming]), realtime=True).run()
+    assert strategy.ticks[0][1] == 42.
+    assert len(ticker.close) == 5
+
+
+def test_gap_is_backfilled_over_rest():
+    candles = make_candles(20)
+    api = FakeApi(candles)
+    ticker = TickerStreaming("bitcoin", "1h", api=api)
+    api.candles = candles[:11]
+    ticker.bootstrap()
+    api.candles = candles
+    assert ticker.on_kline(KlineEvent.from_candle(candles[15]))
+    assert api.calls[-1] == ('range', 10 * INTERVAL_MS, 14 * INTERVAL_MS)
+    assert np.array_equal(ticker.arrays.timestamp.astype(np.int64), [c['timestamp'] for c in candles[:16]])
+
+
+def test_first_close_already_returned_by_rest_is_ticked():
+    candles = make_candles(20)
+    # the bar of the first event closed before history was requested, the next one is forming
+    api = FakeApi(candles[:12])
+    ticker = TickerStreaming("bitcoin", "1h", api=api)
+    strategy = RecordingStrategy()
+    StreamingConductor(strategy=strategy, ticker=ticker, broker=None, feed=ReplayKlineFeed.from_candles(candles[10:])).run()
+    assert [t[0].value // 10**6 for t in strategy.ticks] == [c['timestamp'] for c in candles[10:]]
+    assert np.array_equal(ticker.arrays.timestamp.astype(np.int64), [c['timestamp'] for c in candles])
+
+
+class SlowApi(FakeApi):
+    def get_candles_by_range_ms(self, pair, interval, ts_start, ts_end):
+        time.sleep(0.3)
+        return super().get_candles_by_range_ms(pair, interval, ts_start, ts_end)
+
+
+def test_backfill_does_not_block_event_loop():
+    candles = make_candles(20)
+    api = SlowApi(candles[:6])
+    ticker = TickerStreaming("bitcoin", "1h", api=api)
+    conductor = StreamingConductor(strategy=RecordingStrategy(), ticker=ticker, broker=None,
+                                   feed=ReplayKlineFeed([KlineEvent.from_candle(candles[5]), KlineEvent.from_candle(candles[15])]))
+
+    async def run():
+        beats = 0
+        async def heartbeat():
+            nonlocal beats
+            while True:
+                await asyncio.sleep(0.01)
+                beats += 1
+        task = asyncio.create_task(heartbeat())
+        api.candles = candles
+        await conductor.run_async()
+        task.cancel()
+        return beats
+
+    # the loop kept running during the 0.3s backfill request
+    assert asyncio.run(run()) >= 10
+    assert api.calls[-1] == ('range', 6 * INTERVAL_MS, 14 * INTERVAL_MS)
+    assert len(ticker.close) == 16
+
+
+def test_binance_feed_over_local_websocket():
+    import websockets
+    candles = make_candles(3)
+    messages = [json.dumps({'e': 'kline', 'k': {'t': c['timestamp'], 'o': str(c['open']), 'h': str(c['high']), 'l': str(c['low']), 'c': str(c['close']), 'v': str(c['volume']), 'x': True}}) for c in candles]
+
+    async def serve(ws, path=None):
+        await ws.send(json.dumps({'result': None, 'id': 1}))
+        for m in messages:
+            await ws.send(m)
+
+    async def receive():
+        async with websockets.serve(serve, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            feed = BinanceKlineFeed("bitcoin", "1h", uri=f"ws://127.0.0.1:{port}")
+            events = []
+            async for event in feed.events():
+                events.append(event)
+                if len(events) == len(candles):
+                    return events
+
+    events = asyncio.run(asyncio.wait_for(receive(), 10))
+    assert events == [KlineEvent.from_candle(c) for c in candles]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest, talib
+from lib.common.streaming_ta import Bar, IndicatorBank
+
+
+def make_bars(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    o = np.r_[c[0], c[:-1]]
+    h = np.maximum(o, c) * (1 + rng.uniform(0, 0.02, n))
+    l = np.minimum(o, c) * (1 - rng.uniform(0, 0.02, n))
+    v = rng.uniform(100, 1000, n)
+    return o, h, l, c, v
+
+
+def stream(bank: IndicatorBank, bars, indicator_fn):
+    o, h, l, c, v = bars
+    out = []
+    for i in range(len(c)):
+        bank.feed(Bar(o[i], h[i], l[i], c[i], v[i]))
+        out.append(indicator_fn(bank))
+    return np.array(out)
+
+
+def assert_matches(streamed, expected):
+    assert np.allclose(streamed, expected, equal_nan=True, rtol=1e-9, atol=1e-9)
+
+
+def test_sma_ema_match_talib():
+    bars = make_bars(300)
+    c = bars[3]
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.sma(20).value), talib.SMA(c, 20))
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.ema(10).value), talib.EMA(c, 10))
+
+
+def test_rsi_atr_match_talib():
+    bars = make_bars(300)
+    _, h, l, c, _ = bars
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.rsi(14).value), talib.RSI(c, 14))
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.atr(14).value), talib.ATR(h, l, c, 14))
+
+
+def test_macd_matches_talib():
+    bars = make_bars(300)
+    macd, signal, hist = talib.MACD(bars[3], fastperiod=12, slowperiod=26, signalperiod=9)
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.macd().macd.value), macd)
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.macd().signal.value), signal)
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.macd().hist.value), hist)
+
+
+def test_min_max_hlc3_match_talib():
+    bars = make_bars(300)
+    _, h, l, c, _ = bars
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.min(20).value), talib.MIN(l, 20))
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.max(20).value), talib.MAX(h, 20))
+    assert_matches(stream(IndicatorBank(), bars, lambda b: b.hlc3().value), (h + l + c) / 3)
+
+
+def test_late_requested_indicator_is_replayed():
+    bank = IndicatorBank()
+    o, h, l, c, v = make_bars(100)
+    for i in range(100):
+        bank.feed(Bar(o[i], h[i], l[i], c[i], v[i]))
+    assert np.isclose(bank.sma(20).value, talib.SMA(c, 20)[-1])
+    assert bank.sma(20) is bank.sma(20)
+
+
+def test_history_is_bounded():
+    bank = IndicatorBank(history=400)
+    o, h, l, c, v = make_bars(3000)
+    for i in range(3000):
+        bank.feed(Bar(o[i], h[i], l[i], c[i], v[i]))
+    assert len(bank) == 3000
+    assert len(bank._bars) == 400
+    # requested late, replayed over the kept bars only
+    assert np.isclose(bank.sma(20).value, talib.SMA(c, 20)[-1], rtol=1e-12)
+    assert np.isclose(bank.ema(20).value, talib.EMA(c, 20)[-1], rtol=1e-9)
+    assert np.isclose(bank.rsi(14).value, talib.RSI(c, 14)[-1], rtol=1e-9)
+    # would stay NaN
+    with pytest.raises(ValueError):
+        bank.sma(1400)
+    bank.reset()
+    assert len(bank) == 0 and len(bank._bars) == 0
+
+    # requested before the bars are dropped, it streams
+    sma = bank.sma(1400)
+    for i in range(3000):
+        bank.feed(Bar(o[i], h[i], l[i], c[i], v[i]))
+    assert np.isclose(sma.value, talib.SMA(c, 1400)[-1], rtol=1e-9)
+    assert bank.sma(1400) is sma
+
+
+def test_cross():
+    bank = IndicatorBank()
+    a = bank.sma(1)
+    b = bank.sma(1, source="open")
+    cross = bank.cross(a, b)
+    bank.feed(Bar(open=2, high=2, low=1, close=1, volume=0))
+    assert not cross.over and not cross.under
+    bank.feed(Bar(open=1, high=2, low=1, close=2, volume=0))
+    assert cross.over and not cross.under
+    bank.feed(Bar(open=2, high=2, low=1, close=1, volume=0))
+    assert cross.under and not cross.over
@@ -0,0 +1,57 @@
+import numpy as np
+from lib.bots.framework import TickerHistorical, DummyBroker, BrokerAdapterPnL, candles_to_arrays
+from lib.common import pnl
+from lib.bots.sweep import SharedBars, expand_grid, run_backtest
+
+
+def make_candles(n: int):
+    rng = np.random.default_rng(3)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return [{'timestamp': 1500000000000 + i * 86400000, 'open': c[i], 'high': c[i] * 1.01, 'low': c[i] * 0.99, 'close': c[i], 'volume': 1.0} for i in range(n)]
+
+
+def test_expand_grid():
+    combinations = expand_grid({'a': [1, 2], 'b': [10], 'c': [5, 6, 7]})
+    assert len(combinations) == 6
+    assert combinations[0] == {'a': 1, 'b': 10, 'c': 5}
+    assert combinations[-1] == {'a': 2, 'b': 10, 'c': 7}
+
+
+def test_shared_bars_round_trip():
+    arrays = candles_to_arrays(make_candles(50))
+    bars = SharedBars.create(arrays)
+    try:
+        attached = SharedBars.attach(bars.name, len(bars))
+        shared = attached.arrays()
+        for column in arrays._fields:
+            assert np.array_equal(getattr(shared, column), getattr(arrays, column))
+        assert not shared.close.flags.writeable
+        del shared
+        attached.close()
+    finally:
+        bars.close()
+        bars.unlink()
+
+
+def test_run_backtest():
+    arrays = candles_to_arrays(make_candles(300))
+    result = run_backtest('DCA_ConstQuota', {'dca_base_quota': 100}, arrays, 1000000)
+    assert result.account_usd == 1000000 - 100 * 300
+    assert np.isclose(result.final_equity, result.account_usd + result.account_token * arrays.close[-1])
+    assert result.break_even_price > 0
+
+
+def test_broker_pnl_matches_replay_of_orders():
+    arrays = candles_to_arrays(make_candles(200))
+    ticker = TickerHistorical.from_arrays(arrays)
+    broker = BrokerAdapterPnL(ticker=ticker, broker=DummyBroker(ticker=ticker, initial_account=10000.))
+    for i in range(len(arrays.close)):
+        ticker.seek(i)
+        if i % 3 == 0:
+            broker.buy(1.)
+        if i % 7 == 0 and broker.account_size_token > 0:
+            broker.sell(0.5)
+    expected = pnl.calculate_inc_pnl(broker.orders, arrays.close[-1])
+    actual = broker.pnl_at(arrays.close[-1])
+    for field in pnl.PnL._fields:
+        assert np.isclose(getattr(actual, field), getattr(expected, field), rtol=1e-9), field
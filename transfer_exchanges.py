@@ -5,7 +5,7 @@
 import argparse, time
 
 from lib.trader.trader_factory import TraderFactory
-from lib.common.market_data import MarketData
+from lib.common.market_data import get_market_data
 from lib.common.msg import err, warn
 from lib.common.misc import get_first_decimal_place
 
@@ -21,7 +21,7 @@ def transfer_asset(asset: str, qty: str, src_ex: str, dest_ex: str, max_trade_va
     else:
         qty = float(qty)
 
-    price = MarketData().get_market_price(asset)
+    price = get_market_data().get_market_price(asset)
     if exact_trade_qty is not None:
         lot_size = exact_trade_qty
     else:
@@ -10,7 +10,7 @@ from selenium.webdriver.support import expected_conditions as EC
 
 
 from lib.common.msg import *
-from lib.common.market_data import MarketData
+from lib.common.market_data import get_market_data
 from lib.common.id_ticker_map import id_to_ticker
 from lib.trader import api_keys_config
 from lib.trader import ftx_api
@@ -90,7 +90,7 @@ class TulipClient:
 
 class MarketPriceClient:
     def __init__(self):
-        self._market_data = MarketData()
+        self._market_data = get_market_data()
 
     def get_token_price(self, ticker: str):
         token_id = [k for k,v in id_to_ticker.items() if v == ticker][0]